@@ -0,0 +1,167 @@
+"""
+    AsyncMarketdataSocketClient.py
+
+    asyncio market data client on socketio.AsyncClient.
+
+    Frames are decoded on the event loop as they arrive and the events are
+    exposed as an async iterator, so a strategy running on the same loop
+    consumes them without any thread hand-off:
+
+        soc = AsyncMDSocket(token, userID, "Compact", xt=xt)
+        await soc.connect()
+        await soc.subscribe(Instruments, xt.MESSAGE_CODE_TOUCHLINE)
+        async for event in soc:
+            ...
+
+    Several AsyncMDSocket instances can share one event loop.
+"""
+import asyncio
+import configparser
+import os
+import socketio
+import Exception as ex
+from MarketDataFrame import iter_packets, receive_time, Inflater
+from MessageDispatcher import default_dispatcher
+
+
+class AsyncMDSocket:
+
+    def __init__(self, token, userID, broadcastmode, xt=None, dispatcher=None, packetFilter=None, queueSize=0,
+                 reconnection=True):
+        """
+        - `xt` is the logged in XTSConnect used by subscribe and unsubscribe.
+        - `queueSize` bounds the events waiting for the iterator, 0 is unbounded.
+          When full the oldest event is dropped and counted in `dropped`.
+        - A `dispatcher` passed in is used as is; route its events to the
+          iterator by giving it `publish` as a handler.
+        - Without `reconnection` a dropped connection ends the iteration;
+          with it the iterator keeps waiting while socketio reconnects.
+        """
+        if broadcastmode not in ("Binary", "Full", "Partial", "Compact"):
+            raise ex.XTSInputException("Invalid broadcastmode {mode}".format(mode=broadcastmode))
+        self.sid = socketio.AsyncClient(reconnection=reconnection, logger=False, engineio_logger=False,
+                                        ssl_verify=False)
+        self.eventlistener = self.sid
+        self.broadcastMode = broadcastmode
+        self.xt = xt
+        self.packetFilter = packetFilter
+        # Without a dispatcher of the caller, events without a handler of their own go to the iterator
+        self.dispatcher = dispatcher if dispatcher is not None else default_dispatcher(self.publish)
+        self.inflater = Inflater()
+        self.events = asyncio.Queue(queueSize)
+        self.dropped = 0
+        self._closed = False
+        self.sid.on('connect', self.on_connect)
+        self.sid.on('message', self.on_message)
+        self.sid.on('error', self.on_error)
+        self.sid.on('joined', self.on_joined)
+        self.sid.on('xts-binary-packet', self.on_xts_binary_packet)
+        self.sid.on('disconnect', self.on_disconnect)
+
+        """Get the root url from config file"""
+        currDirMain = os.getcwd()
+        configParser = configparser.ConfigParser()
+        configFilePath = os.path.join(currDirMain, 'config.ini')
+        configParser.read(configFilePath)
+
+        self.port = configParser.get('root_url', 'marketdata_root')
+        self.userID = userID
+        publishFormat = 'JSON'
+        self.token = token
+        port = f'{self.port}?token='
+
+        self.connection_url = port + token + '&userID=' + self.userID + '&publishFormat=' + publishFormat + '&broadcastMode=Full'
+
+    async def connect(self, headers={}, transports='websocket', namespaces=None,
+                      socketio_path='apibinarymarketdata/socket.io'):
+        """Connect to the socket. Returns once connected, the events then arrive through the iterator."""
+        await self.sid.connect(self.connection_url, headers, transports, namespaces, socketio_path)
+
+    async def disconnect(self):
+        """Disconnect from the socket and end the iteration."""
+        await self.sid.disconnect()
+        self.close()
+
+    async def wait(self):
+        """Wait until the connection ends."""
+        await self.sid.wait()
+
+    async def subscribe(self, Instruments, xtsMessageCode):
+        """Subscribe through the REST api without blocking the event loop."""
+        return await self._call(self._connect().send_subscription, Instruments, xtsMessageCode)
+
+    async def unsubscribe(self, Instruments, xtsMessageCode):
+        """Unsubscribe through the REST api without blocking the event loop."""
+        return await self._call(self._connect().send_unsubscription, Instruments, xtsMessageCode)
+
+    def _connect(self):
+        if self.xt is None:
+            raise ex.XTSInputException("AsyncMDSocket needs an XTSConnect (xt=) to subscribe")
+        return self.xt
+
+    async def _call(self, method, *args):
+        # the XTSConnect session is blocking, run it on the default executor
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    def close(self):
+        """End the iteration once the pending events have been consumed."""
+        if not self._closed:
+            self._closed = True
+            # a full queue has no waiting reader, __anext__ then stops on the closed flag
+            if not self.events.full():
+                self.events.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed and self.events.empty():
+            raise StopAsyncIteration
+        event = await self.events.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def publish(self, event):
+        """Hand an event to the iterator."""
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            self.events.get_nowait()
+            self.dropped += 1
+            self.events.put_nowait(event)
+
+    async def on_connect(self):
+        """Connect from the socket."""
+        print('Market Data Socket connected successfully!')
+
+    async def on_joined(self, data):
+        print("Socket joined", data)
+
+    async def on_message(self, data):
+        """On receiving message"""
+        print('I received a message!' + data)
+
+    async def on_error(self, data):
+        """Error from the socket"""
+        print('Market Data Error', data)
+
+    async def on_xts_binary_packet(self, data):
+        self.process_frame(data, receive_time())
+
+    def process_frame(self, data, receiveTime):
+        """Decode every packet of a frame and publish the events."""
+        try:
+            if self.broadcastMode == "Binary":
+                self.publish(data)
+            else:
+                for header, body in iter_packets(data, self.inflater, self.packetFilter):
+                    self.dispatcher.dispatch(header.messageCode, body, self.broadcastMode, receiveTime)
+        except Exception as e:
+            print(e)
+
+    async def on_disconnect(self):
+        """Disconnected from the socket, the iteration ends unless socketio reconnects"""
+        print('Market Data Socket disconnected!')
+        if not self.sid.reconnection:
+            self.close()
@@ -0,0 +1,62 @@
+from MessageLayout import decode_candle
+from MarketDataFrame import receive_time, format_receive_time
+from collections import namedtuple
+
+
+class CandleEvent(namedtuple('CandleEvent', [
+        'MessageCode', 'MessageVersion', 'ApplicationType', 'TokenID', 'ExchangeSegment', 'ExchangeInstrumentID',
+        'ExchangeTimeStamp', 'BookType', 'XMarketType', 'SequenceNumber', 'BarTime', 'BarVolume', 'OpenInterest',
+        'SumOfQtyInToPrice', 'Open', 'High', 'Low', 'Close', 'ReceiveTime'])):
+    """Compact 1505 event, returned in "Compact" broadcast mode. ReceiveTime is in ns."""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return the dict produced by the "Full" broadcast mode, the receive time formatted as LastUpdateTime."""
+        data = self._asdict()
+        del data["ReceiveTime"]
+        data["LastUpdateTime"] = format_receive_time(self.ReceiveTime)
+        return data
+
+
+class Candle:
+    @staticmethod
+    def deserialize(reader, count, messagecode, broadcastmode):
+        # reader is positioned just past the message code of the body
+        values, end = decode_candle(reader.buffer(), reader.pos() - 2)
+        reader.seek(end)
+        return Candle.from_values(values, messagecode, broadcastmode)
+
+    @staticmethod
+    def decode(buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """Decode a 1505 body starting at `offset` (the message code) of `buffer`."""
+        values, end = decode_candle(buffer, offset)
+        return Candle.from_values(values, messagecode, broadcastmode, receiveTime)
+
+    @staticmethod
+    def from_values(values, messagecode, broadcastmode, receiveTime=None):
+        (_, messageVersion, applicationType, tokenID, sequenceNumber, SkipBytes,
+         exchangeSegment, exchangeInstrumentId, exchangeTimestamp,
+         Booktype, MarketType, barTime, barVolume, openInterest, sumOfQtyInToPrice,
+         open, high, low, close) = values
+
+        if broadcastmode == "Compact" or broadcastmode == "Full":
+            if receiveTime is None:
+                receiveTime = receive_time()
+            event = CandleEvent(
+                messagecode, messageVersion, applicationType, tokenID, exchangeSegment, exchangeInstrumentId,
+                exchangeTimestamp, Booktype, MarketType, sequenceNumber, barTime, barVolume, openInterest,
+                sumOfQtyInToPrice, open, high, low, close, receiveTime)
+            return event if broadcastmode == "Compact" else event.to_dict()
+
+        elif broadcastmode == "Partial":
+            return (
+                f"t:{exchangeSegment}_{exchangeInstrumentId},"
+                f"bt:{barTime},"
+                f"bv:{barVolume},"
+                f"oi:{openInterest},"
+                f"sq:{sumOfQtyInToPrice},"
+                f"o:{open},"
+                f"h:{high},"
+                f"l:{low},"
+                f"c:{close}"
+            )
@@ -81,6 +81,14 @@ class XTSConnect(XTSCommon):
     EXCHANGE_MCXFO = "MCXFO"
     EXCHANGE_BSECM = "BSECM"
 
+    # Market data message codes for send_subscription/send_unsubscription
+    MESSAGE_CODE_INSTRUMENT_CHANGE = 1105
+    MESSAGE_CODE_TOUCHLINE = 1501
+    MESSAGE_CODE_MARKET_DEPTH = 1502
+    MESSAGE_CODE_CANDLE = 1505
+    MESSAGE_CODE_OPEN_INTEREST = 1510
+    MESSAGE_CODE_LTP = 1512
+
     # URIs to various calls
     _routes = {
 
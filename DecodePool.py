@@ -0,0 +1,287 @@
+"""
+    DecodePool.py
+
+    Multi-process decoding of market data frames over shared memory rings.
+
+    The socket process splits each raw frame on the packet headers alone,
+    without inflating, into one record per worker, prefixed with the receive
+    time: packets go to the worker their (exchangeSegment,
+    exchangeInstrumentID) hash to, so every packet is inflated and decoded
+    exactly once and per-instrument ordering is kept. Each worker has its
+    own frame ring and result ring; decoded events are pickled per record
+    into the result ring, which the consumer drains.
+
+    Ring indices are read and published under a multiprocessing Lock per
+    ring, which orders the record bytes against the index stores on every
+    platform. A semaphore released once per record wakes the reader, which
+    acquires it once per record it takes.
+
+    Given to MDSocket_io as `decodePool`, the socket only submits frames:
+    the workers decode every packet with the default decoders and the
+    events are pulled with `drain()`. The socket's dispatcher, handlers,
+    filter and monitors do not apply, so MDSocket_io refuses them together
+    with a pool.
+"""
+import multiprocessing
+import pickle
+import struct
+import time
+from multiprocessing import shared_memory
+import Exception as ex
+from MarketDataFrame import iter_packets, iter_raw_packets, Inflater
+from MessageDispatcher import default_dispatcher
+
+_INDEX = struct.Struct('<Q')
+_LENGTH = struct.Struct('<I')
+_RECEIVE_TIME = struct.Struct('<Q')
+
+
+class SharedRing:
+    """
+    Byte ring in a SharedMemory block with one producer and `consumers`
+    independent readers, each with its own read index.
+
+    Records are length prefixed and may wrap around the end of the ring.
+    `lock` is the multiprocessing Lock shared by every process attached to
+    the ring, it is created with the ring when none is given.
+    """
+
+    def __init__(self, size, consumers=1, name=None, lock=None):
+        if name is not None and lock is None:
+            raise ex.XTSInputException("Attaching to a ring needs the lock it was created with")
+        self.consumers = consumers
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self.headerSize = (8 * (1 + consumers) + 63) // 64 * 64
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.headerSize + size)
+            self.shm.buf[:self.headerSize] = bytes(self.headerSize)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.capacity = size
+        self.buf = self.shm.buf
+
+    def _head(self):
+        return _INDEX.unpack_from(self.buf, 0)[0]
+
+    def _tail(self, consumer):
+        return _INDEX.unpack_from(self.buf, 8 + 8 * consumer)[0]
+
+    def _write(self, position, data):
+        offset = position % self.capacity
+        first = min(len(data), self.capacity - offset)
+        start = self.headerSize + offset
+        self.buf[start:start + first] = data[:first]
+        if first < len(data):
+            self.buf[self.headerSize:self.headerSize + len(data) - first] = data[first:]
+
+    def _read(self, position, size):
+        offset = position % self.capacity
+        first = min(size, self.capacity - offset)
+        start = self.headerSize + offset
+        if first == size:
+            return bytes(self.buf[start:start + size])
+        return bytes(self.buf[start:start + first]) + bytes(self.buf[self.headerSize:self.headerSize + size - first])
+
+    def fits(self, size):
+        """Whether a record of `size` bytes can ever fit in the ring."""
+        return _LENGTH.size + size <= self.capacity
+
+    def put(self, *parts):
+        """Append one record made of `parts`. Returns False, writing nothing, when it does not fit."""
+        size = sum(len(part) for part in parts)
+        with self.lock:
+            head = self._head()
+            tail = min(self._tail(consumer) for consumer in range(self.consumers))
+        if self.capacity - (head - tail) < _LENGTH.size + size:
+            return False
+        self._write(head, _LENGTH.pack(size))
+        position = head + _LENGTH.size
+        for part in parts:
+            self._write(position, memoryview(part).cast('B'))
+            position += len(part)
+        # publish only once the record is complete
+        with self.lock:
+            _INDEX.pack_into(self.buf, 0, position)
+        return True
+
+    def get(self, consumer=0):
+        """Return the next record for `consumer` as bytes, or None when there is none."""
+        with self.lock:
+            tail = self._tail(consumer)
+            head = self._head()
+        if tail == head:
+            return None
+        size = _LENGTH.unpack(self._read(tail, _LENGTH.size))[0]
+        record = self._read(tail + _LENGTH.size, size)
+        # free the space only once the record is copied out
+        with self.lock:
+            _INDEX.pack_into(self.buf, 8 + 8 * consumer, tail + _LENGTH.size + size)
+        return record
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def shard_of(exchangeSegment, exchangeInstrumentID, shards):
+    """Shard of an instrument, stable across processes."""
+    return (exchangeSegment * 1000003 + exchangeInstrumentID) % shards
+
+
+def _publish(results, events, stopEvent, resultReady):
+    """Pickle `events` into the result ring, split in halves when they can not fit in it at once."""
+    batch = pickle.dumps(events, pickle.HIGHEST_PROTOCOL)
+    if not results.fits(len(batch)):
+        if len(events) == 1:
+            print("Decoded event of {size} bytes does not fit in the result ring, dropped".format(size=len(batch)))
+            return
+        half = len(events) // 2
+        _publish(results, events[:half], stopEvent, resultReady)
+        _publish(results, events[half:], stopEvent, resultReady)
+        return
+    while not results.put(batch):
+        if stopEvent.is_set():
+            return
+        time.sleep(0.0005)
+    resultReady.release()
+
+
+def _decode_worker(frameRingName, frameRingSize, frameLock, resultRingName, resultRingSize, resultLock,
+                   broadcastmode, frameReady, resultReady, stopEvent):
+    frames = SharedRing(frameRingSize, 1, frameRingName, frameLock)
+    results = SharedRing(resultRingSize, 1, resultRingName, resultLock)
+    inflater = Inflater()
+    events = []
+    dispatcher = default_dispatcher(events.append)
+    try:
+        while not stopEvent.is_set():
+            if not frameReady.acquire(timeout=0.1):
+                continue
+            record = frames.get()
+            if record is None:
+                continue
+            receiveTime = _RECEIVE_TIME.unpack_from(record)[0]
+            try:
+                for header, body in iter_packets(memoryview(record)[_RECEIVE_TIME.size:], inflater):
+                    dispatcher.dispatch(header.messageCode, body, broadcastmode, receiveTime)
+            except Exception as e:
+                print(e)
+            if events:
+                _publish(results, events, stopEvent, resultReady)
+                events.clear()
+    finally:
+        frames.close()
+        results.close()
+
+
+class DecodePool:
+    """
+    Pool of `workers` decode processes, each fed from its own shared frame ring.
+
+    - `submit(frame, receiveTime)` is called from the socket thread and never
+      waits; the part of a frame that does not fit in its worker's ring is
+      counted in `dropped`.
+    - `drain(timeout)` returns the decoded events published since the last
+      call, in per-instrument order.
+    """
+
+    def __init__(self, workers=2, broadcastmode="Compact", frameRingSize=16 * 1024 * 1024,
+                 resultRingSize=16 * 1024 * 1024, context=None):
+        if workers < 1:
+            raise ex.XTSInputException("workers must be at least 1")
+        if broadcastmode not in ("Full", "Partial", "Compact"):
+            raise ex.XTSInputException("Invalid broadcastmode {mode}".format(mode=broadcastmode))
+        self.workers = workers
+        self.broadcastmode = broadcastmode
+        self.frameRingSize = frameRingSize
+        self.resultRingSize = resultRingSize
+        self._context = context or multiprocessing.get_context()
+        self._processes = []
+        self.submitted = 0
+        self.dropped = 0
+        self.received = 0
+
+    def start(self):
+        context = self._context
+        self._frames = [SharedRing(self.frameRingSize, 1, lock=context.Lock()) for _ in range(self.workers)]
+        self._results = [SharedRing(self.resultRingSize, 1, lock=context.Lock()) for _ in range(self.workers)]
+        self._frameReady = [context.Semaphore(0) for _ in range(self.workers)]
+        self._resultReady = context.Semaphore(0)
+        self._stopEvent = context.Event()
+        for index in range(self.workers):
+            process = context.Process(
+                target=_decode_worker, name='xts-decode-%d' % index, daemon=True,
+                args=(self._frames[index].name, self.frameRingSize, self._frames[index].lock,
+                      self._results[index].name, self.resultRingSize, self._results[index].lock,
+                      self.broadcastmode, self._frameReady[index], self._resultReady, self._stopEvent))
+            process.start()
+            self._processes.append(process)
+        return self
+
+    def submit(self, frame, receiveTime):
+        """Copy the packets of a raw frame into the frame rings of their workers. Returns False if any were dropped."""
+        self.submitted += 1
+        stamp = _RECEIVE_TIME.pack(receiveTime)
+        if self.workers == 1:
+            return self._put(0, stamp, frame)
+        parts = [None] * self.workers
+        for (exchangeSegment, exchangeInstrumentID, _), packet in iter_raw_packets(frame):
+            index = shard_of(exchangeSegment, exchangeInstrumentID, self.workers)
+            if parts[index] is None:
+                parts[index] = []
+            parts[index].append(packet)
+        delivered = True
+        for index, packets in enumerate(parts):
+            if packets is not None:
+                delivered = self._put(index, stamp, b''.join(packets)) and delivered
+        return delivered
+
+    def _put(self, index, stamp, data):
+        if not self._frames[index].put(stamp, data):
+            self.dropped += 1
+            return False
+        self._frameReady[index].release()
+        return True
+
+    def drain(self, timeout=None):
+        """Return decoded events, waiting up to `timeout` seconds (None waits) for the first ones."""
+        events = []
+        # one semaphore count per published record
+        pending = 1 if self._resultReady.acquire(timeout=timeout) else 0
+        while pending:
+            for ring in self._results:
+                record = ring.get()
+                if record is not None:
+                    events.extend(pickle.loads(record))
+                    pending -= 1
+                    if not pending:
+                        pending = 1 if self._resultReady.acquire(False) else 0
+                    if not pending:
+                        break
+        self.received += len(events)
+        return events
+
+    def stop(self, timeout=5):
+        """Stop the workers and release the shared memory."""
+        self._stopEvent.set()
+        for ready in self._frameReady:
+            ready.release()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        for ring in self._frames + self._results:
+            ring.close(unlink=True)
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "received": self.received,
+        }
@@ -0,0 +1,345 @@
+"""
+    DepthBook.py
+
+    Incremental order book of 1502 market depth.
+
+    The bid and ask levels of every instrument live in preallocated
+    array-backed columns, `levels` entries per side per instrument, and are
+    overwritten in place by each 1502 body without building DepthLevel
+    tuples or dicts. Every update reports which levels changed as a bit
+    mask per side, and keeps the cumulative size per level so best bid and
+    ask, spread, mid and cumulative depth are O(1) reads.
+
+    Register the book as the 1502 decoder of a MessageDispatcher and its
+    handler receives a DepthUpdate per packet instead of a decoded event:
+
+        book = DepthBook()
+        socket.dispatcher.register(1502, book, on_depth)
+
+    A DepthDiff in its place hands the handler only the levels that were
+    added, removed or modified since the previous snapshot of the
+    instrument, usually one or two instead of the whole book.
+"""
+from array import array
+from collections import namedtuple
+import Exception as ex
+from MessageLayout import decode_depth, HEAD_FIELDS, ROW_FIELDS
+from MarketDataFrame import receive_time
+
+BID = 0
+ASK = 1
+
+ADDED = 1
+REMOVED = 2
+MODIFIED = 3
+
+_SIDES = {BID: "Bid", ASK: "Ask"}
+_CHANGES = {ADDED: "added", REMOVED: "removed", MODIFIED: "modified"}
+_SIDE_CODES = {name: side for side, name in _SIDES.items()}
+_CHANGE_CODES = {name: change for change, name in _CHANGES.items()}
+
+
+class DepthUpdate(namedtuple('DepthUpdate', [
+        'ExchangeSegment', 'ExchangeInstrumentID', 'SequenceNumber', 'BidChanged', 'AskChanged', 'ReceiveTime'])):
+    """
+    One applied 1502 packet. BidChanged and AskChanged are bit masks, bit n
+    set when level n of that side changed. ReceiveTime is in ns.
+    """
+    __slots__ = ()
+
+    def changed(self, side, level):
+        return bool((self.AskChanged if side == ASK else self.BidChanged) >> level & 1)
+
+
+class LevelChange(namedtuple('LevelChange', [
+        'Side', 'Level', 'Change', 'Price', 'Size', 'Orders', 'PreviousPrice', 'PreviousSize', 'PreviousOrders'])):
+    """
+    One changed depth level. Side is BID or ASK, Change is ADDED, REMOVED or
+    MODIFIED. A removed level carries its last price with zero size and
+    orders. The Previous fields hold the level before the change, zeros for
+    an added one.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_dict(change):
+        return LevelChange(_SIDE_CODES[change["Side"]], change["Level"], _CHANGE_CODES[change["Change"]],
+                           change["Price"], change["Size"], change["Orders"], change["PreviousPrice"],
+                           change["PreviousSize"], change["PreviousOrders"])
+
+    def to_dict(self):
+        return {"Side": _SIDES[self.Side], "Level": self.Level, "Change": _CHANGES[self.Change],
+                "Price": self.Price, "Size": self.Size, "Orders": self.Orders, "PreviousPrice": self.PreviousPrice,
+                "PreviousSize": self.PreviousSize, "PreviousOrders": self.PreviousOrders}
+
+
+class DepthChanges(namedtuple('DepthChanges', [
+        'MessageCode', 'ExchangeSegment', 'ExchangeInstrumentID', 'SequenceNumber', 'Changes', 'ReceiveTime'])):
+    """1502 packet as the tuple of its LevelChange. ReceiveTime is in ns."""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            "MessageCode": self.MessageCode,
+            "ExchangeSegment": self.ExchangeSegment,
+            "ExchangeInstrumentID": self.ExchangeInstrumentID,
+            "SequenceNumber": self.SequenceNumber,
+            "Changes": [change.to_dict() for change in self.Changes],
+            "ReceiveTime": self.ReceiveTime,
+        }
+
+
+class DepthBook:
+    """
+    Bid and ask levels of every (exchangeSegment, exchangeInstrumentID) seen.
+
+    Levels beyond `levels` are ignored; sides with fewer rows have the
+    remaining levels zeroed. The book is written by the decoding thread only.
+    """
+
+    def __init__(self, levels=5):
+        if levels < 1:
+            raise ex.XTSInputException("A depth book needs at least one level")
+        self.levels = levels
+        self.updates = 0
+        self._slots = {}
+        self._keys = []
+        # per instrument and side, `levels` consecutive entries; side ASK follows side BID
+        self._price = array('d')
+        self._size = array('q')
+        self._orders = array('q')
+        self._cumulative = array('q')
+        self._count = array('i')
+        self._sequence = array('Q')
+        self._receiveTime = array('Q')
+
+    def _slot(self, key):
+        slot = len(self._keys)
+        self._slots[key] = slot
+        self._keys.append(key)
+        rows = 2 * self.levels
+        for column in (self._price, self._size, self._orders, self._cumulative):
+            column.extend(array(column.typecode, bytes(column.itemsize * rows)))
+        self._count.extend((0, 0))
+        self._sequence.append(0)
+        self._receiveTime.append(0)
+        return slot
+
+    def update(self, buffer, offset=0, receiveTime=None, changes=None):
+        """
+        Apply a 1502 body starting at `offset` (the message code). Returns its DepthUpdate.
+
+        When `changes` is a list, a LevelChange is appended to it for every changed level.
+        """
+        values, _ = decode_depth(buffer, offset)
+        key = (values[6], values[7])
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slot(key)
+        if receiveTime is None:
+            receiveTime = receive_time()
+        index = HEAD_FIELDS
+        bidChanged, index = self._apply_side(values, index, slot, BID, changes)
+        askChanged, _ = self._apply_side(values, index, slot, ASK, changes)
+        self._sequence[slot] = values[4]
+        self._receiveTime[slot] = receiveTime
+        self.updates += 1
+        return DepthUpdate(key[0], key[1], values[4], bidChanged, askChanged, receiveTime)
+
+    def _apply_side(self, values, index, slot, side, changes):
+        """Write one side's rows from `values[index]` (its row count) on. Returns the changed mask and the next index."""
+        levels = self.levels
+        count = values[index]
+        index += 1
+        end = index + count * ROW_FIELDS
+        used = count if count < levels else levels
+        base = (2 * slot + side) * levels
+        price = self._price
+        size = self._size
+        orders = self._orders
+        cumulative = self._cumulative
+        previous = self._count[2 * slot + side]
+        changed = 0
+        total = 0
+        for level in range(levels):
+            position = base + level
+            if level < used:
+                rowSize, rowPrice, rowOrders = values[index], values[index + 1], values[index + 2]
+                index += ROW_FIELDS
+            else:
+                rowSize, rowPrice, rowOrders = 0, 0.0, 0
+            if price[position] != rowPrice or size[position] != rowSize or orders[position] != rowOrders:
+                if changes is not None:
+                    if level >= used:
+                        changes.append(LevelChange(side, level, REMOVED, price[position], 0, 0,
+                                                   price[position], size[position], orders[position]))
+                    elif level >= previous:
+                        changes.append(LevelChange(side, level, ADDED, rowPrice, rowSize, rowOrders, 0.0, 0, 0))
+                    else:
+                        changes.append(LevelChange(side, level, MODIFIED, rowPrice, rowSize, rowOrders,
+                                                   price[position], size[position], orders[position]))
+                price[position] = rowPrice
+                size[position] = rowSize
+                orders[position] = rowOrders
+                changed |= 1 << level
+            total += rowSize
+            cumulative[position] = total
+        self._count[2 * slot + side] = used
+        return changed, end
+
+    def decode(self, buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """MessageDispatcher decoder interface: apply the body and return its DepthUpdate."""
+        return self.update(buffer, offset, receiveTime)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def _base(self, exchangeSegment, exchangeInstrumentID, side):
+        slot = self._slots.get((exchangeSegment, exchangeInstrumentID))
+        if slot is None:
+            raise ex.XTSDataException("No depth for instrument {segment}:{id}".format(
+                segment=exchangeSegment, id=exchangeInstrumentID))
+        return (2 * slot + side) * self.levels, slot
+
+    def level(self, exchangeSegment, exchangeInstrumentID, side, level=0):
+        """(price, size, orders) of one level, zeros when the side has fewer levels."""
+        base, _ = self._base(exchangeSegment, exchangeInstrumentID, side)
+        position = base + level
+        return self._price[position], self._size[position], self._orders[position]
+
+    def levels_of(self, exchangeSegment, exchangeInstrumentID, side):
+        """Number of levels the last update sent for `side`, up to `levels`."""
+        _, slot = self._base(exchangeSegment, exchangeInstrumentID, side)
+        return self._count[2 * slot + side]
+
+    def best_bid(self, exchangeSegment, exchangeInstrumentID):
+        """(price, size) of the best bid."""
+        base, _ = self._base(exchangeSegment, exchangeInstrumentID, BID)
+        return self._price[base], self._size[base]
+
+    def best_ask(self, exchangeSegment, exchangeInstrumentID):
+        """(price, size) of the best ask."""
+        base, _ = self._base(exchangeSegment, exchangeInstrumentID, ASK)
+        return self._price[base], self._size[base]
+
+    def spread(self, exchangeSegment, exchangeInstrumentID):
+        """Best ask - best bid, None when either side is empty."""
+        bid, slot = self._base(exchangeSegment, exchangeInstrumentID, BID)
+        ask = bid + self.levels
+        if not self._count[2 * slot] or not self._count[2 * slot + 1]:
+            return None
+        return self._price[ask] - self._price[bid]
+
+    def mid(self, exchangeSegment, exchangeInstrumentID):
+        """Midpoint of best bid and ask, None when either side is empty."""
+        bid, slot = self._base(exchangeSegment, exchangeInstrumentID, BID)
+        ask = bid + self.levels
+        if not self._count[2 * slot] or not self._count[2 * slot + 1]:
+            return None
+        return (self._price[ask] + self._price[bid]) / 2
+
+    def cumulative_depth(self, exchangeSegment, exchangeInstrumentID, side, levels=None):
+        """Total size of the best `levels` levels of `side`, all levels by default."""
+        base, _ = self._base(exchangeSegment, exchangeInstrumentID, side)
+        if levels is None or levels > self.levels:
+            levels = self.levels
+        return self._cumulative[base + levels - 1] if levels > 0 else 0
+
+    def sequence_number(self, exchangeSegment, exchangeInstrumentID):
+        _, slot = self._base(exchangeSegment, exchangeInstrumentID, BID)
+        return self._sequence[slot]
+
+    def receive_time(self, exchangeSegment, exchangeInstrumentID):
+        """Receive time in ns of the last update."""
+        _, slot = self._base(exchangeSegment, exchangeInstrumentID, BID)
+        return self._receiveTime[slot]
+
+    def side(self, exchangeSegment, exchangeInstrumentID, side):
+        """List of (price, size, orders) of the levels the last update sent for `side`."""
+        base, slot = self._base(exchangeSegment, exchangeInstrumentID, side)
+        return [(self._price[position], self._size[position], self._orders[position])
+                for position in range(base, base + self._count[2 * slot + side])]
+
+    def instruments(self):
+        return list(self._keys)
+
+
+class DepthDiff:
+    """
+    1502 decoder that delivers DepthChanges instead of the full book.
+
+    Compares every snapshot with the previous one of its instrument in
+    `book`, a DepthBook of `levels` levels unless one is given. The first
+    snapshot of an instrument reports all its levels as added. A snapshot
+    that changes no level returns None, so handlers see no event. Full
+    broadcast mode delivers the dict form.
+
+    A diff only holds the levels that changed, so dropping one loses
+    changes. A Conflator of 1502 needs `merges={1502: DepthDiff.merge}`,
+    which folds a superseded diff into the next one.
+    """
+
+    def __init__(self, levels=5, book=None):
+        self.book = book if book is not None else DepthBook(levels)
+        self.levelsChanged = 0
+
+    def decode(self, buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """MessageDispatcher decoder interface."""
+        changes = []
+        update = self.book.update(buffer, offset, receiveTime, changes)
+        if not changes:
+            return None
+        self.levelsChanged += len(changes)
+        event = DepthChanges(messagecode, update.ExchangeSegment, update.ExchangeInstrumentID,
+                             update.SequenceNumber, tuple(changes), update.ReceiveTime)
+        return event.to_dict() if broadcastmode == "Full" else event
+
+    @staticmethod
+    def merge(earlier, later):
+        """
+        One diff with the changes of `earlier` followed by `later`, in the form of `later`.
+
+        The result equals the diff from the snapshot before `earlier` to the
+        one of `later`: levels that ended where they started are left out and
+        a removed level carries the price the consumer last saw.
+        """
+        isDict = isinstance(later, dict)
+        if isDict:
+            earlierChanges = [LevelChange.from_dict(change) for change in earlier["Changes"]]
+            laterChanges = [LevelChange.from_dict(change) for change in later["Changes"]]
+        else:
+            earlierChanges, laterChanges = earlier.Changes, later.Changes
+        merged = {(change.Side, change.Level): change for change in earlierChanges}
+        for change in laterChanges:
+            key = (change.Side, change.Level)
+            first = merged.pop(key, None)
+            if first is None:
+                merged[key] = change
+                continue
+            before = first.PreviousPrice, first.PreviousSize, first.PreviousOrders
+            if first.Change == ADDED:
+                if change.Change != REMOVED:
+                    merged[key] = change._replace(Change=ADDED, PreviousPrice=before[0], PreviousSize=before[1],
+                                                  PreviousOrders=before[2])
+            elif change.Change == REMOVED:
+                merged[key] = change._replace(Price=before[0], PreviousPrice=before[0], PreviousSize=before[1],
+                                              PreviousOrders=before[2])
+            elif (change.Price, change.Size, change.Orders) != before:
+                merged[key] = change._replace(Change=MODIFIED, PreviousPrice=before[0], PreviousSize=before[1],
+                                              PreviousOrders=before[2])
+        changes = tuple(merged[key] for key in sorted(merged))
+        if isDict:
+            event = dict(later)
+            event["Changes"] = [change.to_dict() for change in changes]
+            return event
+        return later._replace(Changes=changes)
+
+    def stats(self):
+        """Snapshots applied and levels delivered, against the levels a full book would have sent."""
+        updates = self.book.updates
+        return {
+            "updates": updates,
+            "levelsChanged": self.levelsChanged,
+            "levelsPerUpdate": self.levelsChanged / updates if updates else 0,
+            "fullBookLevels": updates * 2 * self.book.levels,
+        }
@@ -0,0 +1,174 @@
+"""
+    FrameRecorder.py
+
+    Append-only capture of raw market data socket frames.
+
+    A recording is a segment file starting with FILE_MAGIC followed by one
+    record per frame: RECORD (frame length, receive time in ns) and the frame
+    bytes as received, compressed packets included.
+
+    The sidecar index (`<path>.idx`) is a sequence of INDEX_ENTRY
+    (receiveTime, offset, exchangeSegment, exchangeInstrumentID) records:
+
+    - a time entry, with segment and instrument -1, for the first frame of
+      every `indexInterval` ns block
+    - an instrument entry for the first frame of each block that carries a
+      packet of that instrument
+
+    Writes go through a buffered file; a background thread reads the packet
+    headers for the instrument entries and flushes and fsyncs the segment
+    and the index every `fsyncInterval` seconds, so the socket thread only
+    pays for two buffered writes per frame and never parses a frame.
+"""
+import os
+import struct
+import threading
+from MarketDataFrame import iter_raw_packets
+
+FILE_MAGIC = b'XTSREC01'
+RECORD = struct.Struct('<IQ')
+INDEX_ENTRY = struct.Struct('<QQhi')
+TIME_ENTRY = -1
+
+
+def index_path(path):
+    """Path of the sidecar index of a recording."""
+    return path + '.idx'
+
+
+def load_index(path):
+    """
+    Read the sidecar index of a recording.
+
+    Returns (times, offsets, instruments): the time entries as two sorted
+    lists, and a dict of (exchangeSegment, exchangeInstrumentID) to the list
+    of (receiveTime, offset) of the blocks the instrument appears in.
+    """
+    times = []
+    offsets = []
+    instruments = {}
+    with open(index_path(path), 'rb') as f:
+        data = f.read()
+    # a torn last entry from a crash is ignored
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    for receiveTime, offset, exchangeSegment, exchangeInstrumentID in INDEX_ENTRY.iter_unpack(data[:usable]):
+        if exchangeSegment == TIME_ENTRY:
+            times.append(receiveTime)
+            offsets.append(offset)
+        else:
+            instruments.setdefault((exchangeSegment, exchangeInstrumentID), []).append((receiveTime, offset))
+    return times, offsets, instruments
+
+
+class FrameRecorder:
+    """
+    Records raw frames to `path` and its sidecar index.
+
+    - `write(frame, receiveTime)` is called from the socket thread.
+    - `indexInstruments=False` keeps only time entries and skips reading
+      the packet headers. Frames whose headers can not be read are still
+      recorded, they are only left out of the instrument entries and
+      counted in `unindexed`.
+    """
+
+    def __init__(self, path, fsyncInterval=1.0, bufferSize=1 << 20, indexInterval=1000000000,
+                 indexInstruments=True):
+        self.path = path
+        self.fsyncInterval = fsyncInterval
+        self.indexInterval = indexInterval
+        self.indexInstruments = indexInstruments
+        self._file = open(path, 'ab', buffering=bufferSize)
+        self._index = open(index_path(path), 'ab', buffering=bufferSize)
+        if self._file.tell() == 0:
+            self._file.write(FILE_MAGIC)
+        self.offset = self._file.tell()
+        self.frames = 0
+        self.bytes = 0
+        self.syncs = 0
+        self.unindexed = 0
+        self._blockEnd = 0
+        # frames waiting for their instrument entries, and the block the indexing thread is in
+        self._unindexed = []
+        self._indexBlockEnd = 0
+        self._blockInstruments = set()
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread = threading.Thread(target=self._sync_loop, name='xts-frame-recorder', daemon=True)
+        self._thread.start()
+
+    def write(self, frame, receiveTime):
+        """Append one frame with its receive time in ns."""
+        with self._lock:
+            offset = self.offset
+            if receiveTime >= self._blockEnd:
+                self._blockEnd = receiveTime - receiveTime % self.indexInterval + self.indexInterval
+                self._index.write(INDEX_ENTRY.pack(receiveTime, offset, TIME_ENTRY, TIME_ENTRY))
+            if self.indexInstruments:
+                self._unindexed.append((receiveTime, offset, frame))
+            self._file.write(RECORD.pack(len(frame), receiveTime))
+            self._file.write(frame)
+            self.offset = offset + RECORD.size + len(frame)
+            self.frames += 1
+            self.bytes += len(frame)
+
+    def __call__(self, frame, receiveTime):
+        self.write(frame, receiveTime)
+
+    def _index_instruments(self):
+        """Write the instrument entries of the frames recorded since the last call."""
+        with self._lock:
+            frames, self._unindexed = self._unindexed, []
+        entries = []
+        blockInstruments = self._blockInstruments
+        for receiveTime, offset, frame in frames:
+            if receiveTime >= self._indexBlockEnd:
+                self._indexBlockEnd = receiveTime - receiveTime % self.indexInterval + self.indexInterval
+                blockInstruments.clear()
+            try:
+                for key, _ in iter_raw_packets(frame):
+                    instrument = key[:2]
+                    if instrument not in blockInstruments:
+                        blockInstruments.add(instrument)
+                        entries.append(INDEX_ENTRY.pack(receiveTime, offset, instrument[0], instrument[1]))
+            except Exception:
+                self.unindexed += 1
+        if entries:
+            with self._lock:
+                if not self._index.closed:
+                    self._index.write(b''.join(entries))
+
+    def sync(self):
+        """Index the pending frames, then flush both files and fsync them."""
+        self._index_instruments()
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._index.flush()
+        # fsync outside the lock, the socket thread keeps writing to the buffers
+        os.fsync(self._file.fileno())
+        os.fsync(self._index.fileno())
+        self.syncs += 1
+
+    def _sync_loop(self):
+        while not self._stopEvent.wait(self.fsyncInterval):
+            self.sync()
+
+    def close(self):
+        """Stop the sync thread, then flush, fsync and close the recording."""
+        self._stopEvent.set()
+        self._thread.join()
+        self.sync()
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "offset": self.offset,
+            "syncs": self.syncs,
+            "unindexed": self.unindexed,
+        }
@@ -0,0 +1,148 @@
+"""
+    FrameReplay.py
+
+    Replay of a FrameRecorder capture through the live decode path.
+
+    The capture is memory mapped and every frame is handed out as a
+    memoryview of the mapping, so nothing is copied. Frames go to any
+    `target(frame, receiveTime)`, normally MDSocket_io.process_frame, which
+    runs the same framing, filtering and dispatch as the socket callback:
+
+        replay = FrameReplay(path)
+        replay.seek_time(start)
+        replay.run(soc.process_frame, speed=10)
+"""
+import bisect
+import mmap
+import time
+import Exception as ex
+from FrameRecorder import FILE_MAGIC, RECORD, load_index
+
+
+class FrameReplay:
+    """
+    Memory mapped reader of a recording.
+
+    `speed` in run() is the replay rate relative to the recorded receive
+    times: 1 for real time, N for N times faster, None for as fast as
+    possible.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._view = None
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ex.XTSDataException("{path} is not a frame recording".format(path=path))
+        self._view = memoryview(self._map)
+        self.offset = len(FILE_MAGIC)
+        self._index = None
+
+    @property
+    def index(self):
+        """(times, offsets, instruments) of the sidecar index, loaded on first use."""
+        if self._index is None:
+            self._index = load_index(self.path)
+        return self._index
+
+    def frames(self, stopTime=None):
+        """
+        Yield (frame, receiveTime) from the current offset, with `frame` a
+        memoryview of the mapping. Stops at the end of the file, at a torn
+        last record or at the first frame after `stopTime`.
+        """
+        view = self._view
+        size = len(view)
+        offset = self.offset
+        while offset + RECORD.size <= size:
+            length, receiveTime = RECORD.unpack_from(view, offset)
+            end = offset + RECORD.size + length
+            if end > size or (stopTime is not None and receiveTime > stopTime):
+                break
+            self.offset = end
+            yield view[offset + RECORD.size:end], receiveTime
+            offset = end
+
+    def run(self, target, speed=None, stopTime=None):
+        """Feed frames to `target(frame, receiveTime)` at `speed`. Returns the frame count."""
+        count = 0
+        if not speed:
+            for frame, receiveTime in self.frames(stopTime):
+                target(frame, receiveTime)
+                count += 1
+            return count
+        firstTime = None
+        for frame, receiveTime in self.frames(stopTime):
+            if firstTime is None:
+                firstTime = receiveTime
+                start = time.perf_counter_ns()
+            delay = (receiveTime - firstTime) / speed - (time.perf_counter_ns() - start)
+            if delay > 0:
+                time.sleep(delay / 1e9)
+            target(frame, receiveTime)
+            count += 1
+        return count
+
+    def rewind(self):
+        self.offset = len(FILE_MAGIC)
+
+    def seek_time(self, receiveTime):
+        """Position on the first frame received at or after `receiveTime`."""
+        times, offsets, _ = self.index
+        position = bisect.bisect_right(times, receiveTime) - 1
+        self.offset = offsets[position] if position >= 0 else len(FILE_MAGIC)
+        self._skip_before(receiveTime)
+
+    def seek_instrument(self, exchangeSegment, exchangeInstrumentID, receiveTime=0):
+        """
+        Position on the first indexed frame of an instrument at or after the
+        block of `receiveTime`. Returns False, leaving the position, when the
+        instrument does not appear there.
+        """
+        times, _, instruments = self.index
+        blocks = instruments.get((exchangeSegment, exchangeInstrumentID), [])
+        # the block holding receiveTime starts at its time entry
+        block = bisect.bisect_right(times, receiveTime) - 1
+        position = bisect.bisect_left(blocks, (times[block] if block >= 0 else 0, 0))
+        if position == len(blocks):
+            return False
+        self.offset = blocks[position][1]
+        return True
+
+    def _skip_before(self, receiveTime):
+        view = self._view
+        while self.offset + RECORD.size <= len(view):
+            length, frameTime = RECORD.unpack_from(view, self.offset)
+            if frameTime >= receiveTime:
+                return
+            self.offset += RECORD.size + length
+
+    def close(self):
+        """
+        Unmap the recording and close the file.
+
+        The mapping can not be closed while frames handed out by frames()
+        or a suspended frames() generator are alive; the file is closed
+        anyway and XTSDataException is raised, call close() again once they
+        are released.
+        """
+        try:
+            if self._view is not None:
+                self._view.release()
+                self._view = None
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+        except BufferError:
+            raise ex.XTSDataException("{path} still has frames in use, release them before closing".format(
+                path=self.path))
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
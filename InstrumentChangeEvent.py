@@ -0,0 +1,62 @@
+from MessageLayout import decode_instrumentchange
+from MarketDataFrame import receive_time
+from collections import namedtuple
+
+
+class InstrumentChangeEvent(namedtuple('InstrumentChangeEvent', [
+        'MessageCode', 'MessageVersion', 'ApplicationType', 'TokenID', 'ExchangeSegment', 'ExchangeInstrumentID',
+        'ExchangeTimeStamp', 'BookType', 'XMarketType', 'SequenceNumber', 'PriceBandHigh', 'PriceBandLow',
+        'HighExecutionBand', 'LowExecutionBand', 'FreezeQuantity', 'LastUpdateTime', 'ReceiveTime'])):
+    """
+    Compact 1105 event, returned in "Compact" broadcast mode. ReceiveTime is
+    in ns; LastUpdateTime is the one the exchange sent with the message.
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return the dict produced by the "Full" broadcast mode, whose LastUpdateTime is the exchange's."""
+        data = self._asdict()
+        del data["ReceiveTime"]
+        return data
+
+
+class InstrumentChange:
+    @staticmethod
+    def deserialize(reader, count, messagecode, broadcastmode):
+        # reader is positioned just past the message code of the body
+        values, end = decode_instrumentchange(reader.buffer(), reader.pos() - 2)
+        reader.seek(end)
+        return InstrumentChange.from_values(values, messagecode, broadcastmode)
+
+    @staticmethod
+    def decode(buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """Decode a 1105 body starting at `offset` (the message code) of `buffer`."""
+        values, end = decode_instrumentchange(buffer, offset)
+        return InstrumentChange.from_values(values, messagecode, broadcastmode, receiveTime)
+
+    @staticmethod
+    def from_values(values, messagecode, broadcastmode, receiveTime=None):
+        (_, messageVersion, applicationType, tokenID, sequenceNumber, SkipBytes,
+         exchangeSegment, exchangeInstrumentId, exchangeTimestamp,
+         Booktype, MarketType, priceBandHigh, priceBandLow, highExecutionBand, lowExecutionBand,
+         freezeQuantity, lut) = values
+
+        if broadcastmode == "Compact" or broadcastmode == "Full":
+            if receiveTime is None:
+                receiveTime = receive_time()
+            event = InstrumentChangeEvent(
+                messagecode, messageVersion, applicationType, tokenID, exchangeSegment, exchangeInstrumentId,
+                exchangeTimestamp, Booktype, MarketType, sequenceNumber, priceBandHigh, priceBandLow,
+                highExecutionBand, lowExecutionBand, freezeQuantity, lut, receiveTime)
+            return event if broadcastmode == "Compact" else event.to_dict()
+
+        elif broadcastmode == "Partial":
+            return (
+                f"t:{exchangeSegment}_{exchangeInstrumentId},"
+                f"hpb:{priceBandHigh},"
+                f"lpb:{priceBandLow},"
+                f"heb:{highExecutionBand},"
+                f"leb:{lowExecutionBand},"
+                f"fq:{freezeQuantity},"
+                f"lut:{lut}"
+            )
@@ -0,0 +1,54 @@
+from MessageLayout import decode_ltp
+from collections import namedtuple
+from MarketDataFrame import receive_time, format_receive_time
+
+
+class LTPEvent(namedtuple('LTPEvent', [
+        'MessageCode', 'MessageVersion', 'ApplicationType', 'TokenID', 'ExchangeSegment', 'ExchangeInstrumentID',
+        'ExchangeTimeStamp', 'BookType', 'XMarketType', 'SequenceNumber', 'LastTradedPrice', 'LastTradedQuantity',
+        'LastUpdateTime'])):
+    """Compact 1512 event, returned in "Compact" broadcast mode. LastUpdateTime is the receive time in ns."""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return the dict produced by the "Full" broadcast mode."""
+        data = self._asdict()
+        data["LastUpdateTime"] = format_receive_time(self.LastUpdateTime)
+        return data
+
+
+class LTP:
+    @staticmethod
+    def deserialize(reader, count, messagecode, broadcastmode):
+        # reader is positioned just past the message code of the body
+        values, end = decode_ltp(reader.buffer(), reader.pos() - 2)
+        reader.seek(end)
+        return LTP.from_values(values, messagecode, broadcastmode)
+
+    @staticmethod
+    def decode(buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """Decode a 1512 body starting at `offset` (the message code) of `buffer`."""
+        values, end = decode_ltp(buffer, offset)
+        return LTP.from_values(values, messagecode, broadcastmode, receiveTime)
+
+    @staticmethod
+    def from_values(values, messagecode, broadcastmode, receiveTime=None):
+        (_, messageVersion, applicationType, tokenID, sequenceNumber, SkipBytes,
+         exchangeSegment, exchangeInstrumentId, exchangeTimestamp,
+         Booktype, MarketType, LTP, ltq, lut) = values
+
+        if broadcastmode == "Compact" or broadcastmode == "Full":
+            if receiveTime is None:
+                receiveTime = receive_time()
+            event = LTPEvent(
+                messagecode, messageVersion, applicationType, tokenID, exchangeSegment, exchangeInstrumentId,
+                exchangeTimestamp, Booktype, MarketType, sequenceNumber, LTP, ltq, receiveTime)
+            return event if broadcastmode == "Compact" else event.to_dict()
+
+        elif broadcastmode == "Partial":
+            return (
+                f"t:{exchangeSegment}_{exchangeInstrumentId},"
+                f"ltp:{LTP},"
+                f"ltq:{ltq},"
+                f"lut:{lut}"
+            )
@@ -0,0 +1,222 @@
+"""
+    LatencyHistogram.py
+
+    Exchange to client latency of the market data feed.
+
+    A LatencyMonitor keeps two HDR-style histograms per (messageCode,
+    exchangeSegment):
+
+    - "receive": receive time - ExchangeTimeStamp, the broker and network lag
+    - "handler": handler return time - receive time, our own queueing,
+      decode and callback lag
+
+    ExchangeTimeStamp only has whole second resolution, so the receive
+    histogram tells seconds of staleness apart, not milliseconds. The
+    histograms can be queried at any time and dumped periodically as JSON
+    lines.
+"""
+import json
+import threading
+from array import array
+from time import time_ns
+import Exception as ex
+from MarketDataFrame import exchange_time_ns
+from MessageLayout import exchange_timestamp
+
+RECEIVE = "receive"
+HANDLER = "handler"
+
+_SUB_BUCKET_BITS = 7
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+_HALF = _SUB_BUCKETS // 2
+
+
+def _index(value):
+    shift = value.bit_length() - _SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return shift * _HALF + (value >> shift)
+
+
+def _highest(index):
+    """Highest value counted in bucket `index`."""
+    if index < _SUB_BUCKETS:
+        return index
+    shift = index // _HALF - 1
+    return ((index - shift * _HALF + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of non-negative ns values, within 1/64 relative precision.
+
+    Values above `highest` are counted as `highest`; negative values, from
+    clocks running apart, are counted as 0 and in `negative`.
+    """
+
+    def __init__(self, highest=3600 * 1000000000):
+        if highest < _SUB_BUCKETS:
+            raise ex.XTSInputException("highest must be at least {n}".format(n=_SUB_BUCKETS))
+        self.highest = highest
+        self.counts = array('Q', bytes(8 * (_index(highest) + 1)))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.negative = 0
+
+    def record(self, value):
+        if value < 0:
+            self.negative += 1
+            value = 0
+        elif value > self.highest:
+            value = self.highest
+        self.counts[_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def add(self, other):
+        """Add the counts of another histogram with the same `highest`."""
+        if other.highest != self.highest:
+            raise ex.XTSInputException("Histograms with different ranges can not be added")
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.negative += other.negative
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def reset(self):
+        self.counts = array('Q', bytes(8 * len(self.counts)))
+        self.count = self.total = self.negative = 0
+        self.min = self.max = None
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, percent):
+        """Value at `percent` (0 to 100), as the highest value of its bucket."""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_highest(index), self.max)
+        return self.max
+
+    def summary(self, percents=(50, 90, 99, 99.9)):
+        """Count, min, mean, max and the `percents` as a dict of ns values."""
+        result = {
+            "count": self.count,
+            "min": self.min or 0,
+            "mean": self.mean(),
+            "max": self.max or 0,
+            "negative": self.negative,
+        }
+        for percent in percents:
+            result["p%g" % percent] = self.percentile(percent)
+        return result
+
+
+class LatencyMonitor:
+    """
+    Receive and handler latency histograms per (messageCode, exchangeSegment).
+
+    Pass it to MDSocket_io as `latencyMonitor`, or call `record_body` and
+    `record_handler` from your own frame loop.
+    """
+
+    def __init__(self, highest=3600 * 1000000000):
+        self.highest = highest
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._dumpStop = None
+
+    def _histogram(self, kind, messageCode, exchangeSegment):
+        key = (kind, messageCode, exchangeSegment)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram(self.highest))
+        return histogram
+
+    def record_receive(self, messageCode, exchangeSegment, exchangeTimeStamp, receiveTime):
+        """Record receive time - exchange time of a packet, from its raw ExchangeTimeStamp."""
+        self._histogram(RECEIVE, messageCode, exchangeSegment).record(
+            receiveTime - exchange_time_ns(exchangeTimeStamp))
+
+    def record_body(self, messageCode, exchangeSegment, body, receiveTime):
+        """Record the receive latency of a raw body without decoding it."""
+        self.record_receive(messageCode, exchangeSegment, exchange_timestamp(body, 0), receiveTime)
+
+    def record_handler(self, messageCode, exchangeSegment, receiveTime):
+        """Record now - receive time, call it once the handler returned."""
+        self._histogram(HANDLER, messageCode, exchangeSegment).record(time_ns() - receiveTime)
+
+    def histogram(self, kind, messageCode=None, exchangeSegment=None):
+        """One histogram of `kind` merged over the matching message codes and segments, None matches all."""
+        merged = LatencyHistogram(self.highest)
+        with self._lock:
+            histograms = list(self._histograms.items())
+        for (histogramKind, histogramCode, histogramSegment), histogram in histograms:
+            if (histogramKind == kind and (messageCode is None or histogramCode == messageCode) and
+                    (exchangeSegment is None or histogramSegment == exchangeSegment)):
+                merged.add(histogram)
+        return merged
+
+    def snapshot(self, percents=(50, 90, 99, 99.9)):
+        """Summaries of every histogram, as a list of dicts."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        result = []
+        for (kind, messageCode, exchangeSegment), histogram in histograms:
+            summary = histogram.summary(percents)
+            summary.update(kind=kind, messageCode=messageCode, exchangeSegment=exchangeSegment)
+            result.append(summary)
+        return result
+
+    def reset(self):
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.reset()
+
+    def start_dump(self, interval, target, reset=False):
+        """
+        Dump the snapshot every `interval` seconds on a background thread.
+
+        `target` is a path the snapshot is appended to as one JSON line with
+        its time, or a callable receiving the snapshot. With `reset`, every
+        dump covers only the interval since the previous one.
+        """
+        if self._dumpStop is not None:
+            raise ex.XTSInputException("Latency dump already started")
+        self._dumpStop = threading.Event()
+        threading.Thread(target=self._dump_loop, args=(interval, target, reset, self._dumpStop),
+                         name='xts-latency-dump', daemon=True).start()
+
+    def stop_dump(self):
+        if self._dumpStop is not None:
+            self._dumpStop.set()
+            self._dumpStop = None
+
+    def _dump_loop(self, interval, target, reset, stopEvent):
+        while not stopEvent.wait(interval):
+            snapshot = self.snapshot()
+            if reset:
+                self.reset()
+            if callable(target):
+                target(snapshot)
+            else:
+                with open(target, 'a') as f:
+                    f.write(json.dumps({"time": time_ns(), "histograms": snapshot}) + "\n")
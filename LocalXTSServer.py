@@ -0,0 +1,475 @@
+"""
+    LocalXTSServer.py
+
+    Self-contained local stand-in for the XTS market data and interactive
+    APIs, for load tests and benchmarks away from the live broker.
+
+    - every REST route of XTSConnect._routes answers; login, subscription,
+      quotes, orders, trades, positions and the user routes keep state, the
+      rest reply with an empty success
+    - `apibinarymarketdata/socket.io` emits synthetic `xts-binary-packet`
+      frames for the subscribed instruments at `rate` packets per second,
+      `packetsPerFrame` per frame, every `compressedEvery`-th one compressed
+    - `interactive/socket.io` emits `order` and `trade` events for the
+      orders placed, modified and cancelled through the REST routes
+    - POST /standin/rate {"rate", "packetsPerFrame"} and GET /standin/stats
+      let a load tool in another process drive the stream
+
+    Point config.ini at it and use the regular clients:
+
+        [root_url]
+        hostlookupurl = http://127.0.0.1:8080
+        marketdata_root = http://127.0.0.1:8080
+
+        python LocalXTSServer.py --port 8080 --rate 5000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import time
+from urllib.parse import parse_qs
+import socketio
+from aiohttp import web
+from Connect import XTSConnect
+from MessageDispatcher import default_dispatcher
+from SyntheticPackets import LATEST_VERSION, PacketGenerator, body
+
+INTERACTIVE_PREFIX = '/interactive'
+
+
+def _success(result, description="Request successful", code="s-response-0001"):
+    return web.json_response({"type": "success", "code": code, "description": description, "result": result})
+
+
+def _error(description, status=400, code="e-response-0005"):
+    return web.json_response({"type": "error", "code": code, "description": description, "result": {}},
+                             status=status)
+
+
+class _ClientManager(socketio.AsyncManager):
+    """AsyncManager whose emit gathers the per-client sends, asyncio.wait no longer takes coroutines."""
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        if namespace not in self.rooms or room not in self.rooms[namespace]:
+            return
+        await asyncio.gather(*[
+            self.server._emit_internal(
+                sid, event, data, namespace,
+                self._generate_ack_id(sid, namespace, callback) if callback is not None else None)
+            for sid in self.get_participants(namespace, room) if sid != skip_sid])
+
+
+class Session:
+    """State of one logged in token."""
+
+    def __init__(self, token, userID, generator):
+        self.token = token
+        self.userID = userID
+        self.generator = generator
+        self.subscriptions = set()
+        self.sent = 0
+
+
+class LocalXTSServer:
+
+    def __init__(self, host='127.0.0.1', port=8080, rate=1000, packetsPerFrame=10, compressedEvery=2,
+                 messageVersion=LATEST_VERSION, userID='STANDIN'):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.packetsPerFrame = packetsPerFrame
+        self.compressedEvery = compressedEvery
+        self.messageVersion = messageVersion
+        self.userID = userID
+        self.sessions = {}
+        self.orders = {}
+        self.trades = []
+        self.framesSent = 0
+        self.packetsSent = 0
+        self._tokens = itertools.count(1)
+        self._orderIDs = itertools.count(10000001)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._publisher = None
+
+        self.app = web.Application()
+        self.marketdata = socketio.AsyncServer(async_mode='aiohttp', client_manager=_ClientManager())
+        self.marketdata.attach(self.app, socketio_path='apibinarymarketdata/socket.io')
+        self.marketdata.on('connect', self.on_marketdata_connect)
+        self.interactive = socketio.AsyncServer(async_mode='aiohttp', client_manager=_ClientManager())
+        self.interactive.attach(self.app, socketio_path='interactive/socket.io')
+        self.interactive.on('connect', self.on_interactive_connect)
+        self._add_routes()
+        self.app.on_startup.append(self._on_startup)
+
+    ####################################################################################################
+    # Routes
+    ####################################################################################################
+
+    def _add_routes(self):
+        md = '/apibinarymarketdata'
+        self._handlers = {
+            ('POST', '/hostlookup'): self.hostlookup,
+            ('POST', md + '/auth/login'): self.login,
+            ('DELETE', md + '/auth/logout'): self.logout,
+            ('POST', md + '/instruments/subscription'): self.subscribe,
+            ('PUT', md + '/instruments/subscription'): self.unsubscribe,
+            ('POST', md + '/instruments/quotes'): self.quotes,
+            ('POST', INTERACTIVE_PREFIX + '/user/session'): self.login,
+            ('DELETE', INTERACTIVE_PREFIX + '/user/session'): self.logout,
+            ('GET', INTERACTIVE_PREFIX + '/user/profile'): self.profile,
+            ('GET', INTERACTIVE_PREFIX + '/user/balance'): self.balance,
+            ('GET', INTERACTIVE_PREFIX + '/orders'): self.order_book,
+            ('POST', INTERACTIVE_PREFIX + '/orders'): self.place_order,
+            ('PUT', INTERACTIVE_PREFIX + '/orders'): self.modify_order,
+            ('DELETE', INTERACTIVE_PREFIX + '/orders'): self.cancel_order,
+            ('POST', INTERACTIVE_PREFIX + '/orders/cancelall'): self.cancel_all,
+            ('GET', INTERACTIVE_PREFIX + '/orders/trades'): self.trade_book,
+            ('GET', INTERACTIVE_PREFIX + '/portfolio/positions'): self.positions,
+            ('GET', INTERACTIVE_PREFIX + '/portfolio/holdings'): self.holdings,
+        }
+        paths = set()
+        for route in XTSConnect._routes.values():
+            if not route.startswith('/'):
+                continue
+            if 'apibinarymarketdata' not in route and 'hostlookup' not in route:
+                route = INTERACTIVE_PREFIX + route
+            paths.add(route)
+        for path in sorted(paths):
+            self.app.router.add_route('*', path, self._route)
+        # control routes for load tools driving a server in another process
+        self.app.router.add_post('/standin/rate', self._rate_route)
+        self.app.router.add_get('/standin/stats', self._stats_route)
+
+    async def _rate_route(self, request):
+        params = await request.json()
+        self.set_rate(int(params['rate']), params.get('packetsPerFrame'))
+        return _success(self.stats())
+
+    async def _stats_route(self, request):
+        return _success(self.stats())
+
+    async def _route(self, request):
+        handler = self._handlers.get((request.method, request.path))
+        unauthenticated = request.path.endswith(('/hostlookup', '/auth/login', '/user/session'))
+        if not (unauthenticated and request.method == 'POST'):
+            session = self.sessions.get(request.headers.get('Authorization'))
+            if session is None:
+                return _error("Invalid Token", code="e-session-0007")
+            request['session'] = session
+        if handler is None:
+            return _success({})
+        return await handler(request)
+
+    @staticmethod
+    async def _params(request):
+        if request.method in ('GET', 'DELETE'):
+            return dict(request.query)
+        text = await request.text()
+        try:
+            return json.loads(text)
+        except ValueError:
+            return {key: values[0] for key, values in parse_qs(text).items()}
+
+    async def hostlookup(self, request):
+        return _success({"connectionString": "http://{host}:{port}{prefix}".format(
+            host=self.host, port=self.port, prefix=INTERACTIVE_PREFIX), "uniqueKey": "standin"})
+
+    async def login(self, request):
+        token = 'standin-token-%d' % next(self._tokens)
+        self.sessions[token] = Session(token, self.userID, PacketGenerator(
+            (), messageVersion=self.messageVersion, compressedEvery=self.compressedEvery))
+        return _success({"token": token, "userID": self.userID, "appVersion": "standin"},
+                        "Logged in successfully")
+
+    async def logout(self, request):
+        session = request['session']
+        del self.sessions[session.token]
+        await self.marketdata.close_room(session.token)
+        return _success({}, "User logged out successfully")
+
+    @staticmethod
+    def _keys(params):
+        messageCode = int(params['xtsMessageCode'])
+        return [(int(i['exchangeSegment']), int(i['exchangeInstrumentID']), messageCode)
+                for i in params['instruments']]
+
+    async def subscribe(self, request):
+        session = request['session']
+        params = await self._params(request)
+        keys = self._keys(params)
+        session.subscriptions.update(keys)
+        session.generator.set_keys(session.subscriptions)
+        return _success({"mdp": int(params['xtsMessageCode']), "quotesList": [
+            {"exchangeSegment": key[0], "exchangeInstrumentID": key[1]} for key in keys], "listQuotes": []},
+            "Instrument subscribed successfully!", "s-subscription-0001")
+
+    async def unsubscribe(self, request):
+        session = request['session']
+        params = await self._params(request)
+        keys = self._keys(params)
+        session.subscriptions.difference_update(keys)
+        session.generator.set_keys(session.subscriptions)
+        return _success({"mdp": int(params['xtsMessageCode']), "unsubList": [
+            {"exchangeSegment": key[0], "exchangeInstrumentID": key[1]} for key in keys]},
+            "Instrument unsubscribed successfully!", "s-unsubscription-0001")
+
+    async def quotes(self, request):
+        params = await self._params(request)
+        events = []
+        dispatcher = default_dispatcher(events.append)
+        for exchangeSegment, exchangeInstrumentID, messageCode in self._keys(params):
+            if messageCode in dispatcher:
+                dispatcher.dispatch(messageCode, body(messageCode, exchangeSegment, exchangeInstrumentID),
+                                    "Full", time.time_ns())
+        return _success({"mdp": int(params['xtsMessageCode']), "quotesList": [],
+                         "listQuotes": [json.dumps(event) for event in events]})
+
+    async def profile(self, request):
+        return _success({"ClientId": self.userID, "ClientName": "Local stand-in"})
+
+    async def balance(self, request):
+        return _success({"BalanceList": [{"limitObject": {"RMSSubLimits": {"netMarginAvailable": "1000000"}}}]})
+
+    ####################################################################################################
+    # Orders
+    ####################################################################################################
+
+    async def order_book(self, request):
+        params = await self._params(request)
+        if 'appOrderID' in params:
+            order = self.orders.get(int(params['appOrderID']))
+            return _success([order] if order else [])
+        return _success(list(self.orders.values()))
+
+    async def trade_book(self, request):
+        return _success(list(self.trades))
+
+    async def holdings(self, request):
+        return _success({"RMSHoldings": {"Holdings": {}}})
+
+    async def place_order(self, request):
+        params = await self._params(request)
+        appOrderID = next(self._orderIDs)
+        order = {
+            "AppOrderID": appOrderID,
+            "ExchangeSegment": params.get("exchangeSegment"),
+            "ExchangeInstrumentID": int(params.get("exchangeInstrumentID", 0)),
+            "ProductType": params.get("productType"),
+            "OrderType": params.get("orderType"),
+            "OrderSide": params.get("orderSide"),
+            "TimeInForce": params.get("timeInForce"),
+            "OrderQuantity": int(params.get("orderQuantity", 0)),
+            "OrderPrice": float(params.get("limitPrice", 0)),
+            "OrderStopPrice": float(params.get("stopPrice", 0)),
+            "OrderUniqueIdentifier": params.get("orderUniqueIdentifier"),
+            "OrderStatus": "New",
+            "LeavesQuantity": int(params.get("orderQuantity", 0)),
+            "CumulativeQuantity": 0,
+        }
+        self.orders[appOrderID] = order
+        await self._emit_order(request['session'], order)
+        if order["OrderType"] == XTSConnect.ORDER_TYPE_MARKET:
+            await self._fill(request['session'], order)
+        return _success({"AppOrderID": appOrderID, "OrderUniqueIdentifier": order["OrderUniqueIdentifier"]})
+
+    async def modify_order(self, request):
+        params = await self._params(request)
+        order = self.orders.get(int(params.get("appOrderID", 0)))
+        if order is None or order["OrderStatus"] in ("Filled", "Cancelled"):
+            return _error("Order not found or not open", code="e-orders-0005")
+        order.update({
+            "ProductType": params.get("modifiedProductType", order["ProductType"]),
+            "OrderType": params.get("modifiedOrderType", order["OrderType"]),
+            "OrderQuantity": int(params.get("modifiedOrderQuantity", order["OrderQuantity"])),
+            "OrderPrice": float(params.get("modifiedLimitPrice", order["OrderPrice"])),
+            "OrderStopPrice": float(params.get("modifiedStopPrice", order["OrderStopPrice"])),
+            "OrderStatus": "Replaced",
+        })
+        order["LeavesQuantity"] = order["OrderQuantity"] - order["CumulativeQuantity"]
+        await self._emit_order(request['session'], order)
+        if order["OrderType"] == XTSConnect.ORDER_TYPE_MARKET:
+            await self._fill(request['session'], order)
+        return _success({"AppOrderID": order["AppOrderID"]})
+
+    async def cancel_order(self, request):
+        params = await self._params(request)
+        order = self.orders.get(int(params.get("appOrderID", 0)))
+        if order is None or order["OrderStatus"] in ("Filled", "Cancelled"):
+            return _error("Order not found or not open", code="e-orders-0005")
+        await self._cancel(request['session'], order)
+        return _success({"AppOrderID": order["AppOrderID"]})
+
+    async def cancel_all(self, request):
+        params = await self._params(request)
+        cancelled = []
+        for order in list(self.orders.values()):
+            if (order["OrderStatus"] not in ("Filled", "Cancelled") and
+                    order["ExchangeInstrumentID"] == int(params.get("exchangeInstrumentID", 0))):
+                await self._cancel(request['session'], order)
+                cancelled.append(order["AppOrderID"])
+        return _success(cancelled)
+
+    async def positions(self, request):
+        positions = {}
+        for trade in self.trades:
+            key = (trade["ExchangeSegment"], trade["ExchangeInstrumentID"], trade["ProductType"])
+            quantity = trade["LastTradedQuantity"] * (1 if trade["OrderSide"] == XTSConnect.TRANSACTION_TYPE_BUY else -1)
+            position = positions.setdefault(key, {
+                "ExchangeSegment": key[0], "ExchangeInstrumentID": key[1], "ProductType": key[2], "Quantity": 0})
+            position["Quantity"] += quantity
+        return _success({"positionList": list(positions.values())})
+
+    async def _cancel(self, session, order):
+        order["OrderStatus"] = "Cancelled"
+        order["LeavesQuantity"] = 0
+        await self._emit_order(session, order)
+
+    async def _fill(self, session, order):
+        quantity = order["LeavesQuantity"]
+        order.update({"OrderStatus": "Filled", "LeavesQuantity": 0,
+                      "CumulativeQuantity": order["CumulativeQuantity"] + quantity})
+        trade = dict(order, LastTradedQuantity=quantity, LastTradedPrice=order["OrderPrice"] or 100.0,
+                     ExecutionID=len(self.trades) + 1)
+        self.trades.append(trade)
+        await self._emit_order(session, order)
+        await self.interactive.emit('trade', json.dumps(trade), room=session.token)
+
+    async def _emit_order(self, session, order):
+        await self.interactive.emit('order', json.dumps(order), room=session.token)
+
+    ####################################################################################################
+    # Sockets
+    ####################################################################################################
+
+    def _socket_session(self, environ):
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        return self.sessions.get(query.get('token', [None])[0])
+
+    async def on_marketdata_connect(self, sid, environ):
+        session = self._socket_session(environ)
+        if session is None:
+            return False
+        self.marketdata.enter_room(sid, session.token)
+        await self.marketdata.emit('joined', {"userID": session.userID}, room=sid)
+
+    async def on_interactive_connect(self, sid, environ):
+        session = self._socket_session(environ)
+        if session is None:
+            return False
+        self.interactive.enter_room(sid, session.token)
+        await self.interactive.emit('joined', "Joined as " + session.userID, room=sid)
+
+    def set_rate(self, rate, packetsPerFrame=None):
+        """Change the packet rate, and the packets per frame, while running."""
+        self.rate = rate
+        if packetsPerFrame is not None:
+            self.packetsPerFrame = packetsPerFrame
+
+    async def _on_startup(self, app):
+        self._publisher = self.marketdata.start_background_task(self._publish)
+
+    async def _publish(self):
+        """Emit frames at `rate` packets per second to every session with subscriptions."""
+        last = time.perf_counter()
+        owed = 0.0
+        while True:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            # at most 50 ms of backlog, a stopped stream does not keep sending what it owed
+            owed = min(owed + (now - last) * self.rate, max(self.rate * 0.05, self.packetsPerFrame))
+            last = now
+            if not self.rate:
+                owed = 0.0
+            packetsPerFrame = self.packetsPerFrame
+            # the rate can be set to 0 while a burst awaits its emits
+            while owed >= packetsPerFrame and self.rate:
+                owed -= packetsPerFrame
+                for session in list(self.sessions.values()):
+                    if not session.subscriptions:
+                        continue
+                    # counted before the emit so /standin/stats never lags the frames on the wire
+                    session.sent += packetsPerFrame
+                    self.framesSent += 1
+                    self.packetsSent += packetsPerFrame
+                    await self.marketdata.emit('xts-binary-packet', session.generator.frame(packetsPerFrame),
+                                               room=session.token)
+
+    ####################################################################################################
+    # Running
+    ####################################################################################################
+
+    def serve(self):
+        """Run in the foreground until interrupted."""
+        self.start()
+        print("Serving on http://{host}:{port}".format(host=self.host, port=self.port))
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def start(self):
+        """Run on a background thread. Returns once the server is listening."""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app)
+            self._loop.run_until_complete(self._runner.setup())
+            self._loop.run_until_complete(web.TCPSite(self._runner, self.host, self.port).start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='xts-local-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self, timeout=5):
+        """Stop a server started with start()."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop = None
+
+    async def _shutdown(self):
+        self._publisher.cancel()
+        # open websockets would hold the runner cleanup up to its shutdown timeout
+        for server in (self.marketdata, self.interactive):
+            for socket in list(server.eio.sockets.values()):
+                await socket.close(wait=False)
+        await self._runner.cleanup()
+        # engineio's service task would otherwise be destroyed pending with the loop
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return {
+            "sessions": len(self.sessions),
+            "framesSent": self.framesSent,
+            "packetsSent": self.packetsSent,
+            "orders": len(self.orders),
+            "trades": len(self.trades),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in XTS server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', type=int, default=1000, help="packets per second per session")
+    parser.add_argument('--packets-per-frame', type=int, default=10)
+    parser.add_argument('--compressed-every', type=int, default=2, help="0 never compresses")
+    parser.add_argument('--message-version', type=int, default=LATEST_VERSION)
+    args = parser.parse_args()
+    LocalXTSServer(args.host, args.port, args.rate, args.packets_per_frame, args.compressed_every,
+                   args.message_version).serve()
@@ -0,0 +1,104 @@
+"""
+    MarketDataConflator.py
+
+    Conflating delivery for slow consumers.
+
+    Decoded events are kept as the latest state per (exchangeSegment,
+    exchangeInstrumentID, messageCode) and handed to the consumer from its
+    own thread. A consumer that falls behind receives only the newest
+    touchline, depth or LTP state of each instrument instead of every
+    intermediate tick, and the producer never waits on it.
+"""
+import threading
+
+
+def event_key(event):
+    """Return (exchangeSegment, exchangeInstrumentID, messageCode) of a Full or Compact event."""
+    if isinstance(event, dict):
+        return event["ExchangeSegment"], event["ExchangeInstrumentID"], event["MessageCode"]
+    return event.ExchangeSegment, event.ExchangeInstrumentID, event.MessageCode
+
+
+class Conflator:
+    """
+    Dispatcher handler that conflates events and delivers them to `handler`.
+
+    - `messageCodes` are the codes MDSocket_io routes through the conflator.
+    - `merged` counts, per (exchangeSegment, exchangeInstrumentID), how many
+      updates were superseded before the consumer saw them.
+    - `merges` maps a message code to `merge(pending, event)`, which folds a
+      superseded event into the new one for events that are not full
+      states, such as DepthChanges.
+    """
+
+    def __init__(self, handler=print, messageCodes=(1501, 1502, 1512), merges=None):
+        self.handler = handler
+        self.messageCodes = messageCodes
+        self.merges = dict(merges) if merges else {}
+        self.merged = {}
+        self.received = 0
+        self.delivered = 0
+        self._latest = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def __call__(self, event):
+        key = event_key(event)
+        with self._cond:
+            self.received += 1
+            if key in self._latest:
+                instrument = key[:2]
+                self.merged[instrument] = self.merged.get(instrument, 0) + 1
+                merge = self.merges.get(int(key[2]))
+                if merge is not None:
+                    event = merge(self._latest[key], event)
+            self._latest[key] = event
+            self._cond.notify()
+
+    def drain(self):
+        """Return and clear the pending latest events, for consumers that poll instead of start()."""
+        with self._cond:
+            latest, self._latest = self._latest, {}
+            self.delivered += len(latest)
+        return list(latest.values())
+
+    def start(self):
+        """Start delivering to `handler` from a dedicated thread, again after a stop()."""
+        with self._cond:
+            self._closed = False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._deliver, name='xts-marketdata-conflator', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Deliver what is pending and stop the delivery thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    def _deliver(self):
+        while True:
+            with self._cond:
+                while not self._latest and not self._closed:
+                    self._cond.wait()
+                if not self._latest:
+                    return
+                latest, self._latest = self._latest, {}
+                self.delivered += len(latest)
+            for event in latest.values():
+                self.handler(event)
+
+    def stats(self):
+        """Return the counters as a dict."""
+        with self._cond:
+            return {
+                "received": self.received,
+                "delivered": self.delivered,
+                "pending": len(self._latest),
+                "merged": dict(self.merged),
+            }
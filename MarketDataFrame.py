@@ -0,0 +1,229 @@
+"""
+    MarketDataFrame.py
+
+    Zero-copy framing of the `xts-binary-packet` socket.io payload.
+
+    A frame holds one or more packets back to back. Every packet starts with
+    an int8 compression flag followed by its header:
+
+    - uncompressed (0): messageCode, exchangeSegment, exchangeInstrumentID,
+      bookType, marketType, uncompressedPacketSize and then the body
+    - compressed (1): the same fields plus compressedPacketSize and then the
+      raw deflate stream of the body
+
+    The body always starts with its own message code, so the event decoders
+    are called with the body and offset 0.
+"""
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from time import perf_counter_ns, time_ns
+
+UNCOMPRESSED_HEADER = struct.Struct('<HhihhH')
+COMPRESSED_HEADER = struct.Struct('<HhihhHH')
+
+# stages timed by iter_packets for a profiler, per frame ones under message code FRAME
+SPLIT = "split"
+HEADER = "header"
+INFLATE = "inflate"
+FRAME = 0
+
+PacketHeader = namedtuple('PacketHeader', [
+    'isCompressed', 'messageCode', 'exchangeSegment', 'exchangeInstrumentID',
+    'bookType', 'marketType', 'uncompressedPacketSize', 'compressedPacketSize'])
+
+
+# XTS exchange timestamps count seconds from 1980-01-01 00:00 IST
+XTS_EPOCH = 315513000
+
+
+def exchange_time_ns(exchangeTimeStamp):
+    """Convert an XTS exchange timestamp to Unix time in ns, comparable with receive_time()."""
+    return (exchangeTimeStamp + XTS_EPOCH) * 1000000000
+
+
+def receive_time():
+    """Wall clock receive timestamp in nanoseconds, taken once per frame."""
+    return time_ns()
+
+
+def format_receive_time(receiveTime):
+    """Format a nanosecond receive timestamp like str(datetime.now())."""
+    return str(datetime.fromtimestamp(receiveTime // 1000000000).replace(
+        microsecond=(receiveTime // 1000) % 1000000))
+
+
+def inflate_raw(data, bufsize=zlib.DEF_BUF_SIZE):
+    """Inflate a raw deflate stream (no zlib header), like pako.inflateRaw. `bufsize` is the expected output size."""
+    return zlib.decompress(data, -15, bufsize)
+
+
+class Inflater:
+    """
+    Inflate stage for compressed packet bodies, with counters.
+
+    Every compressed packet is a complete, independent raw deflate stream,
+    so there is no decompressor state worth carrying between packets; each
+    body is inflated in one `zlib.decompress` call straight into the bytes
+    object the decoders read from, without a decompressobj, a flush or a
+    further copy. The output buffer is sized from the header's
+    uncompressedPacketSize, so it is allocated once at the right size.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.packets = 0
+        self.compressedBytes = 0
+        self.uncompressedBytes = 0
+        self.inflateTimeNs = 0
+
+    def __call__(self, data, bufsize=zlib.DEF_BUF_SIZE):
+        start = perf_counter_ns()
+        result = zlib.decompress(data, -15, bufsize)
+        self.inflateTimeNs += perf_counter_ns() - start
+        self.packets += 1
+        self.compressedBytes += len(data)
+        self.uncompressedBytes += len(result)
+        return result
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return {
+            "packets": self.packets,
+            "compressedBytes": self.compressedBytes,
+            "uncompressedBytes": self.uncompressedBytes,
+            "inflateTimeNs": self.inflateTimeNs,
+        }
+
+
+class PacketFilter:
+    """
+    Set of (exchangeSegment, exchangeInstrumentID, messageCode) keys a market
+    data client wants decoded.
+
+    Packets are checked on their header alone; rejected packets are skipped
+    without decoding, or inflating, their body and counted in `rejected`.
+    """
+
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+        self.rejected = 0
+
+    def add(self, exchangeSegment, exchangeInstrumentID, messageCode):
+        self.keys.add((exchangeSegment, exchangeInstrumentID, messageCode))
+
+    def remove(self, exchangeSegment, exchangeInstrumentID, messageCode):
+        self.keys.discard((exchangeSegment, exchangeInstrumentID, messageCode))
+
+    def clear(self):
+        self.keys.clear()
+
+    def __contains__(self, key):
+        return key in self.keys
+
+
+def iter_packets(data, inflate=inflate_raw, packetFilter=None, profiler=None):
+    """
+    Yield `(header, body)` for every packet of a frame.
+
+    `body` is a memoryview slice of `data` for uncompressed packets and the
+    inflated bytes for compressed ones; neither copies the rest of the frame.
+    `inflate(data, bufsize)` gets the header's uncompressedPacketSize as bufsize.
+    Packets rejected by `packetFilter` are skipped on their header alone.
+    Iteration stops at the end of the frame or at an unknown compression flag.
+
+    With a `profiler`, `profiler.add(stage, messageCode, ns)` is called for
+    every header and inflate, and once per frame for the split, the time
+    spent in the loop itself without them and without the consumer.
+    """
+    keys = packetFilter.keys if packetFilter is not None else None
+    view = memoryview(data)
+    size = len(view)
+    offset = 0
+    if profiler is not None:
+        clock = perf_counter_ns
+        add = profiler.add
+        split = 0
+        mark = clock()
+    while offset < size:
+        isCompressed = view[offset]
+        offset += 1
+        if isCompressed == 0:
+            if profiler is not None:
+                start = clock()
+            fields = UNCOMPRESSED_HEADER.unpack_from(view, offset)
+            if profiler is not None:
+                now = clock()
+                add(HEADER, fields[0], now - start)
+                split -= now - start
+            offset += UNCOMPRESSED_HEADER.size
+            end = offset + fields[5]
+            if keys is None or (fields[1], fields[2], fields[0]) in keys:
+                header = PacketHeader(0, *fields, 0)
+                body = view[offset:end]
+            else:
+                packetFilter.rejected += 1
+                header = None
+        elif isCompressed == 1:
+            if profiler is not None:
+                start = clock()
+            fields = COMPRESSED_HEADER.unpack_from(view, offset)
+            if profiler is not None:
+                now = clock()
+                add(HEADER, fields[0], now - start)
+                split -= now - start
+            offset += COMPRESSED_HEADER.size
+            end = offset + fields[6]
+            if keys is None or (fields[1], fields[2], fields[0]) in keys:
+                header = PacketHeader(1, *fields)
+                if profiler is not None:
+                    start = clock()
+                body = inflate(view[offset:end], fields[5] or zlib.DEF_BUF_SIZE)
+                if profiler is not None:
+                    now = clock()
+                    add(INFLATE, fields[0], now - start)
+                    split -= now - start
+            else:
+                packetFilter.rejected += 1
+                header = None
+        else:
+            break
+        offset = end
+        if header is not None:
+            if profiler is None:
+                yield header, body
+            else:
+                split += clock() - mark
+                yield header, body
+                mark = clock()
+    if profiler is not None:
+        add(SPLIT, FRAME, split + clock() - mark)
+
+
+def iter_raw_packets(data):
+    """
+    Yield `(key, packet)` for every packet of a frame without inflating it.
+
+    `key` is (exchangeSegment, exchangeInstrumentID, messageCode) and `packet`
+    is a memoryview of the whole packet, compression flag and header included.
+    """
+    view = memoryview(data)
+    size = len(view)
+    offset = 0
+    while offset < size:
+        start = offset
+        isCompressed = view[offset]
+        offset += 1
+        if isCompressed == 0:
+            fields = UNCOMPRESSED_HEADER.unpack_from(view, offset)
+            end = offset + UNCOMPRESSED_HEADER.size + fields[5]
+        elif isCompressed == 1:
+            fields = COMPRESSED_HEADER.unpack_from(view, offset)
+            end = offset + COMPRESSED_HEADER.size + fields[6]
+        else:
+            return
+        yield (fields[1], fields[2], fields[0]), view[start:end]
+        offset = end
@@ -0,0 +1,138 @@
+"""
+    MarketDataQueue.py
+
+    Bounded hand-off of raw socket frames from the socket.io callback to a
+    decode worker thread, so the engineio read loop never runs user code.
+
+    When the queue is full the configured backpressure policy applies:
+
+    - "block": the socket thread waits for a free slot
+    - "drop-oldest": the oldest queued frame is discarded
+    - "conflate": the newest queued frame and the incoming one are merged,
+      keeping only the latest packet per (segment, instrument, message code)
+      and the receive time of the older frame, so queueing lag is not hidden
+
+    Frames put after `close()` are discarded and counted in `dropped`.
+"""
+import threading
+from collections import deque
+from time import perf_counter_ns
+import Exception as ex
+from MarketDataFrame import iter_raw_packets
+
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+CONFLATE = "conflate"
+
+
+def conflate_frames(older, newer):
+    """
+    Merge two frames keeping the latest packet for every key.
+
+    Returns the merged frame and how many packets were superseded. Packets
+    are only framed on their headers, compressed bodies are not inflated.
+    """
+    packets = {}
+    merged = 0
+    for frame in (older, newer):
+        for key, packet in iter_raw_packets(frame):
+            if packets.pop(key, None) is not None:
+                merged += 1
+            packets[key] = packet
+    return b''.join(packets.values()), merged
+
+
+class FrameQueue:
+    """Bounded queue of (frame, receiveTime) with backpressure counters."""
+
+    def __init__(self, maxFrames=1024, policy=DROP_OLDEST):
+        if policy not in (BLOCK, DROP_OLDEST, CONFLATE):
+            raise ex.XTSInputException("Invalid backpressure policy {policy}".format(policy=policy))
+        if maxFrames < 1:
+            raise ex.XTSInputException("maxFrames must be at least 1")
+        self.maxFrames = maxFrames
+        self.policy = policy
+        self._frames = deque()
+        self._lock = threading.Lock()
+        self._notEmpty = threading.Condition(self._lock)
+        self._notFull = threading.Condition(self._lock)
+        self._closed = False
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0
+        self.blockedTimeNs = 0
+        self.maxDepth = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, data, receiveTime):
+        """Queue a frame, applying the backpressure policy when full."""
+        with self._lock:
+            self.received += 1
+            if self._closed:
+                self.dropped += 1
+                return
+            if len(self._frames) >= self.maxFrames:
+                if self.policy == BLOCK:
+                    self.blocked += 1
+                    start = perf_counter_ns()
+                    while len(self._frames) >= self.maxFrames and not self._closed:
+                        self._notFull.wait()
+                    self.blockedTimeNs += perf_counter_ns() - start
+                    if self._closed:
+                        self.dropped += 1
+                        return
+                elif self.policy == DROP_OLDEST:
+                    self._frames.popleft()
+                    self.dropped += 1
+                else:
+                    older, olderTime = self._frames.pop()
+                    data, merged = conflate_frames(older, data)
+                    self.conflated += merged
+                    receiveTime = olderTime
+            self._frames.append((data, receiveTime))
+            if len(self._frames) > self.maxDepth:
+                self.maxDepth = len(self._frames)
+            self._notEmpty.notify()
+
+    def get(self, timeout=None):
+        """Return the next (frame, receiveTime), or None once closed and drained or on timeout."""
+        with self._lock:
+            while not self._frames and not self._closed:
+                if not self._notEmpty.wait(timeout):
+                    break
+            if not self._frames:
+                return None
+            item = self._frames.popleft()
+            self.delivered += 1
+            self._notFull.notify()
+            return item
+
+    def close(self):
+        """Wake up every waiter; queued frames can still be drained with get."""
+        with self._lock:
+            self._closed = True
+            self._notEmpty.notify_all()
+            self._notFull.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        """Return the counters as a dict."""
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "depth": len(self._frames),
+                "maxDepth": self.maxDepth,
+                "received": self.received,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "conflated": self.conflated,
+                "blocked": self.blocked,
+                "blockedTimeNs": self.blockedTimeNs,
+            }
@@ -1,119 +1,104 @@
 from MarketDepthRowInfo import MarketDeptRowInfo
-from ApplicationMessageVersion import ApplicationMessageVersion
-import struct
-from datetime import datetime
+from MessageLayout import decode_depth
+from collections import namedtuple
+from MarketDataFrame import receive_time, format_receive_time
+
+
+class DepthEvent(namedtuple('DepthEvent', [
+        'MessageCode', 'MessageVersion', 'ApplicationType', 'TokenID', 'ExchangeSegment', 'ExchangeInstrumentID',
+        'ExchangeTimeStamp', 'Ask', 'Bid', 'BookType', 'XMarketType', 'SequenceNumber', 'LastTradedPrice',
+        'LastTradedQuantity', 'TotalBuyQuantity', 'TotalSellQuantity', 'TotalTradedQuantity', 'AverageTradedPrice',
+        'LastTradedTime', 'LastUpdateTime', 'PercentChange', 'Open', 'High', 'Low', 'Close', 'TotalValueTraded',
+        'BuyBackTotalBuy', 'BuyBackTotalSell'])):
+    """Compact 1502 event, returned in "Compact" broadcast mode. LastUpdateTime is the receive time in ns. Ask and Bid are tuples of DepthLevel."""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return the nested dict produced by the "Full" broadcast mode."""
+        return {
+            "MessageCode": self.MessageCode,
+            "MessageVersion": self.MessageVersion,
+            "ApplicationType": self.ApplicationType,
+            "TokenID": self.TokenID,
+            "ExchangeSegment": self.ExchangeSegment,
+            "ExchangeInstrumentID": self.ExchangeInstrumentID,
+            "ExchangeTimeStamp": self.ExchangeTimeStamp,
+            "Ask": [level.to_dict() for level in self.Ask],
+            "Bid": [level.to_dict() for level in self.Bid],
+            "BookType": self.BookType,
+            "XMarketType": self.XMarketType,
+            "SequenceNumber": self.SequenceNumber,
+            "Touchline": {
+                "LastTradedPrice": self.LastTradedPrice,
+                "LastTradedQuantity": self.LastTradedQuantity,
+                "TotalBuyQuantity": self.TotalBuyQuantity,
+                "TotalSellQuantity": self.TotalSellQuantity,
+                "TotalTradedQuantity": self.TotalTradedQuantity,
+                "AverageTradedPrice": self.AverageTradedPrice,
+                "LastTradedTime": self.LastTradedTime,
+                "LastUpdateTime": format_receive_time(self.LastUpdateTime),
+                "PercentChange": self.PercentChange,
+                "Open": self.Open,
+                "High": self.High,
+                "Low": self.Low,
+                "Close": self.Close,
+                "TotalValueTraded": self.TotalValueTraded,
+                "BuyBackTotalBuy": self.BuyBackTotalBuy,
+                "BuyBackTotalSell": self.BuyBackTotalSell
+            }
+        }
+
 
 class MarketDepthEvent():
     def deserialize(reader, count, messagecode, broadcastmode):
-        count += 2
-        messageVersion = reader.read_uint16()
-        applicationType = reader.read_uint16()
-        tokenID = reader.read_uint64()
-        count += 12
-        if messageVersion >= ApplicationMessageVersion.Version_1_0_1_2983.value:
-            sequenceNumber = reader.read_uint64()
-            count += 8
-            SkipBytes = reader.read_int32()
-            count += 4
+        # reader is positioned just past the message code of the body
+        values, end = decode_depth(reader.buffer(), reader.pos() - 2)
+        reader.seek(end)
+        return MarketDepthEvent.from_values(values, messagecode, broadcastmode)
 
-        exchangeSegment = int(reader.read_int16())
-        count += 2
-        exchangeInstrumentId = reader.read_int32()
-        count += 4
-        exchangeTimestamp = reader.read_uint64()
-        count += 8
-        bidCount = reader.read_int32()
-        count += 4
+    @staticmethod
+    def decode(buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """Decode a 1502 body starting at `offset` (the message code) of `buffer`."""
+        values, end = decode_depth(buffer, offset)
+        return MarketDepthEvent.from_values(values, messagecode, broadcastmode, receiveTime)
 
-        bidData = []
+    @staticmethod
+    def from_values(values, messagecode, broadcastmode, receiveTime=None):
+        (_, messageVersion, applicationType, tokenID, sequenceNumber, SkipBytes,
+         exchangeSegment, exchangeInstrumentId, exchangeTimestamp) = values[:9]
+        index = 9
+        bidCount = values[index]
+        index += 1
+        bids = []
         for x in range(0, bidCount):
-            md = MarketDeptRowInfo(reader, count)
-            count, data = md.deserialize()
-            bidData.append(data)
-        askCount = reader.read_int32()
-        count += 4
-
-        askData = []
+            bids.append(MarketDeptRowInfo.level(values, index))
+            index += 4
+        askCount = values[index]
+        index += 1
+        asks = []
         for x in range(0, askCount):
-            md = MarketDeptRowInfo(reader, count)
-            count, data = md.deserialize()
-            askData.append(data)
-        
-        md = MarketDeptRowInfo(reader, count)
-        count = md.deserialize()[0]
-        md1 = MarketDeptRowInfo(reader, count)
-        count = md1.deserialize()[0]
-        lut = reader.read_uint64()
-        count += 8
-        LTP = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        ltq = reader.read_int32()
-        count += 4
-        totalBuyQuantity = reader.read_uint32()
-        count += 4
-        totalSellQuantity = reader.read_uint32()
-        count += 4
-        totalTradedQuantity = reader.read_uint32()
-        count += 4
-        averageTradedPrice = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        lastTradedTime = reader.read_int64()
-        count += 8
-        percentChange = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        open = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        high = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        low = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        close = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        totalValueTraded = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        bbTotalBuy = reader.read_int16()
-        count += 2
-        bbTotalSell = reader.read_int16()
-        count += 2
-        Booktype = reader.read_int16()
-        count += 2
-        MarketType = reader.read_int16()
+            asks.append(MarketDeptRowInfo.level(values, index))
+            index += 4
 
-        if broadcastmode == "Full":
-            return {
-                "MessageCode": messagecode,
-                "MessageVersion": messageVersion,
-                "ApplicationType": applicationType,
-                "TokenID": tokenID,
-                "ExchangeSegment": exchangeSegment,
-                "ExchangeInstrumentID": exchangeInstrumentId,
-                "ExchangeTimeStamp": exchangeTimestamp,
-                "Ask":askData,
-                "Bid":bidData,
-                "BookType": Booktype,
-                "XMarketType": MarketType,
-                "SequenceNumber": sequenceNumber,
-                "Touchline": {
-                    "LastTradedPrice": LTP,
-                    "LastTradedQuantity": ltq,
-                    "TotalBuyQuantity": totalBuyQuantity,
-                    "TotalSellQuantity": totalSellQuantity,
-                    "TotalTradedQuantity": totalTradedQuantity,
-                    "AverageTradedPrice": averageTradedPrice,
-                    "LastTradedTime": lastTradedTime,
-                    "LastUpdateTime": str(datetime.now()),
-                    "PercentChange": percentChange,
-                    "Open": open,
-                    "High": high,
-                    "Low": low,
-                    "Close": close,
-                    "TotalValueTraded": totalValueTraded,
-                    "BuyBackTotalBuy": bbTotalBuy,
-                    "BuyBackTotalSell": bbTotalSell
-                }
-            }
+        # skip the touchline bid and ask rows
+        index += 8
+        (lut, LTP, ltq, totalBuyQuantity, totalSellQuantity, totalTradedQuantity, averageTradedPrice,
+         lastTradedTime, percentChange, open, high, low, close, totalValueTraded,
+         bbTotalBuy, bbTotalSell, Booktype, MarketType) = values[index:]
+
+        if broadcastmode == "Compact" or broadcastmode == "Full":
+            if receiveTime is None:
+                receiveTime = receive_time()
+            event = DepthEvent(
+                messagecode, messageVersion, applicationType, tokenID, exchangeSegment, exchangeInstrumentId,
+                exchangeTimestamp, tuple(asks), tuple(bids), Booktype, MarketType, sequenceNumber, LTP, ltq,
+                totalBuyQuantity, totalSellQuantity, totalTradedQuantity, averageTradedPrice, lastTradedTime,
+                receiveTime, percentChange, open, high, low, close, totalValueTraded, bbTotalBuy, bbTotalSell)
+            return event if broadcastmode == "Compact" else event.to_dict()
 
         elif broadcastmode == "Partial":
+            askData = [level.to_dict() for level in asks]
+            bidData = [level.to_dict() for level in bids]
             return (
                 f"t:{exchangeSegment}_{exchangeInstrumentId},"
                 f"ltp:{LTP},"
@@ -130,8 +115,8 @@ class MarketDepthEvent():
                 f"l:{low},"
                 f"c:{close},"
                 f"vp:{totalValueTraded},"
-                f"ai: {askData[0]["size"]}|{askData[0]["rowprice"]}|{askData[0]["totalOrders"]}|{askData[0]["backmarketmakerflag"]}|{askData[1]["size"]}|{askData[1]["rowprice"]}|{askData[1]["totalOrders"]}|{askData[1]["backmarketmakerflag"]}{askData[2]["size"]}|{askData[2]["rowprice"]}|{askData[2]["totalOrders"]}|{askData[2]["backmarketmakerflag"]}|{askData[3]["size"]}|{askData[3]["rowprice"]}|{askData[3]["totalOrders"]}|{askData[3]["backmarketmakerflag"]}|{askData[4]["size"]}|{askData[4]["rowprice"]}|{askData[4]["totalOrders"]}|{askData[4]["backmarketmakerflag"]}"
-                f"bi: {bidData[0]["size"]}|{bidData[0]["rowprice"]}|{bidData[0]["totalOrders"]}|{bidData[0]["backmarketmakerflag"]}|{bidData[1]["size"]}|{bidData[1]["rowprice"]}|{bidData[1]["totalOrders"]}|{bidData[1]["backmarketmakerflag"]}{bidData[2]["size"]}|{bidData[2]["rowprice"]}|{bidData[2]["totalOrders"]}|{bidData[2]["backmarketmakerflag"]}|{bidData[3]["size"]}|{bidData[3]["rowprice"]}|{bidData[3]["totalOrders"]}|{bidData[3]["backmarketmakerflag"]}|{bidData[4]["size"]}|{bidData[4]["rowprice"]}|{bidData[4]["totalOrders"]}|{bidData[4]["backmarketmakerflag"]}"
+                f"ai: {askData[0]['size']}|{askData[0]['rowprice']}|{askData[0]['totalOrders']}|{askData[0]['backmarketmakerflag']}|{askData[1]['size']}|{askData[1]['rowprice']}|{askData[1]['totalOrders']}|{askData[1]['backmarketmakerflag']}{askData[2]['size']}|{askData[2]['rowprice']}|{askData[2]['totalOrders']}|{askData[2]['backmarketmakerflag']}|{askData[3]['size']}|{askData[3]['rowprice']}|{askData[3]['totalOrders']}|{askData[3]['backmarketmakerflag']}|{askData[4]['size']}|{askData[4]['rowprice']}|{askData[4]['totalOrders']}|{askData[4]['backmarketmakerflag']}"
+                f"bi: {bidData[0]['size']}|{bidData[0]['rowprice']}|{bidData[0]['totalOrders']}|{bidData[0]['backmarketmakerflag']}|{bidData[1]['size']}|{bidData[1]['rowprice']}|{bidData[1]['totalOrders']}|{bidData[1]['backmarketmakerflag']}{bidData[2]['size']}|{bidData[2]['rowprice']}|{bidData[2]['totalOrders']}|{bidData[2]['backmarketmakerflag']}|{bidData[3]['size']}|{bidData[3]['rowprice']}|{bidData[3]['totalOrders']}|{bidData[3]['backmarketmakerflag']}|{bidData[4]['size']}|{bidData[4]['rowprice']}|{bidData[4]['totalOrders']}|{bidData[4]['backmarketmakerflag']}"
             )
 
 
@@ -1,6 +1,16 @@
+from collections import namedtuple
+from MessageLayout import ROW
 
-import struct
-class MarketDeptRowInfo(): 
+
+class DepthLevel(namedtuple('DepthLevel', ['size', 'rowprice', 'totalOrders', 'backmarketmakerflag'])):
+    """Compact, immutable depth row."""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {"size":self.size,"rowprice":self.rowprice, "totalOrders":self.totalOrders, "backmarketmakerflag":self.backmarketmakerflag}
+
+
+class MarketDeptRowInfo():
     size = 0
     rowprice = 0.0
     totalOrders = 0
@@ -10,14 +20,17 @@ class MarketDeptRowInfo():
         self.count = count
 
     def deserialize(self):
-        size = self.reader.read_int32()
-        self.count += 4
-        rowprice = struct.unpack('d', self.reader.read_bytes(8))[0]
-        self.count += 8
-        totalOrders =  self.reader.read_int32()
-        self.count += 4
-        backmarketmakerflag =  self.reader.read_int16()
-        self.count += 2
-        return self.count, {"size":size,"rowprice":rowprice, "totalOrders":totalOrders, "backmarketmakerflag":backmarketmakerflag}
-    
+        values = ROW.unpack(self.reader.read_bytes(ROW.size))
+        self.count += ROW.size
+        return self.count, MarketDeptRowInfo.from_values(values, 0)
+
+    @staticmethod
+    def from_values(values, index):
+        """Build a depth row from the four decoded values starting at `index`."""
+        return {"size":values[index],"rowprice":values[index + 1], "totalOrders":values[index + 2], "backmarketmakerflag":values[index + 3]}
+
+    @staticmethod
+    def level(values, index):
+        """Build a DepthLevel from the four decoded values starting at `index`."""
+        return DepthLevel(values[index], values[index + 1], values[index + 2], values[index + 3])
 
@@ -0,0 +1,417 @@
+"""
+    MarketdataShards.py
+
+    Spreads market data subscriptions over several market data sessions.
+
+    Every shard is its own market data login with its own MDSocket_io, so
+    XTS sends each socket only the instruments subscribed on its session:
+    the network traffic and the parsing are split, not repeated per shard.
+
+    Instruments are placed on the K shards with consistent hashing with
+    bounded loads: an instrument goes to the first shard clockwise from its
+    hash point on the ring that is not above the load limit. Adding or
+    removing instruments only places or releases those instruments, and
+    rebalance() moves the few instruments of shards left above the limit.
+
+    A moved instrument is handed over per message code. It is subscribed on
+    the new shard first, and only once that subscription is acknowledged
+    does the new shard's stream count; the old shard keeps delivering until
+    the sequence numbers of the two streams meet, then the buffered events
+    of the new shard newer than the last delivered one follow. The merged
+    stream stays in order without losing ticks. Bodies without sequence
+    numbers switch over on the first event of the new shard.
+"""
+import bisect
+import math
+import queue
+import threading
+import zlib
+from functools import partial
+import Exception as ex
+from MarketDataFrame import PacketFilter
+from MarketDataQueue import DROP_OLDEST
+from MarketdataSocketClient import MDSocket_io
+from MessageDispatcher import default_dispatcher
+from SubscriptionManager import subscription_error, ALREADY_SUBSCRIBED
+
+
+def _instruments(instruments):
+    return [{'exchangeSegment': segment, 'exchangeInstrumentID': instrumentID} for segment, instrumentID in instruments]
+
+
+class HashRing:
+    """Consistent hash ring of `shards` shards with `replicas` points each."""
+
+    def __init__(self, shards, replicas=64):
+        if shards < 1:
+            raise ex.XTSInputException("shards must be at least 1")
+        self.shards = shards
+        points = sorted(
+            (zlib.crc32(b'%d:%d' % (shard, replica)), shard)
+            for shard in range(shards) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def walk(self, exchangeSegment, exchangeInstrumentID):
+        """Yield every shard once, clockwise from the instrument's hash point."""
+        start = bisect.bisect(self._hashes, zlib.crc32(b'%d:%d' % (exchangeSegment, exchangeInstrumentID)))
+        seen = set()
+        for i in range(len(self._owners)):
+            shard = self._owners[(start + i) % len(self._owners)]
+            if shard not in seen:
+                seen.add(shard)
+                yield shard
+                if len(seen) == self.shards:
+                    return
+
+    def shard_of(self, exchangeSegment, exchangeInstrumentID):
+        """Shard of an instrument, ignoring loads."""
+        return next(self.walk(exchangeSegment, exchangeInstrumentID))
+
+
+class _Handover:
+    """An instrument moving from shard `source` to `target`."""
+    __slots__ = ('source', 'target', 'pending')
+
+    def __init__(self, source, target, codes):
+        self.source = source
+        self.target = target
+        # message code -> [first sequence number seen on target, buffered (sequenceNumber, event) of target]
+        self.pending = {code: [None, []] for code in codes}
+
+
+class ShardedMDSocket:
+    """
+    K market data sessions, each with its own MDSocket_io, sharing the subscriptions.
+
+    - `sessions` is a list of XTSConnect, one per shard. Sessions without a
+      token are logged in with marketdata_login() and logged out by stop().
+    - Events are put on `events` or, when given, passed to `handler`, which
+      is then called from the socket worker threads one at a time.
+    - `loadFactor` is how far above the average load a shard may go.
+    - `handoverLimit` is how many events of the new shard are buffered per
+      message code before a handover switches over regardless.
+    """
+
+    def __init__(self, sessions, broadcastmode, handler=None, loadFactor=1.25, queueSize=1024,
+                 backpressure=DROP_OLDEST, socketFactory=MDSocket_io, handoverLimit=10000, **kwargs):
+        if broadcastmode not in ("Full", "Compact"):
+            raise ex.XTSInputException("Sharding needs the Full or Compact broadcast mode")
+        if not sessions:
+            raise ex.XTSInputException("At least one market data session is needed")
+        self.sessions = list(sessions)
+        self._loggedIn = []
+        for shard, xt in enumerate(self.sessions):
+            if getattr(xt, 'token', None) is None:
+                self._login(shard, xt)
+        shards = len(self.sessions)
+        self.ring = HashRing(shards)
+        self.loadFactor = loadFactor
+        self.handoverLimit = handoverLimit
+        self.events = queue.SimpleQueue()
+        self.handler = handler
+        self.moved = 0
+        self.failedMoves = 0
+        self.handovers = 0
+        self._lock = threading.Lock()
+        # guards the handovers and the merged stream, taken after _lock when both are needed
+        self._mergeLock = threading.Lock()
+        # (exchangeSegment, exchangeInstrumentID) -> shard and -> subscribed message codes
+        self._assignment = {}
+        self._codes = {}
+        self._loads = [0] * shards
+        self._handovers = {}
+        # (exchangeSegment, exchangeInstrumentID, messageCode) -> last delivered sequence number
+        self._last = {}
+        self.filters = [PacketFilter() for _ in range(shards)]
+        self.sockets = [
+            socketFactory(xt.token, xt.userID, broadcastmode, packetFilter=self.filters[shard],
+                          dispatcher=default_dispatcher(partial(self._merge, shard)), queueSize=queueSize,
+                          backpressure=backpressure, **kwargs)
+            for shard, xt in enumerate(self.sessions)]
+        self._threads = []
+        self._unsubscriptions = queue.SimpleQueue()
+        self._unsubscriber = threading.Thread(target=self._unsubscribe_loop, name='xts-marketdata-handover',
+                                              daemon=True)
+        self._unsubscriber.start()
+
+    def _login(self, shard, xt):
+        response = xt.marketdata_login()
+        if not isinstance(response, dict) or "token" not in (response.get("result") or {}):
+            raise ex.XTSTokenException("Market data login of shard {shard} failed: {response}".format(
+                shard=shard, response=response))
+        self._loggedIn.append(xt)
+
+    def _deliver(self, event):
+        if self.handler is None:
+            self.events.put(event)
+        else:
+            self.handler(event)
+
+    def _merge(self, shard, event):
+        if isinstance(event, dict):
+            key = (event["ExchangeSegment"], event["ExchangeInstrumentID"], int(event["MessageCode"]))
+            sequenceNumber = event.get("SequenceNumber", 0)
+        else:
+            key = (event.ExchangeSegment, event.ExchangeInstrumentID, int(event.MessageCode))
+            sequenceNumber = event.SequenceNumber
+        with self._mergeLock:
+            handover = self._handovers.get(key[:2])
+            if handover is None or key[2] not in handover.pending:
+                if handover is None:
+                    if shard != self._assignment.get(key[:2]):
+                        return
+                elif shard != handover.target or (sequenceNumber and sequenceNumber <= self._last.get(key, 0)):
+                    return
+                self._last[key] = sequenceNumber
+                self._deliver(event)
+                return
+            state = handover.pending[key[2]]
+            if shard == handover.source:
+                self._last[key] = sequenceNumber
+                self._deliver(event)
+            elif shard == handover.target:
+                if state[0] is None:
+                    state[0] = sequenceNumber
+                state[1].append((sequenceNumber, event))
+            else:
+                return
+            last = self._last.get(key)
+            if state[0] is not None and (not state[0] or last is None or last + 1 >= state[0] or
+                                         len(state[1]) >= self.handoverLimit):
+                self._switch(key, handover, state)
+
+    def _switch(self, key, handover, state):
+        """Deliver the buffered events of the target newer than the last delivered and cut the source off."""
+        last = self._last.get(key, 0)
+        for sequenceNumber, event in state[1]:
+            if not sequenceNumber or sequenceNumber > last:
+                last = sequenceNumber
+                self._deliver(event)
+        self._last[key] = last
+        del handover.pending[key[2]]
+        self.filters[handover.source].remove(*key)
+        self._unsubscriptions.put((handover.source, key))
+        if not handover.pending:
+            del self._handovers[key[:2]]
+            self.handovers += 1
+
+    def _unsubscribe_loop(self):
+        while True:
+            item = self._unsubscriptions.get()
+            if item is None:
+                return
+            shard, key = item
+            try:
+                self.sessions[shard].send_unsubscription(_instruments([key[:2]]), key[2])
+            except Exception as e:
+                print(e)
+
+    def connect(self):
+        """Connect every socket, each on its own thread. Returns once they are started."""
+        for shard, socket in enumerate(self.sockets):
+            thread = threading.Thread(target=socket.connect, name='xts-marketdata-shard-%d' % shard, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _limit(self, total):
+        return max(1, math.ceil(total / self.ring.shards * self.loadFactor))
+
+    def _place(self, instrument, total):
+        limit = self._limit(total)
+        for shard in self.ring.walk(*instrument):
+            if self._loads[shard] < limit:
+                return shard
+        return self.ring.shard_of(*instrument)
+
+    def _assign(self, instrument, shard):
+        self._assignment[instrument] = shard
+        self._loads[shard] += 1
+
+    def _release(self, instrument):
+        shard = self._assignment.pop(instrument)
+        self._loads[shard] -= 1
+        return shard
+
+    def subscribe(self, Instruments, xtsMessageCode):
+        """
+        Place `Instruments` on their shards and subscribe them, one
+        send_subscription call on each shard's session. Returns the responses by shard.
+
+        Instruments of a shard whose call fails are taken off it again.
+        """
+        byShard = {}
+        added = {}
+        with self._lock:
+            for instrument in Instruments:
+                key = (instrument['exchangeSegment'], instrument['exchangeInstrumentID'])
+                if key in self._assignment:
+                    shard = self._assignment[key]
+                    if xtsMessageCode in self._codes[key]:
+                        byShard.setdefault(shard, []).append(instrument)
+                        continue
+                    self._codes[key].add(xtsMessageCode)
+                else:
+                    self._codes[key] = {xtsMessageCode}
+                    shard = self._place(key, len(self._assignment) + 1)
+                    self._assign(key, shard)
+                self.filters[shard].add(key[0], key[1], xtsMessageCode)
+                byShard.setdefault(shard, []).append(instrument)
+                added.setdefault(shard, []).append(key)
+        responses = {}
+        for shard, instruments in byShard.items():
+            try:
+                response = self.sessions[shard].send_subscription(instruments, xtsMessageCode)
+                error = subscription_error(response, ALREADY_SUBSCRIBED)
+            except Exception as e:
+                response = error = str(e)
+            responses[shard] = response
+            if error is not None:
+                self._rollback(added.get(shard, ()), xtsMessageCode)
+        return responses
+
+    def _rollback(self, keys, xtsMessageCode):
+        """Take the instruments of a failed subscription back off their shard."""
+        with self._lock:
+            for key in keys:
+                codes = self._codes.get(key)
+                if codes is None or xtsMessageCode not in codes:
+                    continue
+                self.filters[self._assignment[key]].remove(key[0], key[1], xtsMessageCode)
+                codes.discard(xtsMessageCode)
+                if not codes:
+                    self._release(key)
+                    del self._codes[key]
+
+    def unsubscribe(self, Instruments, xtsMessageCode):
+        """
+        Unsubscribe `Instruments`, one send_unsubscription call on each
+        shard's session, and rebalance the remaining instruments. Returns the
+        responses by shard.
+        """
+        byShard = {}
+        with self._lock:
+            for instrument in Instruments:
+                key = (instrument['exchangeSegment'], instrument['exchangeInstrumentID'])
+                if key not in self._assignment or xtsMessageCode not in self._codes[key]:
+                    continue
+                shard = self._assignment[key]
+                self.filters[shard].remove(key[0], key[1], xtsMessageCode)
+                byShard.setdefault(shard, []).append(instrument)
+                with self._mergeLock:
+                    handover = self._handovers.get(key)
+                    if handover is not None and xtsMessageCode in handover.pending:
+                        # still subscribed on the shard it is moving from
+                        del handover.pending[xtsMessageCode]
+                        self.filters[handover.source].remove(key[0], key[1], xtsMessageCode)
+                        byShard.setdefault(handover.source, []).append(instrument)
+                        if not handover.pending:
+                            del self._handovers[key]
+                    self._last.pop(key + (xtsMessageCode,), None)
+                self._codes[key].discard(xtsMessageCode)
+                if not self._codes[key]:
+                    self._release(key)
+                    del self._codes[key]
+            moves = self._plan()
+        responses = {shard: self.sessions[shard].send_unsubscription(instruments, xtsMessageCode)
+                     for shard, instruments in byShard.items()}
+        self._move(moves)
+        return responses
+
+    def rebalance(self):
+        """Move instruments off shards above the load limit. Returns how many were handed over."""
+        with self._lock:
+            moves = self._plan()
+        return self._move(moves)
+
+    def _plan(self):
+        """Reassign the instruments of shards above the limit and start their handovers. Returns the moves."""
+        total = len(self._assignment)
+        limit = self._limit(total)
+        moves = []
+        for instrument, shard in list(self._assignment.items()):
+            if self._loads[shard] <= limit or instrument in self._handovers:
+                continue
+            self._release(instrument)
+            target = self._place(instrument, total)
+            self._assign(instrument, target)
+            if target != shard:
+                # the source keeps delivering until the target's subscription is acknowledged and caught up
+                with self._mergeLock:
+                    self._handovers[instrument] = _Handover(shard, target, self._codes[instrument])
+                moves.append((instrument, shard, target))
+        return moves
+
+    def _move(self, moves):
+        """Subscribe moved instruments on their new shards, and hand over the acknowledged ones."""
+        byTarget = {}
+        for instrument, _, target in moves:
+            for messageCode in self._codes.get(instrument, ()):
+                byTarget.setdefault((target, messageCode), []).append(instrument)
+        acknowledged = set()
+        for (target, messageCode), instruments in byTarget.items():
+            try:
+                response = self.sessions[target].send_subscription(_instruments(instruments), messageCode)
+                error = subscription_error(response, ALREADY_SUBSCRIBED)
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                acknowledged.update((instrument, messageCode) for instrument in instruments)
+        moved = 0
+        for instrument, source, target in moves:
+            with self._lock:
+                codes = set(self._codes.get(instrument, ()))
+                with self._mergeLock:
+                    handover = self._handovers.get(instrument)
+                    if handover is None:
+                        continue
+                    if all((instrument, messageCode) in acknowledged for messageCode in codes):
+                        for messageCode in codes:
+                            self.filters[target].add(instrument[0], instrument[1], messageCode)
+                        moved += 1
+                        continue
+                    # not acknowledged, the instrument stays on its source
+                    del self._handovers[instrument]
+                self._release(instrument)
+                self._assign(instrument, source)
+            for messageCode in codes:
+                if (instrument, messageCode) in acknowledged:
+                    self._unsubscriptions.put((target, instrument + (messageCode,)))
+            self.failedMoves += 1
+        self.moved += moved
+        return moved
+
+    def shard_of(self, exchangeSegment, exchangeInstrumentID):
+        """Shard an instrument is currently assigned to, or None."""
+        return self._assignment.get((exchangeSegment, exchangeInstrumentID))
+
+    def get(self, timeout=None):
+        """Return the next merged event, or None on timeout."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self, timeout=None):
+        """Drain and stop the decode workers, disconnect every socket and log out the sessions it logged in."""
+        for socket in self.sockets:
+            socket.stop_worker(timeout)
+            socket.sid.disconnect()
+        self._unsubscriptions.put(None)
+        self._unsubscriber.join(timeout)
+        for xt in self._loggedIn:
+            xt.marketdata_logout()
+        self._loggedIn = []
+
+    def stats(self):
+        """Return the per-shard loads and counters as a dict."""
+        with self._lock:
+            return {
+                "shards": self.ring.shards,
+                "loads": list(self._loads),
+                "moved": self.moved,
+                "failedMoves": self.failedMoves,
+                "handovers": self.handovers,
+                "moving": len(self._handovers),
+                "rejected": [packetFilter.rejected for packetFilter in self.filters],
+            }
@@ -0,0 +1,217 @@
+import configparser
+import os
+import threading
+from functools import partial
+import socketio
+import Exception as ex
+from MarketDataFrame import iter_packets, receive_time, Inflater
+from MessageDispatcher import default_dispatcher
+from MarketDataQueue import FrameQueue, DROP_OLDEST
+
+
+class MDSocket_io(socketio.Client):
+
+    def __init__(self, token, userID,broadcastmode, reconnection=False, reconnection_attempts=0, reconnection_delay=1,
+                 reconnection_delay_max=50000, randomization_factor=0.5, logger=False, binary=False, json=None,
+                 touchlineBatch=None, packetFilter=None, dispatcher=None, queueSize=0, backpressure=DROP_OLDEST,
+                 conflator=None, decodePool=None, recorder=None, sequenceTracker=None, latencyMonitor=None,
+                 profiler=None, depthDiff=None, **kwargs):
+        self.sid = socketio.Client(logger=False, engineio_logger=False,ssl_verify=False)
+        self.eventlistener = self.sid
+        self.broadcastMode = broadcastmode
+        if decodePool is not None:
+            # the pool's workers decode with the default decoders, none of the frame loop options reach them
+            frameLoopOptions = {"dispatcher": dispatcher, "packetFilter": packetFilter,
+                                "touchlineBatch": touchlineBatch, "conflator": conflator, "depthDiff": depthDiff,
+                                "sequenceTracker": sequenceTracker, "latencyMonitor": latencyMonitor,
+                                "profiler": profiler, "queueSize": queueSize or None}
+            unsupported = [name for name, value in frameLoopOptions.items() if value is not None]
+            if unsupported:
+                raise ex.XTSInputException("{names} can not be combined with a decodePool, drain its events "
+                                           "with decodePool.drain()".format(names=", ".join(unsupported)))
+        # Optional TouchlineBatch, 1501 bodies are collected into it instead of decoded one by one
+        self.touchlineBatch = touchlineBatch
+        # Optional PacketFilter, packets not in it are skipped before their body is inflated or decoded
+        self.packetFilter = packetFilter
+        # Message code -> decoder and handler, register more codes or handlers on it. The conflator
+        # and depthDiff are routed on a copy of a caller's dispatcher, which is left untouched.
+        if dispatcher is None:
+            dispatcher = default_dispatcher()
+        elif conflator is not None or depthDiff is not None:
+            dispatcher = dispatcher.copy()
+        self.dispatcher = dispatcher
+        # Optional DepthDiff, 1502 handlers then receive only the changed depth levels
+        self.depthDiff = depthDiff
+        if depthDiff is not None:
+            if broadcastmode not in ("Full", "Compact"):
+                raise ex.XTSInputException("Depth diffing needs the Full or Compact broadcast mode")
+            if conflator is not None and 1502 in conflator.messageCodes and 1502 not in conflator.merges:
+                raise ex.XTSInputException("Conflated depth changes need Conflator(merges={1502: DepthDiff.merge})")
+            entry = self.dispatcher.lookup(1502)
+            self.dispatcher.register(1502, depthDiff)
+            if entry is not None and entry[1] is not self.dispatcher.defaultHandler:
+                self.dispatcher.on(1502, entry[1])
+        # Inflates compressed packets and counts bytes and time spent
+        self.inflater = Inflater()
+        # Optional Conflator, its message codes are delivered as latest state per instrument
+        self.conflator = conflator
+        if conflator is not None:
+            if broadcastmode not in ("Full", "Compact"):
+                raise ex.XTSInputException("Conflation needs the Full or Compact broadcast mode")
+            for messageCode in conflator.messageCodes:
+                self.dispatcher.on(messageCode, conflator)
+        # Optional FrameRecorder, every raw frame is appended to it with its receive time
+        self.recorder = recorder
+        # Optional SequenceTracker, checks every packet's sequence number before it is decoded
+        self.sequenceTracker = sequenceTracker
+        # Optional LatencyMonitor, records exchange to receive and receive to handler latency of every packet
+        self.latencyMonitor = latencyMonitor
+        # Optional StageProfiler, frames are then split and dispatched with its timing
+        self.profiler = profiler
+        self.profiledDispatch = partial(profiler.dispatch, self.dispatcher) if profiler is not None else None
+        # Optional started DecodePool, frames are then decoded in its worker processes with the
+        # default decoders; pull the events with decodePool.drain(), no handler of this socket runs
+        self.decodePool = decodePool
+        # With a queueSize, frames are decoded on a worker thread behind a bounded FrameQueue
+        self.frameQueue = None
+        self.worker = None
+        if queueSize:
+            self.frameQueue = FrameQueue(queueSize, backpressure)
+        self.sid.on('connect', self.on_connect)
+        self.sid.on('message', self.on_message)
+        self.sid.on('error', self.on_error)
+        self.sid.on('joined', self.on_joined)
+        self.sid.on('xts-binary-packet', self.on_xts_binary_packet)
+        self.sid.on('disconnect', self.on_disconnect)
+
+        """Get the root url from config file"""
+        currDirMain = os.getcwd()
+        configParser = configparser.ConfigParser()
+        configFilePath = os.path.join(currDirMain, 'config.ini')
+        configParser.read(configFilePath)
+
+        self.port = configParser.get('root_url', 'marketdata_root')
+        self.userID = userID
+        publishFormat = 'JSON'
+        self.token = token
+        print("11111",self.token)
+        port = f'{self.port}?token='
+
+        self.connection_url = port + token + '&userID=' + self.userID + '&publishFormat=' + publishFormat + '&broadcastMode=Full'
+        print('self.connection_url', self.connection_url)
+
+        # started last, so a constructor that raises leaves no decode or delivery thread behind
+        if self.frameQueue is not None:
+            self.worker = threading.Thread(target=self._decode_worker, name='xts-marketdata-decoder', daemon=True)
+            self.worker.start()
+        if conflator is not None:
+            conflator.start()
+
+    def connect(self, headers={}, transports='websocket', namespaces=None, socketio_path='apibinarymarketdata/socket.io',
+                verify=False):
+
+        url = self.connection_url
+        """Connected to the socket."""
+        self.sid.connect(url, headers, transports, namespaces, socketio_path)
+        self.sid.wait()
+        """Disconnected from the socket."""
+        # self.sid.disconnect()
+
+    def on_connect(self):
+        """Connect from the socket."""
+        if self.conflator is not None:
+            # restarts delivery after a reconnect
+            self.conflator.start()
+        print('Market Data Socket connected successfully!')
+    
+    def on_joined(self,data):
+        print("Socket joined", data)
+    
+    def on_error(self,data):
+        print("Error in websocket", data)
+
+    def on_message(self, data):
+        """On receiving message"""
+        print('I received a message!' + data)
+    
+    def pako_inflate_raw(self, data):
+        return self.inflater(data)
+
+    def on_xts_binary_packet(self, data):
+        receiveTime = receive_time()
+        if self.recorder is not None:
+            try:
+                self.recorder.write(data, receiveTime)
+            except Exception as e:
+                print(e)
+        if self.decodePool is not None:
+            self.decodePool.submit(data, receiveTime)
+        elif self.frameQueue is not None:
+            self.frameQueue.put(data, receiveTime)
+        else:
+            self.process_frame(data, receiveTime)
+
+    def _decode_worker(self):
+        """Decode queued frames until the queue is closed and drained."""
+        while True:
+            item = self.frameQueue.get()
+            if item is None:
+                return
+            self.process_frame(*item)
+
+    def stop_worker(self, timeout=None):
+        """Close the frame queue, wait for the decode worker to drain it and stop the conflator."""
+        if self.frameQueue is not None:
+            self.frameQueue.close()
+            self.worker.join(timeout)
+        if self.conflator is not None:
+            self.conflator.stop(timeout)
+
+    def process_frame(self, data, receiveTime):
+        """Decode every packet of a frame and dispatch the events."""
+        try:
+            if self.broadcastMode not in ["Binary","Full","Partial","Compact"]:
+                print("Pass correct broadcastmode value")
+                pass
+
+            elif self.broadcastMode == "Binary":
+                # Binary frames are captured by the recorder when there is one
+                if self.recorder is None:
+                    print("Binary data-->", data)
+
+            else:
+                sequenceTracker = self.sequenceTracker
+                latencyMonitor = self.latencyMonitor
+                profiler = self.profiler
+                if profiler is None:
+                    packets = iter_packets(data, self.inflater, self.packetFilter)
+                    dispatch = self.dispatcher.dispatch
+                else:
+                    packets = profiler.iter_packets(data, self.inflater, self.packetFilter)
+                    dispatch = self.profiledDispatch
+                for header, body in packets:
+                    if sequenceTracker is not None:
+                        sequenceTracker.check_body(header.exchangeSegment, header.exchangeInstrumentID,
+                                                   header.messageCode, body)
+                    if latencyMonitor is not None:
+                        latencyMonitor.record_body(header.messageCode, header.exchangeSegment, body, receiveTime)
+                    if header.messageCode == 1501 and self.touchlineBatch is not None:
+                        self.touchlineBatch.add(body, receiveTime)
+                    else:
+                        dispatch(header.messageCode, body, self.broadcastMode, receiveTime)
+                    if latencyMonitor is not None:
+                        latencyMonitor.record_handler(header.messageCode, header.exchangeSegment, receiveTime)
+        except Exception as e:
+            print(e)
+        
+
+    def on_disconnect(self):
+        """Disconnected from the socket"""
+        if self.conflator is not None:
+            # delivers what is pending, on_connect starts it again
+            self.conflator.stop()
+        print('Market Data Socket disconnected!')
+
+    def on_error(self, data):
+        """Error from the socket"""
+        print('Market Data Error', data)
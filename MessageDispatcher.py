@@ -0,0 +1,90 @@
+"""
+    MessageDispatcher.py
+
+    Table driven dispatch of decoded market data packets.
+
+    Integer XTS message codes map to a decoder and a handler, so routing a
+    packet is a single dict lookup. A decoder is any object with a
+    `decode(buffer, offset, messagecode, broadcastmode, receiveTime)` method,
+    like the Touchline, MarketDepthEvent and OpenInterest classes.
+"""
+import Exception as ex
+from TouchlineEvent import Touchline
+from MarketDepthEvent import MarketDepthEvent
+from OpenInterestEvent import OpenInterest
+from LTPEvent import LTP
+from CandleEvent import Candle
+from InstrumentChangeEvent import InstrumentChange
+
+
+class MessageDispatcher:
+    """
+    Registry of message code -> (decoder, handler).
+
+    Packets whose code has no handler of its own go to `defaultHandler`.
+    """
+
+    def __init__(self, defaultHandler=print):
+        self.defaultHandler = defaultHandler
+        self._entries = {}
+
+    def register(self, messageCode, decoder, handler=None):
+        """Register `decoder` and optionally `handler` for an integer message code."""
+        # the code is passed to the decoder as text, as the events always carried it
+        self._entries[messageCode] = (decoder, handler, str(messageCode))
+
+    def unregister(self, messageCode):
+        self._entries.pop(messageCode, None)
+
+    def on(self, messageCode, handler):
+        """Set the handler called with every decoded event of a registered message code."""
+        if messageCode not in self._entries:
+            raise ex.XTSInputException("No decoder registered for message code {code}".format(code=messageCode))
+        decoder, _, label = self._entries[messageCode]
+        self._entries[messageCode] = (decoder, handler, label)
+
+    def lookup(self, messageCode):
+        """Return (decoder, handler, label) of a message code, the handler falling back to the default, or None."""
+        entry = self._entries.get(messageCode)
+        if entry is None:
+            return None
+        decoder, handler, label = entry
+        return decoder, handler or self.defaultHandler, label
+
+    def copy(self):
+        """Return a dispatcher with the same entries and default handler, changed independently of this one."""
+        dispatcher = MessageDispatcher(self.defaultHandler)
+        dispatcher._entries = dict(self._entries)
+        return dispatcher
+
+    def __contains__(self, messageCode):
+        return messageCode in self._entries
+
+    def dispatch(self, messageCode, body, broadcastmode, receiveTime=None):
+        """
+        Decode `body` and pass the event, unless the decoder returned None, to its handler.
+        Returns False for unknown codes.
+
+        `receiveTime` is the frame's receive timestamp in ns, shared by all its events.
+        """
+        entry = self._entries.get(messageCode)
+        if entry is None:
+            return False
+        decoder, handler, label = entry
+        event = decoder.decode(body, 0, label, broadcastmode, receiveTime)
+        # a decoder may consume a packet without an event, like DepthDiff on an unchanged book
+        if event is not None:
+            (handler or self.defaultHandler)(event)
+        return True
+
+
+def default_dispatcher(defaultHandler=print):
+    """Return a dispatcher with the 1105, 1501, 1502, 1505, 1510 and 1512 decoders registered."""
+    dispatcher = MessageDispatcher(defaultHandler)
+    dispatcher.register(1105, InstrumentChange)
+    dispatcher.register(1501, Touchline)
+    dispatcher.register(1502, MarketDepthEvent)
+    dispatcher.register(1505, Candle)
+    dispatcher.register(1510, OpenInterest)
+    dispatcher.register(1512, LTP)
+    return dispatcher
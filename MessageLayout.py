@@ -0,0 +1,200 @@
+"""
+    MessageLayout.py
+
+    Precompiled binary layouts for the XTS market data messages.
+
+    Every message body starts with its uint16 message code followed by the
+    uint16 ApplicationMessageVersion, which decides whether the sequence
+    number block is present. Each layout is compiled once per version so a
+    whole 1501/1502/1510/1512/1505/1105 body is decoded with a single `unpack_from` on a
+    buffer offset instead of one reader call per field.
+"""
+import struct
+import Exception as ex
+from ApplicationMessageVersion import ApplicationMessageVersion
+
+# messageCode, messageVersion, applicationType, tokenID
+_HEAD = 'HHHQ'
+# sequenceNumber, skipBytes (Version_1_0_1_2983 onwards)
+_SEQUENCE = 'Qi'
+# exchangeSegment, exchangeInstrumentID, exchangeTimestamp
+_INSTRUMENT = 'hiQ'
+# size, price, totalOrders, backMarketMakerFlag
+_ROW = 'idih'
+# lastUpdateTime, LTP, LTQ, totalBuyQuantity, totalSellQuantity, totalTradedQuantity,
+# averageTradedPrice, lastTradedTime, percentChange, open, high, low, close,
+# totalValueTraded, buyBackTotalBuy, buyBackTotalSell, bookType, marketType
+_TOUCHLINE = 'QdiIIIdqddddddhhhh'
+# marketType, openInterest, underlyingExchangeSegment, underlyingInstrumentID, isStringExists
+_OPENINTEREST = 'hihQb'
+# bookType, marketType, LTP, LTQ, lastUpdateTime
+_LTP = 'hhdIQ'
+# bookType, marketType, barTime, barVolume, openInterest, sumOfQtyInToPrice, open, high, low, close
+_CANDLE = 'hhQIIddddd'
+# bookType, marketType, priceBandHigh, priceBandLow, highExecutionBand, lowExecutionBand,
+# freezeQuantity, lastUpdateTime
+_INSTRUMENTCHANGE = 'hhddddIQ'
+
+UINT16 = struct.Struct('<H')
+INT32 = struct.Struct('<i')
+ROW = struct.Struct('<' + _ROW)
+UINT64 = struct.Struct('<Q')
+# offset of the sequence number in bodies that carry one
+SEQUENCE_OFFSET = struct.calcsize('<' + _HEAD)
+
+# Number of values in a normalised head:
+# (messageCode, messageVersion, applicationType, tokenID, sequenceNumber,
+#  skipBytes, exchangeSegment, exchangeInstrumentID, exchangeTimestamp)
+HEAD_FIELDS = 9
+ROW_FIELDS = 4
+TOUCHLINE_FIELDS = 18
+
+_FIRST_VERSION = min(v.value for v in ApplicationMessageVersion)
+_LATEST_VERSION = max(v.value for v in ApplicationMessageVersion)
+
+
+def has_sequence(messageVersion):
+    """Whether a body of this version carries the sequence number block."""
+    return messageVersion >= ApplicationMessageVersion.Version_1_0_1_2983.value
+
+
+def _head(messageVersion):
+    return _HEAD + (_SEQUENCE if has_sequence(messageVersion) else '') + _INSTRUMENT
+
+
+def _per_version(body):
+    return {v.value: struct.Struct('<' + _head(v.value) + body) for v in ApplicationMessageVersion}
+
+
+HEAD_LAYOUTS = _per_version('')
+TOUCHLINE_LAYOUTS = _per_version(_ROW + _ROW + _TOUCHLINE)
+OPENINTEREST_LAYOUTS = _per_version(_OPENINTEREST)
+LTP_LAYOUTS = _per_version(_LTP)
+CANDLE_LAYOUTS = _per_version(_CANDLE)
+INSTRUMENTCHANGE_LAYOUTS = _per_version(_INSTRUMENTCHANGE)
+
+# Depth and open interest bodies carry variable length parts, their full
+# layouts are compiled on first use and cached by shape.
+_depth_layouts = {}
+_openinterest_layouts = {}
+
+
+def message_version(buffer, offset):
+    """Read the ApplicationMessageVersion of the body starting at `offset`."""
+    return UINT16.unpack_from(buffer, offset + 2)[0]
+
+
+def sequence_number(buffer, offset):
+    """Read the sequence number of the body starting at `offset`, 0 for versions without one."""
+    if not has_sequence(message_version(buffer, offset)):
+        return 0
+    return UINT64.unpack_from(buffer, offset + SEQUENCE_OFFSET)[0]
+
+
+def exchange_timestamp(buffer, offset):
+    """Read the ExchangeTimeStamp of the body starting at `offset`."""
+    layout = HEAD_LAYOUTS[layout_version(message_version(buffer, offset))]
+    return UINT64.unpack_from(buffer, offset + layout.size - UINT64.size)[0]
+
+
+def layout_version(messageVersion):
+    """
+    Version whose layouts decode `messageVersion`: newer versions than this
+    client knows are read as the latest one, versions below the first raise
+    XTSDataException.
+    """
+    if messageVersion < _FIRST_VERSION:
+        raise ex.XTSDataException("Unknown message version {version}".format(version=messageVersion))
+    return messageVersion if messageVersion <= _LATEST_VERSION else _LATEST_VERSION
+
+
+def _normalise(values, messageVersion):
+    """Insert zero sequenceNumber/skipBytes for versions that do not send them."""
+    if has_sequence(messageVersion):
+        return values
+    return values[:4] + (0, 0) + values[4:]
+
+
+def _decode_fixed(layouts, buffer, offset):
+    messageVersion = message_version(buffer, offset)
+    layout = layouts[layout_version(messageVersion)]
+    return _normalise(layout.unpack_from(buffer, offset), messageVersion), offset + layout.size
+
+
+def decode_touchline(buffer, offset):
+    """
+    Decode a 1501 body starting at `offset` (the message code).
+
+    Returns a tuple of HEAD_FIELDS head values, the bid and ask rows and the
+    TOUCHLINE_FIELDS touchline values, and the offset just past the body.
+    """
+    return _decode_fixed(TOUCHLINE_LAYOUTS, buffer, offset)
+
+
+def decode_ltp(buffer, offset):
+    """Decode a 1512 body starting at `offset`. Returns the head and LTP values and the end offset."""
+    return _decode_fixed(LTP_LAYOUTS, buffer, offset)
+
+
+def decode_candle(buffer, offset):
+    """Decode a 1505 body starting at `offset`. Returns the head and candle values and the end offset."""
+    return _decode_fixed(CANDLE_LAYOUTS, buffer, offset)
+
+
+def decode_instrumentchange(buffer, offset):
+    """Decode a 1105 body starting at `offset`. Returns the head and band values and the end offset."""
+    return _decode_fixed(INSTRUMENTCHANGE_LAYOUTS, buffer, offset)
+
+
+def depth_layout(messageVersion, bidCount, askCount):
+    """Return the compiled layout of a 1502 body with the given row counts."""
+    key = (layout_version(messageVersion), bidCount, askCount)
+    layout = _depth_layouts.get(key)
+    if layout is None:
+        layout = struct.Struct('<' + _head(key[0]) + 'i' + _ROW * bidCount + 'i' + _ROW * askCount +
+                               _ROW + _ROW + _TOUCHLINE)
+        _depth_layouts[key] = layout
+    return layout
+
+
+def decode_depth(buffer, offset):
+    """
+    Decode a 1502 body starting at `offset` (the message code).
+
+    Returns a tuple of HEAD_FIELDS head values, the bid count and rows, the
+    ask count and rows, the touchline bid and ask rows and the
+    TOUCHLINE_FIELDS touchline values, and the offset just past the body.
+    """
+    messageVersion = message_version(buffer, offset)
+    key = layout_version(messageVersion)
+    countOffset = offset + HEAD_LAYOUTS[key].size
+    bidCount = INT32.unpack_from(buffer, countOffset)[0]
+    askCount = INT32.unpack_from(buffer, countOffset + 4 + bidCount * ROW.size)[0]
+    layout = depth_layout(key, bidCount, askCount)
+    return _normalise(layout.unpack_from(buffer, offset), messageVersion), offset + layout.size
+
+
+def decode_openinterest(buffer, offset):
+    """
+    Decode a 1510 body starting at `offset` (the message code).
+
+    Returns a tuple of HEAD_FIELDS head values, the open interest values
+    and the underlying total open interest, and the offset just past the body.
+    The optional underlying name string is skipped.
+    """
+    messageVersion = message_version(buffer, offset)
+    key = layout_version(messageVersion)
+    flagOffset = offset + OPENINTEREST_LAYOUTS[key].size - 1
+    stringLength = -1
+    if buffer[flagOffset] == 1:
+        stringLength = buffer[flagOffset + 1]
+    layout = _openinterest_layouts.get((key, stringLength))
+    if layout is None:
+        body = _OPENINTEREST + ('B%dx' % stringLength if stringLength >= 0 else '') + 'i'
+        layout = struct.Struct('<' + _head(key) + body)
+        _openinterest_layouts[(key, stringLength)] = layout
+    values = _normalise(layout.unpack_from(buffer, offset), messageVersion)
+    if stringLength >= 0:
+        # drop the string length, callers see the same shape either way
+        values = values[:-2] + values[-1:]
+    return values, offset + layout.size
@@ -1,61 +1,52 @@
-from ApplicationMessageVersion import ApplicationMessageVersion
+from MessageLayout import decode_openinterest
+from MarketDataFrame import receive_time, format_receive_time
+from collections import namedtuple
 
-class OpenInterest:
-    @staticmethod
-    def deserialize(reader, count, messagecode, broadcastmode):
-        count += 2  # Skip initial bytes for flags
-        messageVersion = reader.read_uint16()
-        applicationType = reader.read_uint16()
-        tokenID = reader.read_uint64()
-        count += 8
 
-        sequenceNumber, SkipBytes = 0, 0
-        if messageVersion >= ApplicationMessageVersion.Version_1_0_1_2983.value:
-            sequenceNumber = reader.read_uint64()
-            count += 8
-            SkipBytes = reader.read_int32()
-            count += 4
+class OpenInterestEvent(namedtuple('OpenInterestEvent', [
+        'MessageCode', 'MessageVersion', 'ApplicationType', 'TokenID', 'ExchangeSegment', 'ExchangeInstrumentID',
+        'ExchangeTimeStamp', 'XMarketType', 'OpenInterest', 'UnderlyingExchangeSegment', 'UnderlyingInstrumentID',
+        'UnderlyingTotalOpenInterest', 'SequenceNumber', 'ReceiveTime'])):
+    """Compact 1510 event, returned in "Compact" broadcast mode. ReceiveTime is in ns."""
+    __slots__ = ()
 
-        exchangeSegment = reader.read_int16()
-        count += 2
-        exchangeInstrumentId = reader.read_int32()
-        count += 4
-        exchangeTimestamp = reader.read_uint64()
-        count += 8
-        MarketType = reader.read_int16()
-        count += 2
-        openInterest = reader.read_int32()
-        count += 4
-        underlyingExchangeSegment = reader.read_int16()
-        count += 2
-        underlyingInstrumentID = reader.read_uint64()
-        count += 8
-        isStringExits = reader.read_int8()
-        count += 1
+    def to_dict(self):
+        """Return the dict produced by the "Full" broadcast mode, the receive time formatted as LastUpdateTime."""
+        data = self._asdict()
+        del data["ReceiveTime"]
+        data["LastUpdateTime"] = format_receive_time(self.ReceiveTime)
+        return data
 
-        if isStringExits == 1:
-            stringLength = reader.read_int8()
-            count += 1 + stringLength  # Add the string's length to the count
 
-        underlyingTotalOpenInterest = reader.read_int32()
-        count += 4
+class OpenInterest:
+    @staticmethod
+    def deserialize(reader, count, messagecode, broadcastmode):
+        # reader is positioned just past the message code of the body
+        values, end = decode_openinterest(reader.buffer(), reader.pos() - 2)
+        reader.seek(end)
+        return OpenInterest.from_values(values, messagecode, broadcastmode)
+
+    @staticmethod
+    def decode(buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """Decode a 1510 body starting at `offset` (the message code) of `buffer`."""
+        values, end = decode_openinterest(buffer, offset)
+        return OpenInterest.from_values(values, messagecode, broadcastmode, receiveTime)
 
-        if broadcastmode == "Full":
-            return {
-                "MessageCode": messagecode,
-                "MessageVersion": messageVersion,
-                "ApplicationType": applicationType,
-                "TokenID": tokenID,
-                "ExchangeSegment": exchangeSegment,
-                "ExchangeInstrumentID": exchangeInstrumentId,
-                "ExchangeTimeStamp": exchangeTimestamp,
-                "XMarketType": MarketType,
-                "OpenInterest": openInterest,
-                "UnderlyingExchangeSegment": underlyingExchangeSegment,
-                "UnderlyingInstrumentID": underlyingInstrumentID,
-                "UnderlyingTotalOpenInterest": underlyingTotalOpenInterest,
-                "SequenceNumber": sequenceNumber,
-            }
+    @staticmethod
+    def from_values(values, messagecode, broadcastmode, receiveTime=None):
+        (_, messageVersion, applicationType, tokenID, sequenceNumber, SkipBytes,
+         exchangeSegment, exchangeInstrumentId, exchangeTimestamp,
+         MarketType, openInterest, underlyingExchangeSegment, underlyingInstrumentID,
+         isStringExits, underlyingTotalOpenInterest) = values
+
+        if broadcastmode == "Compact" or broadcastmode == "Full":
+            if receiveTime is None:
+                receiveTime = receive_time()
+            event = OpenInterestEvent(
+                messagecode, messageVersion, applicationType, tokenID, exchangeSegment, exchangeInstrumentId,
+                exchangeTimestamp, MarketType, openInterest, underlyingExchangeSegment, underlyingInstrumentID,
+                underlyingTotalOpenInterest, sequenceNumber, receiveTime)
+            return event if broadcastmode == "Compact" else event.to_dict()
 
         elif broadcastmode == "Partial":
             return (
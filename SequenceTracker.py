@@ -0,0 +1,251 @@
+"""
+    SequenceTracker.py
+
+    Per-instrument feed integrity from the packet sequence numbers.
+
+    From ApplicationMessageVersion.Version_1_0_1_2983 onwards every body
+    carries a SequenceNumber per (exchangeSegment, exchangeInstrumentID,
+    messageCode). The tracker keeps, per key, the highest number seen and a
+    64 bit mask of the numbers seen just below it in array-backed columns,
+    so every packet is classified in O(1):
+
+    - IN_ORDER: the next number
+    - GAP: numbers were skipped, they are counted as missing
+    - LATE: a skipped number arrived after all, it is no longer missing
+    - DUPLICATE: the number was already seen
+    - STALE: the number is more than 64 below the highest one, too old for
+      the mask to tell a duplicate from a late packet; it is counted in
+      `stale` and leaves `missing` as it is, so a gap only counts as filled
+      when the number arrives within the window
+    - RESET: the sequence was restarted by a reconnect or a new session,
+      seen as a number of at most `restartNumber` or one far below the
+      highest; the key is tracked from there and its missing count cleared
+    - UNSEQUENCED: a body of a version without sequence numbers
+
+    With an XTSConnect, gapped instruments are also refreshed with
+    get_quote on a background thread. Gaps are coalesced per message code
+    into one call of up to `refreshBatch` instruments, at most one call
+    every `refreshInterval` seconds, so a burst of gaps does not turn into
+    a burst of REST requests. The first gap after a quiet spell is refreshed
+    at once, the interval only delays the calls that follow it.
+"""
+import threading
+import time
+from array import array
+import Exception as ex
+from MessageLayout import sequence_number
+
+UNSEQUENCED = 0
+FIRST = 1
+IN_ORDER = 2
+GAP = 3
+LATE = 4
+DUPLICATE = 5
+RESET = 6
+STALE = 7
+
+_WINDOW = 64
+_MASK = (1 << _WINDOW) - 1
+
+
+class SequenceTracker:
+    """
+    Sequence number table of every (exchangeSegment, exchangeInstrumentID, messageCode) seen.
+
+    - `xt`, when given, is the XTSConnect used to refresh gapped instruments
+      with get_quote; `onSnapshot(keys, response)` receives every response
+      with the keys it covers.
+    - `onGap(key, missing)` is called from the checking thread on every gap.
+    - A number `resetThreshold` or more below the highest one seen, or of at
+      most `restartNumber` below it, is a RESET instead of a STALE packet.
+    """
+
+    def __init__(self, xt=None, onSnapshot=None, onGap=None, publishFormat='JSON', resetThreshold=1024,
+                 restartNumber=1, refreshInterval=1.0, refreshBatch=50):
+        if resetThreshold < _WINDOW:
+            raise ex.XTSInputException("resetThreshold must be at least {n}".format(n=_WINDOW))
+        if refreshBatch < 1:
+            raise ex.XTSInputException("refreshBatch must be at least 1")
+        self.xt = xt
+        self.onSnapshot = onSnapshot
+        self.onGap = onGap
+        self.publishFormat = publishFormat
+        self.resetThreshold = resetThreshold
+        self.restartNumber = restartNumber
+        self.refreshInterval = refreshInterval
+        self.refreshBatch = refreshBatch
+        self._slots = {}
+        self._keys = []
+        self._last = array('Q')
+        self._seen = array('Q')
+        self._packets = array('Q')
+        self._gaps = array('Q')
+        self._missing = array('q')
+        self._late = array('Q')
+        self._duplicates = array('Q')
+        self._resets = array('Q')
+        self._stale = array('Q')
+        self.unsequenced = 0
+        self.refreshes = 0
+        self.refreshedInstruments = 0
+        # keys waiting for a refresh, per message code, in gap order
+        self._pending = {}
+        self._nextRefresh = 0
+        self._refreshLock = threading.Lock()
+        self._refreshWanted = None
+        if xt is not None:
+            self._refreshWanted = threading.Event()
+            threading.Thread(target=self._refresh_loop, name='xts-sequence-refresh', daemon=True).start()
+
+    def _slot(self, key):
+        slot = len(self._keys)
+        self._slots[key] = slot
+        self._keys.append(key)
+        for column in (self._last, self._seen, self._packets, self._gaps, self._missing, self._late,
+                       self._duplicates, self._resets, self._stale):
+            column.append(0)
+        return slot
+
+    def check(self, exchangeSegment, exchangeInstrumentID, messageCode, sequenceNumber):
+        """
+        Classify one packet's sequence number. Returns IN_ORDER, GAP, LATE,
+        DUPLICATE, STALE, RESET, FIRST or UNSEQUENCED.
+        """
+        if not sequenceNumber:
+            self.unsequenced += 1
+            return UNSEQUENCED
+        key = (exchangeSegment, exchangeInstrumentID, int(messageCode))
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slot(key)
+            self._packets[slot] = 1
+            self._last[slot] = sequenceNumber
+            # numbers before the first one seen are not missing, they count as duplicates
+            self._seen[slot] = _MASK
+            return FIRST
+        self._packets[slot] += 1
+        last = self._last[slot]
+        if sequenceNumber > last:
+            step = sequenceNumber - last
+            self._last[slot] = sequenceNumber
+            self._seen[slot] = ((self._seen[slot] << step) | 1) & _MASK if step < _WINDOW else 1
+            if step == 1:
+                return IN_ORDER
+            self._gaps[slot] += 1
+            self._missing[slot] += step - 1
+            if self.onGap is not None:
+                self.onGap(key, step - 1)
+            if self._refreshWanted is not None:
+                self._queue_refresh(key)
+            return GAP
+        back = last - sequenceNumber
+        if (back and sequenceNumber <= self.restartNumber) or back >= self.resetThreshold:
+            # the gaps of the old sequence can not be filled any more
+            self._last[slot] = sequenceNumber
+            self._seen[slot] = _MASK
+            self._missing[slot] = 0
+            self._resets[slot] += 1
+            return RESET
+        if back < _WINDOW:
+            bit = 1 << back
+            if self._seen[slot] & bit:
+                self._duplicates[slot] += 1
+                return DUPLICATE
+            self._seen[slot] |= bit
+            self._late[slot] += 1
+            self._missing[slot] -= 1
+            return LATE
+        # too old to tell, the window only remembers the last 64 numbers
+        self._stale[slot] += 1
+        return STALE
+
+    def check_body(self, exchangeSegment, exchangeInstrumentID, messageCode, body):
+        """Check the sequence number of a raw body without decoding it."""
+        return self.check(exchangeSegment, exchangeInstrumentID, messageCode, sequence_number(body, 0))
+
+    def observe(self, event):
+        """Check a decoded Full or Compact event."""
+        if isinstance(event, dict):
+            return self.check(event["ExchangeSegment"], event["ExchangeInstrumentID"], event["MessageCode"],
+                              event.get("SequenceNumber", 0))
+        return self.check(event.ExchangeSegment, event.ExchangeInstrumentID, event.MessageCode,
+                          event.SequenceNumber)
+
+    def wrap(self, handler):
+        """Return a dispatcher handler that checks each event before passing it to `handler`."""
+        def checked(event):
+            self.observe(event)
+            handler(event)
+        return checked
+
+    def _queue_refresh(self, key):
+        with self._refreshLock:
+            self._pending.setdefault(key[2], {})[key] = None
+        self._refreshWanted.set()
+
+    def _refresh_loop(self):
+        while True:
+            self._refreshWanted.wait()
+            delay = self._nextRefresh - time.monotonic()
+            if delay > 0:
+                # gaps arriving meanwhile are collected into this call
+                time.sleep(delay)
+            with self._refreshLock:
+                messageCode = next(iter(self._pending))
+                keys = self._pending[messageCode]
+                batch = list(keys)[:self.refreshBatch]
+                for key in batch:
+                    del keys[key]
+                if not keys:
+                    del self._pending[messageCode]
+                if not self._pending:
+                    self._refreshWanted.clear()
+            try:
+                response = self.xt.get_quote([{'exchangeSegment': exchangeSegment,
+                                               'exchangeInstrumentID': exchangeInstrumentID}
+                                              for exchangeSegment, exchangeInstrumentID, _ in batch],
+                                             messageCode, self.publishFormat)
+            except Exception as e:
+                response = e
+            self._nextRefresh = time.monotonic() + self.refreshInterval
+            self.refreshes += 1
+            self.refreshedInstruments += len(batch)
+            if self.onSnapshot is not None:
+                self.onSnapshot(batch, response)
+
+    def instrument(self, exchangeSegment, exchangeInstrumentID, messageCode):
+        """Counters of one key as a dict, or None when it was never seen."""
+        slot = self._slots.get((exchangeSegment, exchangeInstrumentID, int(messageCode)))
+        if slot is None:
+            return None
+        return {
+            "lastSequenceNumber": self._last[slot],
+            "packets": self._packets[slot],
+            "gaps": self._gaps[slot],
+            "missing": self._missing[slot],
+            "late": self._late[slot],
+            "duplicates": self._duplicates[slot],
+            "resets": self._resets[slot],
+            "stale": self._stale[slot],
+        }
+
+    def gapped(self):
+        """Keys that still have missing sequence numbers, with how many."""
+        return {key: self._missing[slot] for key, slot in self._slots.items() if self._missing[slot] > 0}
+
+    def stats(self):
+        """Return the totals over all keys as a dict."""
+        return {
+            "keys": len(self._keys),
+            "packets": sum(self._packets),
+            "gaps": sum(self._gaps),
+            "missing": sum(self._missing),
+            "late": sum(self._late),
+            "duplicates": sum(self._duplicates),
+            "resets": sum(self._resets),
+            "stale": sum(self._stale),
+            "unsequenced": self.unsequenced,
+            "refreshes": self.refreshes,
+            "refreshedInstruments": self.refreshedInstruments,
+            "pendingRefreshes": sum(len(keys) for keys in list(self._pending.values())),
+        }
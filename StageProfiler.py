@@ -0,0 +1,151 @@
+"""
+    StageProfiler.py
+
+    Where the time of the market data frame loop goes.
+
+    Given to MDSocket_io as `profiler`, frames are split by iter_packets
+    with the profiler as its timing hook and dispatched through the
+    profiler instead of the dispatcher, which counts calls and cumulative
+    ns per stage and per message code:
+
+    - split: walking the frame and slicing out packets, per frame (code 0)
+    - header: unpacking a packet header
+    - inflate: inflating a compressed body
+    - dispatch: looking up the decoder and handler
+    - decode: the event decoder
+    - callback: the user handler
+
+    Without a profiler the socket uses the plain loop and pays nothing.
+    `sample(seconds)` additionally runs cProfile and tracemalloc over the
+    frame loop for a while and keeps the result in `samples`.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import tracemalloc
+from time import perf_counter_ns
+import Exception as ex
+from MarketDataFrame import SPLIT, HEADER, INFLATE, FRAME, iter_packets, inflate_raw
+
+DISPATCH = "dispatch"
+DECODE = "decode"
+CALLBACK = "callback"
+STAGES = (SPLIT, HEADER, INFLATE, DISPATCH, DECODE, CALLBACK)
+
+
+class StageProfiler:
+    """
+    Call counts and cumulative ns per (stage, messageCode).
+
+    `onSample(sample)` is called with every finished sample, a dict with the
+    pstats text report, the pstats.Stats and the tracemalloc snapshot.
+    """
+
+    def __init__(self, onSample=None, sortBy='cumulative', lines=30):
+        self.onSample = onSample
+        self.sortBy = sortBy
+        self.lines = lines
+        self.samples = []
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._profile = None
+        self._sampleEnd = None
+        self._sampleMemory = False
+
+    def add(self, stage, messageCode, ns):
+        counter = self._counters.get((stage, messageCode))
+        if counter is None:
+            counter = self._counters.setdefault((stage, messageCode), [0, 0])
+        counter[0] += 1
+        counter[1] += ns
+
+    def iter_packets(self, data, inflate=inflate_raw, packetFilter=None):
+        """iter_packets, recording the split, header and inflate stages."""
+        if self._sampleEnd is not None:
+            self._sample_frame()
+        profile = self._profile
+        if profile is not None:
+            profile.enable()
+        try:
+            yield from iter_packets(data, inflate, packetFilter, self)
+        finally:
+            if profile is not None:
+                profile.disable()
+
+    def dispatch(self, dispatcher, messageCode, body, broadcastmode, receiveTime=None):
+        """MessageDispatcher.dispatch, recording the dispatch, decode and callback stages."""
+        clock = perf_counter_ns
+        start = clock()
+        entry = dispatcher.lookup(messageCode)
+        looked = clock()
+        self.add(DISPATCH, messageCode, looked - start)
+        if entry is None:
+            return False
+        decoder, handler, label = entry
+        event = decoder.decode(body, 0, label, broadcastmode, receiveTime)
+        decoded = clock()
+        self.add(DECODE, messageCode, decoded - looked)
+        if event is None:
+            return True
+        handler(event)
+        self.add(CALLBACK, messageCode, clock() - decoded)
+        return True
+
+    def sample(self, seconds, memory=True):
+        """
+        Run cProfile, and with `memory` tracemalloc, over the frame loop for `seconds`.
+
+        The sample starts with the next frame and is finished by the first
+        frame after `seconds`, on the decoding thread.
+        """
+        with self._lock:
+            if self._sampleEnd is not None:
+                raise ex.XTSInputException("A profiling sample is already running")
+            self._sampleMemory = memory
+            self._sampleEnd = perf_counter_ns() + int(seconds * 1e9)
+
+    def _sample_frame(self):
+        with self._lock:
+            if self._sampleEnd is None:
+                return
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+                if self._sampleMemory and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                else:
+                    self._sampleMemory = False
+                return
+            if perf_counter_ns() < self._sampleEnd:
+                return
+            profile = self._profile
+            self._profile = self._sampleEnd = None
+        snapshot = None
+        if self._sampleMemory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        report = io.StringIO()
+        stats = pstats.Stats(profile, stream=report)
+        stats.sort_stats(self.sortBy).print_stats(self.lines)
+        sample = {"report": report.getvalue(), "stats": stats, "tracemalloc": snapshot}
+        self.samples.append(sample)
+        if self.onSample is not None:
+            self.onSample(sample)
+
+    def reset(self):
+        self._counters = {}
+
+    def stats(self):
+        """Return {stage: {messageCode: {"count", "ns", "nsPerCall"}}}."""
+        result = {stage: {} for stage in STAGES}
+        for (stage, messageCode), (count, ns) in sorted(list(self._counters.items())):
+            result[stage][messageCode] = {"count": count, "ns": ns, "nsPerCall": ns / count}
+        return result
+
+    def totals(self):
+        """Return the count and cumulative ns of every stage over all message codes."""
+        result = {stage: {"count": 0, "ns": 0} for stage in STAGES}
+        for (stage, _), (count, ns) in list(self._counters.items()):
+            result[stage]["count"] += count
+            result[stage]["ns"] += ns
+        return result
@@ -0,0 +1,129 @@
+"""
+    SubscriptionManager.py
+
+    Keeps the server side market data subscriptions in line with a desired
+    set of (exchangeSegment, exchangeInstrumentID, messageCode) entries.
+
+    Only the difference between the desired set and what the server has
+    acknowledged is sent, unsubscriptions first so they free quota for the
+    subscriptions, grouped per message code in chunks of `chunkSize`
+    instruments per REST call.
+"""
+import Exception as ex
+
+# The subscription api reports these states only in its free-text
+# description, without a response code of their own. The strings are
+# substrings of the server's wording, matched case-insensitively; update
+# them if the server text changes.
+ALREADY_SUBSCRIBED = "already subscribed"
+NOT_SUBSCRIBED = "not subscribed"
+
+
+def _instruments(keys):
+    return [{'exchangeSegment': segment, 'exchangeInstrumentID': instrumentID} for segment, instrumentID, _ in keys]
+
+
+def subscription_error(response, settled):
+    """
+    Return the error description of a subscription response, or None when
+    it succeeded or reports the `settled` state the call asked for,
+    ALREADY_SUBSCRIBED or NOT_SUBSCRIBED.
+    """
+    if isinstance(response, dict):
+        if response.get("type") == "success":
+            return None
+        description = response.get("description", "")
+    else:
+        description = str(response)
+    if settled in description.lower():
+        return None
+    return description or "Unknown subscription response"
+
+
+def _by_code(keys):
+    groups = {}
+    for key in sorted(keys):
+        groups.setdefault(key[2], []).append(key)
+    return groups
+
+
+class SubscriptionManager:
+    """
+    Desired and acknowledged subscriptions of one market data session.
+
+    - `chunkSize` is the most instruments sent in one subscription call.
+    - `maxSubscriptions` is the session quota; sync() refuses a desired set
+      larger than it instead of running into quota errors half way.
+    - Entries whose call failed stay out of `acknowledged` and are retried
+      by the next sync(); the last error of each is kept in `failed`.
+    """
+
+    def __init__(self, xt, chunkSize=50, maxSubscriptions=None):
+        if chunkSize < 1:
+            raise ex.XTSInputException("chunkSize must be at least 1")
+        self.xt = xt
+        self.chunkSize = chunkSize
+        self.maxSubscriptions = maxSubscriptions
+        self.desired = set()
+        self.acknowledged = set()
+        self.failed = {}
+        self.calls = 0
+
+    def add(self, exchangeSegment, exchangeInstrumentID, messageCode):
+        self.desired.add((exchangeSegment, exchangeInstrumentID, messageCode))
+
+    def remove(self, exchangeSegment, exchangeInstrumentID, messageCode):
+        self.desired.discard((exchangeSegment, exchangeInstrumentID, messageCode))
+
+    def set_desired(self, entries):
+        """Replace the desired set with `entries` of (exchangeSegment, exchangeInstrumentID, messageCode)."""
+        self.desired = set(entries)
+
+    def diff(self):
+        """Return (toSubscribe, toUnsubscribe) as sets of entries."""
+        return self.desired - self.acknowledged, self.acknowledged - self.desired
+
+    def sync(self):
+        """
+        Send the minimal subscribe and unsubscribe calls for the current diff.
+
+        Returns a dict with the subscribed, unsubscribed and failed entry counts
+        and the number of REST calls made.
+        """
+        if self.maxSubscriptions is not None and len(self.desired) > self.maxSubscriptions:
+            raise ex.XTSInputException("{count} subscriptions exceed the quota of {quota}".format(
+                count=len(self.desired), quota=self.maxSubscriptions))
+        toSubscribe, toUnsubscribe = self.diff()
+        # errors of entries that no longer need a call are stale
+        self.failed = {key: error for key, error in self.failed.items() if key in toSubscribe or key in toUnsubscribe}
+        calls = self.calls
+        unsubscribed = self._send(self.xt.send_unsubscription, toUnsubscribe, NOT_SUBSCRIBED)
+        self.acknowledged.difference_update(unsubscribed)
+        subscribed = self._send(self.xt.send_subscription, toSubscribe, ALREADY_SUBSCRIBED)
+        self.acknowledged.update(subscribed)
+        return {
+            "subscribed": len(subscribed),
+            "unsubscribed": len(unsubscribed),
+            "failed": len(toSubscribe) + len(toUnsubscribe) - len(subscribed) - len(unsubscribed),
+            "calls": self.calls - calls,
+        }
+
+    def _send(self, method, keys, settled):
+        done = []
+        for messageCode, group in _by_code(keys).items():
+            for start in range(0, len(group), self.chunkSize):
+                chunk = group[start:start + self.chunkSize]
+                self.calls += 1
+                try:
+                    response = method(_instruments(chunk), messageCode)
+                    error = subscription_error(response, settled)
+                except Exception as e:
+                    error = str(e)
+                for key in chunk:
+                    if error is None:
+                        self.failed.pop(key, None)
+                    else:
+                        self.failed[key] = error
+                if error is None:
+                    done.extend(chunk)
+        return done
@@ -0,0 +1,192 @@
+"""
+    SyntheticPackets.py
+
+    Valid XTS binary market data packets for local servers, replays and
+    benchmarks.
+
+    Bodies are packed with the same per-version layouts the decoders unpack,
+    for every message code and ApplicationMessageVersion, and wrapped in the
+    uncompressed or compressed (raw deflate) packet header. Prices follow a
+    deterministic walk on the sequence number so runs are reproducible.
+"""
+import struct
+import zlib
+from time import time_ns
+from ApplicationMessageVersion import ApplicationMessageVersion
+from MarketDataFrame import UNCOMPRESSED_HEADER, COMPRESSED_HEADER, XTS_EPOCH
+from MessageLayout import (has_sequence, HEAD_LAYOUTS, TOUCHLINE_LAYOUTS, LTP_LAYOUTS, CANDLE_LAYOUTS,
+                           INSTRUMENTCHANGE_LAYOUTS, OPENINTEREST_LAYOUTS, depth_layout, ROW_FIELDS)
+
+LATEST_VERSION = max(v.value for v in ApplicationMessageVersion)
+MESSAGE_CODES = (1105, 1501, 1502, 1505, 1510, 1512)
+
+_FLAG = struct.Struct('<b')
+
+
+def exchange_timestamp():
+    """Current time as an XTS exchange timestamp."""
+    return time_ns() // 1000000000 - XTS_EPOCH
+
+
+def _head(messageCode, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber):
+    head = (messageCode, messageVersion, 1, exchangeInstrumentID)
+    if has_sequence(messageVersion):
+        head += (sequenceNumber, 0)
+    return head + (exchangeSegment, exchangeInstrumentID, exchange_timestamp())
+
+
+def _price(exchangeInstrumentID, sequenceNumber):
+    return 100 + exchangeInstrumentID % 1000 + (sequenceNumber * 7 % 200 - 100) * 0.05
+
+
+def _row(size, price, orders):
+    return (size, price, orders, 0)
+
+
+def _touchline(price, sequenceNumber):
+    return (exchange_timestamp(), price, 10 + sequenceNumber % 90, 5000, 6000, 100000 + sequenceNumber,
+            price - 0.2, exchange_timestamp(), 0.5, price - 1, price + 2, price - 2, price - 0.5,
+            (100000 + sequenceNumber) * price, 0, 0, 1, 1)
+
+
+def touchline_body(exchangeSegment=1, exchangeInstrumentID=2885, sequenceNumber=0, messageVersion=LATEST_VERSION):
+    """1501 body."""
+    price = _price(exchangeInstrumentID, sequenceNumber)
+    values = (_head(1501, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber) +
+              _row(100, price - 0.05, 3) + _row(120, price + 0.05, 4) + _touchline(price, sequenceNumber))
+    return TOUCHLINE_LAYOUTS[messageVersion].pack(*values)
+
+
+def depth_body(exchangeSegment=1, exchangeInstrumentID=2885, sequenceNumber=0, messageVersion=LATEST_VERSION,
+               levels=5, bids=None, asks=None):
+    """1502 body with `levels` bid and ask rows, or the given `bids` and `asks` lists of (size, price, orders)."""
+    price = _price(exchangeInstrumentID, sequenceNumber)
+    if bids is None:
+        bids = [(100 + 10 * level + sequenceNumber % 10, price - 0.05 * (level + 1), 1 + level)
+                for level in range(levels)]
+    if asks is None:
+        asks = [(120 + 10 * level + sequenceNumber % 10, price + 0.05 * (level + 1), 1 + level)
+                for level in range(levels)]
+    bidRows = tuple(value for row in bids for value in _row(*row))
+    askRows = tuple(value for row in asks for value in _row(*row))
+    values = (_head(1502, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber) +
+              (len(bids),) + bidRows + (len(asks),) + askRows + (bidRows or _row(0, 0.0, 0))[:ROW_FIELDS] +
+              (askRows or _row(0, 0.0, 0))[:ROW_FIELDS] + _touchline(price, sequenceNumber))
+    return depth_layout(messageVersion, len(bids), len(asks)).pack(*values)
+
+
+def openinterest_body(exchangeSegment=2, exchangeInstrumentID=35000, sequenceNumber=0,
+                      messageVersion=LATEST_VERSION, underlying=None):
+    """1510 body, with the optional underlying name string when `underlying` bytes are given."""
+    head = _head(1510, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber)
+    openInterest = 10000 + sequenceNumber
+    if underlying is None:
+        body = OPENINTEREST_LAYOUTS[messageVersion].pack(*head, 1, openInterest, 1, 26000, 0)
+    else:
+        body = (OPENINTEREST_LAYOUTS[messageVersion].pack(*head, 1, openInterest, 1, 26000, 1) +
+                bytes([len(underlying)]) + underlying)
+    return body + struct.pack('<i', openInterest * 10)
+
+
+def ltp_body(exchangeSegment=1, exchangeInstrumentID=2885, sequenceNumber=0, messageVersion=LATEST_VERSION):
+    """1512 body."""
+    values = (_head(1512, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber) +
+              (1, 1, _price(exchangeInstrumentID, sequenceNumber), 10 + sequenceNumber % 90, exchange_timestamp()))
+    return LTP_LAYOUTS[messageVersion].pack(*values)
+
+
+def candle_body(exchangeSegment=1, exchangeInstrumentID=2885, sequenceNumber=0, messageVersion=LATEST_VERSION):
+    """1505 body."""
+    price = _price(exchangeInstrumentID, sequenceNumber)
+    values = (_head(1505, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber) +
+              (1, 1, exchange_timestamp(), 1000 + sequenceNumber, 0, 1000 * price,
+               price - 0.5, price + 1, price - 1, price))
+    return CANDLE_LAYOUTS[messageVersion].pack(*values)
+
+
+def instrumentchange_body(exchangeSegment=1, exchangeInstrumentID=2885, sequenceNumber=0,
+                          messageVersion=LATEST_VERSION):
+    """1105 body."""
+    price = _price(exchangeInstrumentID, sequenceNumber)
+    values = (_head(1105, messageVersion, exchangeSegment, exchangeInstrumentID, sequenceNumber) +
+              (1, 1, price * 1.2, price * 0.8, price * 1.1, price * 0.9, 5000, exchange_timestamp()))
+    return INSTRUMENTCHANGE_LAYOUTS[messageVersion].pack(*values)
+
+
+BODY_BUILDERS = {
+    1105: instrumentchange_body,
+    1501: touchline_body,
+    1502: depth_body,
+    1505: candle_body,
+    1510: openinterest_body,
+    1512: ltp_body,
+}
+
+
+def body(messageCode, exchangeSegment, exchangeInstrumentID, sequenceNumber=0, messageVersion=LATEST_VERSION):
+    """Body of any supported message code."""
+    return BODY_BUILDERS[messageCode](exchangeSegment, exchangeInstrumentID, sequenceNumber, messageVersion)
+
+
+def packet(body, compressed=False):
+    """Wrap a body in its packet header, raw deflating it when `compressed`."""
+    messageCode, _, _, _, exchangeSegment, exchangeInstrumentID = _body_keys(body)
+    if compressed:
+        deflater = zlib.compressobj(6, zlib.DEFLATED, -15)
+        data = deflater.compress(body) + deflater.flush()
+        return (_FLAG.pack(1) + COMPRESSED_HEADER.pack(messageCode, exchangeSegment, exchangeInstrumentID, 1, 1,
+                                                        len(body), len(data)) + data)
+    return (_FLAG.pack(0) + UNCOMPRESSED_HEADER.pack(messageCode, exchangeSegment, exchangeInstrumentID, 1, 1,
+                                                      len(body)) + body)
+
+
+def _body_keys(body):
+    messageVersion = struct.unpack_from('<H', body, 2)[0]
+    values = HEAD_LAYOUTS[min(messageVersion, LATEST_VERSION)].unpack_from(body)
+    return values[:4] + values[-3:-1]
+
+
+class PacketGenerator:
+    """
+    Endless stream of frames over a set of instruments and message codes.
+
+    - `instruments` is a list of (exchangeSegment, exchangeInstrumentID).
+    - Every compressedEvery-th packet is compressed, 0 never compresses.
+    - Sequence numbers increase per (exchangeSegment, exchangeInstrumentID,
+      messageCode), starting at 1.
+    """
+
+    def __init__(self, instruments=((1, 2885),), messageCodes=(1501, 1502, 1510), messageVersion=LATEST_VERSION,
+                 compressedEvery=2):
+        self.messageCodes = tuple(messageCodes)
+        self.set_instruments(instruments)
+        self.messageVersion = messageVersion
+        self.compressedEvery = compressedEvery
+        self.sequences = {}
+        self.packets = 0
+        self._next = 0
+
+    def set_instruments(self, instruments):
+        """Replace the instruments, sequence numbers carry on."""
+        self.set_keys((segment, instrumentID, messageCode)
+                      for segment, instrumentID in instruments for messageCode in self.messageCodes)
+
+    def set_keys(self, keys):
+        """Generate exactly the (exchangeSegment, exchangeInstrumentID, messageCode) `keys`."""
+        self._keys = sorted(keys)
+
+    def next_packet(self):
+        """Next packet, or b'' when there are no instruments."""
+        if not self._keys:
+            return b''
+        key = self._keys[self._next % len(self._keys)]
+        self._next += 1
+        sequenceNumber = self.sequences.get(key, 0) + 1
+        self.sequences[key] = sequenceNumber
+        self.packets += 1
+        compressed = self.compressedEvery and self.packets % self.compressedEvery == 0
+        return packet(body(key[2], key[0], key[1], sequenceNumber, self.messageVersion), compressed)
+
+    def frame(self, packetsPerFrame=1):
+        """One socket frame of `packetsPerFrame` packets."""
+        return b''.join(self.next_packet() for _ in range(packetsPerFrame))
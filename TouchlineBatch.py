@@ -0,0 +1,128 @@
+"""
+    TouchlineBatch.py
+
+    Opt-in batch decoding of 1501 touchline bodies into a NumPy structured
+    array, one row per packet. Requires numpy.
+
+    Bodies are appended as they arrive and decoded in one vectorised pass
+    per ApplicationMessageVersion on `flush`, without building a dict per
+    tick. Every row carries the receive time of its frame in ns.
+"""
+import threading
+import numpy as np
+import Exception as ex
+from MessageLayout import TOUCHLINE_LAYOUTS, has_sequence, message_version, layout_version
+from MarketDataFrame import receive_time
+
+
+def _row(side):
+    return [(side + 'Size', '<i4'), (side + 'Price', '<f8'), (side + 'TotalOrders', '<i4'),
+            (side + 'BackMarketMakerFlag', '<i2')]
+
+
+_HEAD = [('MessageCode', '<u2'), ('MessageVersion', '<u2'), ('ApplicationType', '<u2'), ('TokenID', '<u8')]
+_SEQUENCE = [('SequenceNumber', '<u8'), ('SkipBytes', '<i4')]
+_INSTRUMENT = [('ExchangeSegment', '<i2'), ('ExchangeInstrumentID', '<i4'), ('ExchangeTimeStamp', '<u8')]
+_TOUCHLINE = [
+    ('LastUpdateTime', '<u8'), ('LastTradedPrice', '<f8'), ('LastTradedQuantity', '<i4'),
+    ('TotalBuyQuantity', '<u4'), ('TotalSellQuantity', '<u4'), ('TotalTradedQuantity', '<u4'),
+    ('AverageTradedPrice', '<f8'), ('LastTradedTime', '<i8'), ('PercentChange', '<f8'),
+    ('Open', '<f8'), ('High', '<f8'), ('Low', '<f8'), ('Close', '<f8'), ('TotalValueTraded', '<f8'),
+    ('BuyBackTotalBuy', '<i2'), ('BuyBackTotalSell', '<i2'), ('BookType', '<i2'), ('XMarketType', '<i2')]
+
+# Wire layout of a 1501 body for each message version, matching MessageLayout.
+WIRE_DTYPES = {}
+for _version in TOUCHLINE_LAYOUTS:
+    WIRE_DTYPES[_version] = np.dtype(_HEAD + (_SEQUENCE if has_sequence(_version) else []) + _INSTRUMENT +
+                                     _row('Bid') + _row('Ask') + _TOUCHLINE)
+
+# Columns of the decoded batch.
+TOUCHLINE_DTYPE = np.dtype([field for field in WIRE_DTYPES[max(WIRE_DTYPES)].descr
+                            if field[0] not in ('MessageCode', 'SkipBytes')] + [('ReceiveTime', '<u8')])
+
+
+def decode_touchlines(buffer, messageVersion, count, receiveTimes=None):
+    """Decode `count` back to back 1501 bodies of one message version from `buffer`."""
+    wire = np.frombuffer(buffer, dtype=WIRE_DTYPES[messageVersion], count=count)
+    result = np.zeros(count, dtype=TOUCHLINE_DTYPE)
+    for name in TOUCHLINE_DTYPE.names:
+        if name in wire.dtype.names:
+            result[name] = wire[name]
+    if receiveTimes is not None:
+        result['ReceiveTime'] = receiveTimes
+    return result
+
+
+class TouchlineBatch:
+    """
+    Collects 1501 bodies from one or more frames and decodes them together.
+
+    - `maxRows` together with `callback` flushes automatically once that many
+      packets are pending and passes the decoded array to `callback`.
+    - Bodies shorter than their version's layout, or of a version below the
+      first one, are rejected on `add` and counted in `rejected`, so they
+      never reach the batch decode. Newer versions are read as the latest.
+
+    `add` is called from the socket thread, `flush` from any thread.
+    """
+
+    def __init__(self, maxRows=0, callback=None):
+        self.maxRows = maxRows
+        self.callback = callback
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._buffers = {}
+        self._counts = {}
+        self._times = {}
+        self._order = []
+        self.rows = 0
+
+    def add(self, body, receiveTime=None):
+        """Append one 1501 body (bytes or memoryview starting at the message code). Returns False if it was rejected."""
+        if receiveTime is None:
+            receiveTime = receive_time()
+        size = 0
+        if len(body) >= 4:
+            try:
+                version = layout_version(message_version(body, 0))
+                size = WIRE_DTYPES[version].itemsize
+            except ex.XTSDataException:
+                pass
+        if not size or len(body) < size:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            buffer = self._buffers.get(version)
+            if buffer is None:
+                buffer = self._buffers[version] = bytearray()
+                self._counts[version] = 0
+                self._times[version] = []
+                self._order.append(version)
+            buffer += body[:size]
+            self._counts[version] += 1
+            self._times[version].append(receiveTime)
+            self.rows += 1
+            full = self.maxRows and self.rows >= self.maxRows
+        if full and self.callback is not None:
+            self.callback(self.flush())
+        return True
+
+    def flush(self):
+        """
+        Decode every pending body and return them as one structured array.
+
+        Rows keep arrival order within a message version; a batch that mixes
+        versions is grouped by version.
+        """
+        with self._lock:
+            buffers, counts, times, order = self._buffers, self._counts, self._times, self._order
+            self._reset()
+        if not order:
+            return np.zeros(0, dtype=TOUCHLINE_DTYPE)
+        if len(order) == 1:
+            return decode_touchlines(buffers[order[0]], order[0], counts[order[0]], times[order[0]])
+        return np.concatenate([decode_touchlines(buffers[v], v, counts[v], times[v]) for v in order])
@@ -1,126 +1,89 @@
 from MarketDepthRowInfo import MarketDeptRowInfo
-from ApplicationMessageVersion import ApplicationMessageVersion
-import struct
-from datetime import datetime
+from MessageLayout import decode_touchline
+from collections import namedtuple
+from MarketDataFrame import receive_time, format_receive_time
+
+
+class TouchlineEvent(namedtuple('TouchlineEvent', [
+        'MessageCode', 'MessageVersion', 'ApplicationType', 'TokenID', 'ExchangeSegment', 'ExchangeInstrumentID',
+        'ExchangeTimeStamp', 'BookType', 'XMarketType', 'SequenceNumber', 'LastTradedPrice', 'LastTradedQuantity',
+        'TotalBuyQuantity', 'TotalSellQuantity', 'TotalTradedQuantity', 'AverageTradedPrice', 'LastTradedTime',
+        'LastUpdateTime', 'PercentChange', 'Open', 'High', 'Low', 'Close', 'TotalValueTraded', 'BuyBackTotalBuy',
+        'BuyBackTotalSell', 'Bid', 'Ask'])):
+    """Compact 1501 event, returned in "Compact" broadcast mode. LastUpdateTime is the receive time in ns."""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return the nested dict produced by the "Full" broadcast mode."""
+        return {
+            "MessageCode": self.MessageCode,
+            "MessageVersion": self.MessageVersion,
+            "ApplicationType": self.ApplicationType,
+            "TokenID": self.TokenID,
+            "ExchangeSegment": self.ExchangeSegment,
+            "ExchangeInstrumentID": self.ExchangeInstrumentID,
+            "ExchangeTimeStamp": self.ExchangeTimeStamp,
+            "BookType": self.BookType,
+            "XMarketType": self.XMarketType,
+            "SequenceNumber": self.SequenceNumber,
+            "Touchline": {
+                "LastTradedPrice": self.LastTradedPrice,
+                "LastTradedQuantity": self.LastTradedQuantity,
+                "TotalBuyQuantity": self.TotalBuyQuantity,
+                "TotalSellQuantity": self.TotalSellQuantity,
+                "TotalTradedQuantity": self.TotalTradedQuantity,
+                "AverageTradedPrice": self.AverageTradedPrice,
+                "LastTradedTime": self.LastTradedTime,
+                "LastUpdateTime": format_receive_time(self.LastUpdateTime),
+                "PercentChange": self.PercentChange,
+                "Open": self.Open,
+                "High": self.High,
+                "Low": self.Low,
+                "Close": self.Close,
+                "TotalValueTraded": self.TotalValueTraded,
+                "BuyBackTotalBuy": self.BuyBackTotalBuy,
+                "BuyBackTotalSell": self.BuyBackTotalSell,
+                "Bid": self.Bid.to_dict(),
+                "Ask": self.Ask.to_dict()
+            }
+        }
+
 
 class Touchline():
     def deserialize(reader,count, messagecode, broadcastmode):
-        count+= 2
-        messageVersion = reader.read_uint16()
-        applicationType = reader.read_uint16()
-        tokenID = reader.read_uint64()
-
-        count += 12
-        if (messageVersion >= ApplicationMessageVersion.Version_1_0_1_2983.value): 
-            sequenceNumber =reader.read_uint64()
-
-            count += 8
-            SkipBytes = reader.read_int32()
-            count += 4
-
-        exchangeSegment = int(reader.read_int16())
-        count+= 2
-
-        exchangeInstrumentId = reader.read_int32()
-        count+= 4
-
-        exchangeTimestamp = reader.read_uint64()
-        count+= 8
-
-        md1 = MarketDeptRowInfo(reader, count)
-        count, bidData = md1.deserialize()
-        md2 = MarketDeptRowInfo(reader, count)
-        count, askData = md2.deserialize()
-
-        lut = reader.read_uint64()
-        count += 8
-
-        LTP = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-
-        ltq = reader.read_int32()
-        count += 4
-
-        totalBuyQuantity = reader.read_uint32()
-        count += 4
-
-        totalSellQuantity = reader.read_uint32()
-        count += 4
-
-        totalTradedQuantity = reader.read_uint32()
-        count += 4
-        averageTradedPrice = struct.unpack('d', reader.read_bytes(8))[0]
-
-        count += 8
-
-        lastTradedTime = reader.read_int64()
-        count += 8
-
-        percentChange = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-
-        open =  struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        
-        high = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        
-        low = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-        
-        close = struct.unpack('d', reader.read_bytes(8))[0]
-        count += 8
-
-        
-        totalvaluetraded =  struct.unpack('d', reader.read_bytes(8))[0]
-        # print("skiptotalvaluetraded ::",totalvaluetraded)
-        count += 8
-        bbtotalbuy = reader.read_int16()
-        count += 2
-
-        bbtotalsell = reader.read_int16()
-        count += 2
-
-        Booktype = reader.read_int16()
-        count += 2
-
-        MarketType = reader.read_int16()
-
-        if broadcastmode == "Full":
-            return {
-                "MessageCode": messagecode,
-                "MessageVersion": messageVersion,
-                "ApplicationType": applicationType,
-                "TokenID": tokenID,
-                "ExchangeSegment": exchangeSegment,
-                "ExchangeInstrumentID": exchangeInstrumentId,
-                "ExchangeTimeStamp": exchangeTimestamp,
-                "BookType": Booktype,
-                "XMarketType": MarketType,
-                "SequenceNumber": sequenceNumber,
-                "Touchline": {
-                    "LastTradedPrice": LTP,
-                    "LastTradedQuantity": ltq,
-                    "TotalBuyQuantity": totalBuyQuantity,
-                    "TotalSellQuantity": totalSellQuantity,
-                    "TotalTradedQuantity": totalTradedQuantity,
-                    "AverageTradedPrice": averageTradedPrice,
-                    "LastTradedTime": lastTradedTime,
-                    "LastUpdateTime": str(datetime.now()),
-                    "PercentChange": percentChange,
-                    "Open": open,
-                    "High": high,
-                    "Low": low,
-                    "Close": close,
-                    "TotalValueTraded": totalvaluetraded,
-                    "BuyBackTotalBuy": bbtotalbuy,
-                    "BuyBackTotalSell": bbtotalsell,
-                    "Bid":bidData,
-                    "Ask":askData
-                }
-            }
+        # reader is positioned just past the message code of the body
+        values, end = decode_touchline(reader.buffer(), reader.pos() - 2)
+        reader.seek(end)
+        return Touchline.from_values(values, messagecode, broadcastmode)
+
+    @staticmethod
+    def decode(buffer, offset, messagecode, broadcastmode, receiveTime=None):
+        """Decode a 1501 body starting at `offset` (the message code) of `buffer`."""
+        values, end = decode_touchline(buffer, offset)
+        return Touchline.from_values(values, messagecode, broadcastmode, receiveTime)
+
+    @staticmethod
+    def from_values(values, messagecode, broadcastmode, receiveTime=None):
+        (_, messageVersion, applicationType, tokenID, sequenceNumber, SkipBytes,
+         exchangeSegment, exchangeInstrumentId, exchangeTimestamp) = values[:9]
+        (lut, LTP, ltq, totalBuyQuantity, totalSellQuantity, totalTradedQuantity, averageTradedPrice,
+         lastTradedTime, percentChange, open, high, low, close, totalvaluetraded,
+         bbtotalbuy, bbtotalsell, Booktype, MarketType) = values[17:]
+
+        if broadcastmode == "Compact" or broadcastmode == "Full":
+            if receiveTime is None:
+                receiveTime = receive_time()
+            event = TouchlineEvent(
+                messagecode, messageVersion, applicationType, tokenID, exchangeSegment, exchangeInstrumentId,
+                exchangeTimestamp, Booktype, MarketType, sequenceNumber, LTP, ltq, totalBuyQuantity,
+                totalSellQuantity, totalTradedQuantity, averageTradedPrice, lastTradedTime, receiveTime,
+                percentChange, open, high, low, close, totalvaluetraded, bbtotalbuy, bbtotalsell,
+                MarketDeptRowInfo.level(values, 9), MarketDeptRowInfo.level(values, 13))
+            return event if broadcastmode == "Compact" else event.to_dict()
 
         elif broadcastmode == "Partial":
+            bidData = MarketDeptRowInfo.from_values(values, 9)
+            askData = MarketDeptRowInfo.from_values(values, 13)
             return (
                 f"t:{exchangeSegment}_{exchangeInstrumentId},"
                 f"ltp:{LTP},"
@@ -137,10 +100,10 @@ class Touchline():
                 f"l:{low},"
                 f"c:{close},"
                 f"vp:{totalvaluetraded},"
-                f"ai:{askData["size"]}|{askData["rowprice"]}|{askData["totalOrders"]}|{askData["backmarketmakerflag"]}"
-                f"bi:{bidData["size"]}|{bidData["rowprice"]}|{bidData["totalOrders"]}|{bidData["backmarketmakerflag"]}"
+                f"ai:{askData['size']}|{askData['rowprice']}|{askData['totalOrders']}|{askData['backmarketmakerflag']}"
+                f"bi:{bidData['size']}|{bidData['rowprice']}|{bidData['totalOrders']}|{bidData['backmarketmakerflag']}"
             )
-       
+
 
 def convertTuple(tup):
         str = ''.join(tup)
@@ -159,7 +122,7 @@ def convertTuple(tup):
 
 
 
-        
+
 
 
 
@@ -0,0 +1,7 @@
+"""
+    benchmarks
+
+    Decoder micro-benchmarks on synthetic packets.
+
+        python -m benchmarks --output results.json --compare baseline.json
+"""
@@ -0,0 +1,68 @@
+"""
+    python -m benchmarks [--output results.json] [--compare baseline.json]
+
+    Runs the decoder benchmarks from the repository root and stores the
+    results as JSON, with the client version and platform, so releases can
+    be compared.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from __version__ import __version__
+from benchmarks.decoders import run_all
+
+
+def _key(result):
+    return json.dumps({k: v for k, v in result.items()
+                       if k in ("name", "messageCode", "messageCodes", "messageVersion", "broadcastmode",
+                                "compressed")}, sort_keys=True)
+
+
+def compare(results, baseline):
+    """Print the ns/packet change of every result present in `baseline`."""
+    previous = {_key(result): result for result in baseline["results"]}
+    for result in results:
+        before = previous.get(_key(result))
+        if before is not None:
+            change = result["nsPerPacket"] / before["nsPerPacket"] - 1
+            print("{key} {before:.0f} -> {after:.0f} ns/packet ({change:+.1%})".format(
+                key=_key(result), before=before["nsPerPacket"], after=result["nsPerPacket"], change=change))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Decoder micro-benchmarks")
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    parser.add_argument('--number', type=int, default=5, help="passes over the generated packets")
+    parser.add_argument('--mode', action='append', choices=("Full", "Partial", "Compact"),
+                        help="broadcast modes, default Full and Compact")
+    args = parser.parse_args(argv)
+
+    results = run_all(tuple(args.mode or ("Full", "Compact")), args.number)
+    report = {
+        "version": __version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for result in results:
+        print("{name:28} {code!s:18} v{version} {mode:8} {ns:8.0f} ns/packet {rate:10.0f} packets/s "
+              "{peak:8.0f} peak B/packet {retained:8.0f} retained B/packet "
+              "{allocations:6.1f} allocations/packet".format(
+                  name=result["name"], code=result.get("messageCode", result.get("messageCodes")),
+                  version=result["messageVersion"], mode=result["broadcastmode"] +
+                  ("+z" if result.get("compressed") else ""), ns=result["nsPerPacket"],
+                  rate=result["packetsPerSecond"], peak=result["peakBytesPerPacket"],
+                  retained=result["retainedBytesPerPacket"], allocations=result["allocationsPerPacket"]))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+    benchmarks/decoders.py
+
+    Packets per second, ns per packet and memory per packet of the event
+    decoders, legacy `deserialize` and `decode`, and of the full frame loop.
+
+    Memory is traced with tracemalloc in a separate, untimed pass:
+    peakBytesPerPacket is the high-water mark a call reaches above what it
+    started with, temporaries included, and retainedBytesPerPacket what is
+    still held once the results are kept alive, what a consumer holding on
+    to the events pays. allocationsPerPacket counts the memory blocks behind
+    the retained bytes, from tracemalloc snapshots taken around the pass.
+"""
+import gc
+import tracemalloc
+from time import perf_counter_ns
+from binary_reader import BinaryReader
+from ApplicationMessageVersion import ApplicationMessageVersion
+from MarketDataFrame import iter_packets, Inflater
+from MessageDispatcher import default_dispatcher
+from TouchlineEvent import Touchline
+from MarketDepthEvent import MarketDepthEvent
+from OpenInterestEvent import OpenInterest
+import SyntheticPackets
+
+VERSIONS = [v.value for v in ApplicationMessageVersion]
+DESERIALIZERS = {
+    1501: Touchline,
+    1502: MarketDepthEvent,
+    1510: OpenInterest,
+}
+
+
+def measure(call, items, number, packetsPerItem=1):
+    """Run `call(item)` over `items` `number` times. Returns the per packet timing and memory figures."""
+    for item in items[:100]:
+        call(item)
+    gc.collect()
+    gc.disable()
+    try:
+        start = perf_counter_ns()
+        for _ in range(number):
+            for item in items:
+                call(item)
+        elapsed = perf_counter_ns() - start
+        peak, retained, allocations = _trace(call, items)
+    finally:
+        gc.enable()
+    packets = number * len(items) * packetsPerItem
+    return {
+        "packets": packets,
+        "seconds": elapsed / 1e9,
+        "packetsPerSecond": packets * 1e9 / elapsed,
+        "nsPerPacket": elapsed / packets,
+        "peakBytesPerPacket": peak / (len(items) * packetsPerItem),
+        "retainedBytesPerPacket": retained / (len(items) * packetsPerItem),
+        "allocationsPerPacket": allocations / (len(items) * packetsPerItem),
+    }
+
+
+def _blocks(snapshot):
+    # the snapshots themselves are not part of what is measured
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return sum(stat.count for stat in snapshot.statistics('filename'))
+
+
+def _trace(call, items):
+    """
+    Sum of the per call peak above the starting point, and the bytes and
+    blocks retained by all the results.
+    """
+    kept = [None] * len(items)
+    peak = 0
+    tracemalloc.start()
+    try:
+        blocks = _blocks(tracemalloc.take_snapshot())
+        start = tracemalloc.get_traced_memory()[0]
+        for index, item in enumerate(items):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            kept[index] = call(item)
+            peak += tracemalloc.get_traced_memory()[1] - before
+        retained = tracemalloc.get_traced_memory()[0] - start
+        allocations = _blocks(tracemalloc.take_snapshot()) - blocks
+    finally:
+        tracemalloc.stop()
+    return peak, retained, allocations
+
+
+def bench_deserialize(messageCode, messageVersion, broadcastmode, count=1000, number=5):
+    """Time `deserialize` of a message code on a BinaryReader past the message code, as the socket example did."""
+    decoder = DESERIALIZERS[messageCode]
+    label = str(messageCode)
+    bodies = [SyntheticPackets.body(messageCode, 1, 2885 + i, i + 1, messageVersion) for i in range(count)]
+
+    def call(body):
+        reader = BinaryReader(body)
+        reader.read_uint16()
+        return decoder.deserialize(reader, 0, label, broadcastmode)
+
+    result = measure(call, bodies, number)
+    result.update(name="%s.deserialize" % decoder.__name__, messageCode=messageCode,
+                  messageVersion=messageVersion, broadcastmode=broadcastmode)
+    return result
+
+
+def bench_decode(messageCode, messageVersion, broadcastmode, count=1000, number=5):
+    """Time `decode` of a message code straight from the body, as the dispatcher calls it."""
+    decoder = DESERIALIZERS[messageCode]
+    label = str(messageCode)
+    bodies = [SyntheticPackets.body(messageCode, 1, 2885 + i, i + 1, messageVersion) for i in range(count)]
+
+    def call(body):
+        return decoder.decode(body, 0, label, broadcastmode, 0)
+
+    result = measure(call, bodies, number)
+    result.update(name="%s.decode" % decoder.__name__, messageCode=messageCode,
+                  messageVersion=messageVersion, broadcastmode=broadcastmode)
+    return result
+
+
+def bench_frame_loop(messageCodes, messageVersion, broadcastmode, compressed, packetsPerFrame=10, count=200,
+                     number=5):
+    """Time the MDSocket_io frame loop: framing, inflating and dispatching every packet of a frame."""
+    generator = SyntheticPackets.PacketGenerator(
+        [(1, 2885 + i) for i in range(50)], messageCodes, messageVersion, 1 if compressed else 0)
+    frames = [generator.frame(packetsPerFrame) for _ in range(count)]
+    inflater = Inflater()
+    events = []
+    dispatcher = default_dispatcher(events.append)
+
+    def call(frame):
+        for header, body in iter_packets(frame, inflater):
+            dispatcher.dispatch(header.messageCode, body, broadcastmode, 0)
+        # hand the events to the caller so they stay alive for the allocation count
+        batch = events[:]
+        events.clear()
+        return batch
+
+    result = measure(call, frames, number, packetsPerFrame)
+    result.update(name="frame_loop", messageCodes=list(messageCodes), messageVersion=messageVersion,
+                  broadcastmode=broadcastmode, compressed=compressed, packetsPerFrame=packetsPerFrame)
+    return result
+
+
+def run_all(broadcastmodes=("Full", "Compact"), number=5):
+    """Both decoder paths for every version, and the frame loop for every code, compressed and not."""
+    results = []
+    for broadcastmode in broadcastmodes:
+        for messageCode in DESERIALIZERS:
+            for messageVersion in VERSIONS:
+                results.append(bench_deserialize(messageCode, messageVersion, broadcastmode, number=number))
+                results.append(bench_decode(messageCode, messageVersion, broadcastmode, number=number))
+        for messageCode in SyntheticPackets.MESSAGE_CODES:
+            for compressed in (False, True):
+                results.append(bench_frame_loop((messageCode,), SyntheticPackets.LATEST_VERSION, broadcastmode,
+                                                compressed, number=number))
+        results.append(bench_frame_loop((1501, 1502, 1510), SyntheticPackets.LATEST_VERSION, broadcastmode,
+                                        True, number=number))
+    return results
@@ -0,0 +1,212 @@
+"""
+    benchmarks/load.py
+
+    End-to-end load test of MDSocket_io against a LocalXTSServer.
+
+    The server runs in its own process, so it does not share the GIL with
+    the client under test, and is driven through its /standin routes. It
+    streams frames for `instruments` subscribed instruments while
+    the packet rate ramps through `rates`. For every step the tool reports
+    the packets sent and handled, the frame queue depth over time, the
+    receive to handler lag and the lost and out-of-order sequence numbers.
+    The highest step the server delivered in full and the client handled
+    without loss or a full queue is the maximum sustained throughput.
+
+        python -m benchmarks.load --instruments 500 --rates 2000,5000,10000,20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import requests
+from Connect import XTSConnect
+from MarketdataSocketClient import MDSocket_io
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LocalXTSServer.py')
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class SequenceCheck:
+    """Lost and out-of-order sequence numbers per (exchangeSegment, exchangeInstrumentID, messageCode)."""
+
+    def __init__(self):
+        self.last = {}
+        self.lost = 0
+        self.outOfOrder = 0
+
+    def check(self, key, sequenceNumber):
+        last = self.last.get(key)
+        if last is None or sequenceNumber > last:
+            if last is not None:
+                self.lost += sequenceNumber - last - 1
+            self.last[key] = sequenceNumber
+        else:
+            self.outOfOrder += 1
+
+
+class LoadTest:
+
+    def __init__(self, instruments=100, messageCodes=(1501, 1510), rates=(1000, 5000, 10000, 20000),
+                 stepSeconds=5.0, packetsPerFrame=10, queueSize=1024, port=18080, sampleInterval=0.05):
+        self.instruments = instruments
+        self.messageCodes = messageCodes
+        self.rates = rates
+        self.stepSeconds = stepSeconds
+        self.packetsPerFrame = packetsPerFrame
+        self.queueSize = queueSize
+        self.port = port
+        self.sampleInterval = sampleInterval
+        self.sequences = SequenceCheck()
+        self.handled = 0
+        self._lags = []
+        self._depths = []
+        self._lock = threading.Lock()
+
+    def on_event(self, event):
+        receiveTime = getattr(event, 'ReceiveTime', None) or event.LastUpdateTime
+        lag = time.time_ns() - receiveTime
+        with self._lock:
+            self.handled += 1
+            self._lags.append(lag)
+            self.sequences.check((event.ExchangeSegment, event.ExchangeInstrumentID, event.MessageCode),
+                                 event.SequenceNumber)
+
+    def _sample(self, socket, stopEvent):
+        while not stopEvent.wait(self.sampleInterval):
+            self._depths.append(len(socket.frameQueue))
+
+    def run(self):
+        """Run every step and return the report as a dict."""
+        url = 'http://127.0.0.1:%d' % self.port
+        server = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--port', str(self.port), '--rate', '0',
+                                   '--packets-per-frame', str(self.packetsPerFrame)])
+        try:
+            self._wait_for_server(url)
+            xt = XTSConnect('', '', 'WEBAPI')
+            xt._default_marketdata_uri = url
+            login = xt.marketdata_login()['result']
+            instruments = [{'exchangeSegment': 2, 'exchangeInstrumentID': 35000 + i} for i in range(self.instruments)]
+            for messageCode in self.messageCodes:
+                xt.send_subscription(instruments, messageCode)
+
+            socket = MDSocket_io(login['token'], login['userID'], "Compact", queueSize=self.queueSize)
+            socket.connection_url = url + socket.connection_url[len(socket.port):]
+            for messageCode in self.messageCodes:
+                socket.dispatcher.on(messageCode, self.on_event)
+            threading.Thread(target=socket.connect, name='xts-load-socket', daemon=True).start()
+            time.sleep(1)
+
+            steps = [self._step(url, socket, rate) for rate in self.rates]
+            socket.stop_worker(5)
+            socket.sid.disconnect()
+        finally:
+            server.terminate()
+            server.wait()
+        sustained = [step["rate"] for step in steps if step["sustained"]]
+        return {
+            "instruments": self.instruments,
+            "messageCodes": list(self.messageCodes),
+            "packetsPerFrame": self.packetsPerFrame,
+            "queueSize": self.queueSize,
+            "maxSustainedRate": max(sustained) if sustained else 0,
+            "steps": steps,
+        }
+
+    @staticmethod
+    def _wait_for_server(url, timeout=10):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                requests.get(url + '/standin/stats')
+                return
+            except requests.ConnectionError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    @staticmethod
+    def _set_rate(url, rate):
+        return requests.post(url + '/standin/rate', json={'rate': rate}).json()['result']['packetsSent']
+
+    def _step(self, url, socket, rate):
+        with self._lock:
+            self._lags = []
+            self.sequences.lost = self.sequences.outOfOrder = 0
+            handled = self.handled
+        self._depths = []
+        sent = self._set_rate(url, 0)
+        dropped = socket.frameQueue.dropped
+        stopEvent = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(socket, stopEvent), daemon=True)
+        sampler.start()
+        self._set_rate(url, rate)
+        time.sleep(self.stepSeconds)
+        sent = self._set_rate(url, 0) - sent
+        # give frames in flight and in the queue the chance to be handled
+        time.sleep(1)
+        stopEvent.set()
+        sampler.join()
+        with self._lock:
+            lags = sorted(self._lags)
+            handled = self.handled - handled
+            lost = self.sequences.lost
+            outOfOrder = self.sequences.outOfOrder
+        depths = self._depths
+        step = {
+            "rate": rate,
+            "sent": sent,
+            "sentPerSecond": sent / self.stepSeconds,
+            "handled": handled,
+            "handledPerSecond": handled / self.stepSeconds,
+            "lost": lost,
+            "outOfOrder": outOfOrder,
+            "droppedFrames": socket.frameQueue.dropped - dropped,
+            "maxQueueDepth": max(depths) if depths else 0,
+            "queueDepth": depths,
+            "lagP50Ns": _percentile(lags, 0.5),
+            "lagP99Ns": _percentile(lags, 0.99),
+            "lagMaxNs": lags[-1] if lags else 0,
+        }
+        # a step the server could not deliver in full says nothing about the client
+        step["serverLimited"] = sent < 0.95 * rate * self.stepSeconds
+        step["sustained"] = (not step["serverLimited"] and lost == 0 and handled >= sent and
+                             step["maxQueueDepth"] < self.queueSize)
+        return step
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="End-to-end feed load test")
+    parser.add_argument('--instruments', type=int, default=100)
+    parser.add_argument('--codes', default='1501,1510')
+    parser.add_argument('--rates', default='1000,5000,10000,20000', help="packets per second of each step")
+    parser.add_argument('--step-seconds', type=float, default=5.0)
+    parser.add_argument('--packets-per-frame', type=int, default=10)
+    parser.add_argument('--queue-size', type=int, default=1024)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--output', default='load-results.json')
+    args = parser.parse_args(argv)
+
+    report = LoadTest(args.instruments, tuple(int(code) for code in args.codes.split(',')),
+                      tuple(int(rate) for rate in args.rates.split(',')), args.step_seconds,
+                      args.packets_per_frame, args.queue_size, args.port).run()
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for step in report["steps"]:
+        print("{rate:>8} packets/s  sent {sent:>8} handled {handled:>8} lost {lost:>6} out-of-order {outOfOrder:>4} "
+              "max queue {maxQueueDepth:>5} lag p50 {p50:8.2f} ms p99 {p99:8.2f} ms {verdict}".format(
+                  p50=step["lagP50Ns"] / 1e6, p99=step["lagP99Ns"] / 1e6,
+                  verdict="ok" if step["sustained"] else "server limited" if step["serverLimited"] else "NOT KEPT UP",
+                  **step))
+    print("max sustained rate:", report["maxSustainedRate"], "packets/s for", report["instruments"], "instruments")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import random
+from DepthBook import DepthDiff, ADDED, REMOVED, MODIFIED
+from MarketDataConflator import Conflator
+import SyntheticPackets
+
+
+def snapshot(rng, sequenceNumber):
+    def side(base, step):
+        return [(rng.choice((5, 10, 15)), base + step * rng.choice((0, 1)) + step * level, rng.choice((1, 2)))
+                for level in range(rng.randint(0, 5))]
+    return SyntheticPackets.depth_body(1, 2885, sequenceNumber, bids=side(100.0, -0.5), asks=side(101.0, 0.5))
+
+
+def changes(event):
+    return None if event is None else event.Changes
+
+
+def test_merge_equals_the_direct_diff():
+    rng = random.Random(7)
+    for _ in range(3000):
+        a, b, c = (snapshot(rng, sequenceNumber) for sequenceNumber in (1, 2, 3))
+        chained = DepthDiff()
+        chained.decode(a, 0, '1502', 'Compact', 1)
+        first = chained.decode(b, 0, '1502', 'Compact', 2)
+        second = chained.decode(c, 0, '1502', 'Compact', 3)
+        direct = DepthDiff()
+        direct.decode(a, 0, '1502', 'Compact', 1)
+        expected = changes(direct.decode(c, 0, '1502', 'Compact', 3))
+        if first is None or second is None:
+            # one step changed nothing, the other diff is already the direct one
+            assert changes(first or second) == expected
+        else:
+            assert DepthDiff.merge(first, second).Changes == (expected or ())
+
+
+def test_merge_of_full_dicts():
+    rng = random.Random(11)
+    a, b, c = (snapshot(rng, sequenceNumber) for sequenceNumber in (1, 2, 3))
+    diff = DepthDiff()
+    diff.decode(a, 0, '1502', 'Full', 1)
+    first, second = diff.decode(b, 0, '1502', 'Full', 2), diff.decode(c, 0, '1502', 'Full', 3)
+    compact = DepthDiff()
+    compact.decode(a, 0, '1502', 'Compact', 1)
+    events = [compact.decode(b, 0, '1502', 'Compact', 2), compact.decode(c, 0, '1502', 'Compact', 3)]
+    if None not in events and first is not None and second is not None:
+        assert DepthDiff.merge(first, second)["Changes"] == [
+            change.to_dict() for change in DepthDiff.merge(*events).Changes]
+
+
+def test_unchanged_snapshot_returns_no_event():
+    body = SyntheticPackets.depth_body(1, 2885, 1, bids=[(5, 100.0, 1)], asks=[(5, 101.0, 1)])
+    diff = DepthDiff()
+    first = diff.decode(body, 0, '1502', 'Compact', 1)
+    assert [change.Change for change in first.Changes] == [ADDED, ADDED]
+    assert diff.decode(body, 0, '1502', 'Compact', 2) is None
+
+
+def test_removed_level_reports_the_delivered_price():
+    levels = [(5, 100.0, 1), (5, 99.5, 1)]
+    bodies = [SyntheticPackets.depth_body(1, 2885, 1, bids=levels, asks=[]),
+              SyntheticPackets.depth_body(1, 2885, 2, bids=[levels[0], (7, 99.0, 2)], asks=[]),
+              SyntheticPackets.depth_body(1, 2885, 3, bids=levels[:1], asks=[])]
+    conflator = Conflator(messageCodes=(1502,), merges={1502: DepthDiff.merge})
+    diff = DepthDiff()
+    for body in bodies:
+        event = diff.decode(body, 0, '1502', 'Compact', 1)
+        if event is not None:
+            conflator(event)
+        if body is bodies[0]:
+            conflator.drain()
+    (event,) = conflator.drain()
+    (change,) = event.Changes
+    assert (change.Change, change.Level, change.Price, change.Size) == (REMOVED, 1, 99.5, 0)
+    assert MODIFIED not in [change.Change for change in event.Changes]
@@ -0,0 +1,117 @@
+"""
+Bodies written out field by field from the XTS binary market data spec,
+independent of the struct layouts the decoders use.
+"""
+import struct
+from CandleEvent import Candle
+from InstrumentChangeEvent import InstrumentChange
+from LTPEvent import LTP
+from OpenInterestEvent import OpenInterest
+
+RECEIVE_TIME = 1700000000123456789
+
+
+def u8(value):
+    return value.to_bytes(1, 'little')
+
+
+def i16(value):
+    return value.to_bytes(2, 'little', signed=True)
+
+
+def u16(value):
+    return value.to_bytes(2, 'little')
+
+
+def i32(value):
+    return value.to_bytes(4, 'little', signed=True)
+
+
+def u32(value):
+    return value.to_bytes(4, 'little')
+
+
+def u64(value):
+    return value.to_bytes(8, 'little')
+
+
+def f64(value):
+    return struct.pack('<d', value)
+
+
+def head(messageCode, messageVersion=4):
+    """messageCode, messageVersion, applicationType, tokenID, [sequenceNumber, skipBytes], segment, id, timestamp."""
+    body = u16(messageCode) + u16(messageVersion) + u16(7) + u64(0x0102030405060708)
+    if messageVersion >= 4:
+        body += u64(9001) + i32(0)
+    return body + i16(2) + i32(35001) + u64(1382659200)
+
+
+def check_head(event, messageCode, messageVersion=4):
+    assert event["MessageCode"] == messageCode
+    assert event["MessageVersion"] == messageVersion
+    assert event["ApplicationType"] == 7
+    assert event["TokenID"] == 0x0102030405060708
+    assert event["SequenceNumber"] == (9001 if messageVersion >= 4 else 0)
+    assert event["ExchangeSegment"] == 2
+    assert event["ExchangeInstrumentID"] == 35001
+    assert event["ExchangeTimeStamp"] == 1382659200
+
+
+def test_ltp():
+    # bookType, marketType, LTP, LTQ, lastUpdateTime
+    body = head(1512) + i16(1) + i16(3) + f64(1234.55) + u32(75) + u64(1382659199)
+    event = LTP.decode(body, 0, 1512, "Compact", RECEIVE_TIME)._asdict()
+    check_head(event, 1512)
+    assert (event["BookType"], event["XMarketType"]) == (1, 3)
+    assert event["LastTradedPrice"] == 1234.55
+    assert event["LastTradedQuantity"] == 75
+    assert event["LastUpdateTime"] == RECEIVE_TIME
+
+
+def test_candle():
+    # bookType, marketType, barTime, barVolume, openInterest, sumOfQtyInToPrice, open, high, low, close
+    body = (head(1505) + i16(1) + i16(3) + u64(1382659140) + u32(4200) + u32(118000) + f64(5185000.5) +
+            f64(1234.0) + f64(1240.25) + f64(1230.5) + f64(1236.75))
+    event = Candle.decode(body, 0, 1505, "Compact", RECEIVE_TIME)._asdict()
+    check_head(event, 1505)
+    assert (event["BookType"], event["XMarketType"]) == (1, 3)
+    assert (event["BarTime"], event["BarVolume"], event["OpenInterest"]) == (1382659140, 4200, 118000)
+    assert event["SumOfQtyInToPrice"] == 5185000.5
+    assert (event["Open"], event["High"], event["Low"], event["Close"]) == (1234.0, 1240.25, 1230.5, 1236.75)
+
+
+def test_instrument_change():
+    # bookType, marketType, priceBandHigh, priceBandLow, highExecutionBand, lowExecutionBand,
+    # freezeQuantity, lastUpdateTime
+    body = (head(1105, 1) + i16(1) + i16(3) + f64(1357.5) + f64(1110.75) + f64(1300.25) + f64(1150.5) +
+            u32(36000) + u64(1382659198))
+    event = InstrumentChange.decode(body, 0, 1105, "Compact", RECEIVE_TIME)._asdict()
+    check_head(event, 1105, 1)
+    assert (event["BookType"], event["XMarketType"]) == (1, 3)
+    assert (event["PriceBandHigh"], event["PriceBandLow"]) == (1357.5, 1110.75)
+    assert (event["HighExecutionBand"], event["LowExecutionBand"]) == (1300.25, 1150.5)
+    assert event["FreezeQuantity"] == 36000
+    assert event["LastUpdateTime"] == 1382659198
+    assert event["ReceiveTime"] == RECEIVE_TIME
+
+
+def test_open_interest_with_underlying_name():
+    # marketType, openInterest, underlyingSegment, underlyingID, isStringExists, [length, name],
+    # underlyingTotalOpenInterest
+    body = (head(1510) + i16(3) + i32(118000) + i16(1) + u64(26000) + u8(1) + u8(5) + b'NIFTY' +
+            i32(9500000))
+    event = OpenInterest.decode(body, 0, 1510, "Compact", RECEIVE_TIME)._asdict()
+    check_head(event, 1510)
+    assert (event["XMarketType"], event["OpenInterest"]) == (3, 118000)
+    assert (event["UnderlyingExchangeSegment"], event["UnderlyingInstrumentID"]) == (1, 26000)
+    assert event["UnderlyingTotalOpenInterest"] == 9500000
+
+
+def test_full_dicts_format_the_receive_time_as_last_update_time():
+    body = head(1505) + bytes(struct.calcsize('<hhQIIddddd'))
+    event = Candle.decode(body, 0, 1505, "Full", RECEIVE_TIME)
+    assert "ReceiveTime" not in event
+    assert event["LastUpdateTime"].endswith(".123456")
+    ltp = LTP.decode(head(1512) + bytes(24), 0, 1512, "Full", RECEIVE_TIME)
+    assert ltp["LastUpdateTime"] == event["LastUpdateTime"]
@@ -0,0 +1,28 @@
+import threading
+import time
+from MarketDataQueue import FrameQueue, BLOCK, CONFLATE
+import SyntheticPackets
+
+
+def test_put_after_close_is_counted_as_dropped():
+    queue = FrameQueue(1, BLOCK)
+    queue.put(b'a', 1)
+    blocked = threading.Thread(target=queue.put, args=(b'b', 2))
+    blocked.start()
+    time.sleep(0.05)
+    queue.close()
+    blocked.join(1)
+    queue.put(b'c', 3)
+    assert queue.stats()["dropped"] == 2
+    assert queue.get() == (b'a', 1)
+    assert queue.get() is None
+
+
+def test_conflate_keeps_the_oldest_receive_time():
+    generator = SyntheticPackets.PacketGenerator([(1, 2885)], (1501,))
+    queue = FrameQueue(1, CONFLATE)
+    queue.put(generator.frame(1), 10)
+    queue.put(generator.frame(1), 20)
+    frame, receiveTime = queue.get()
+    assert receiveTime == 10
+    assert queue.stats()["conflated"] == 1
@@ -0,0 +1,18 @@
+import pytest
+import Exception as ex
+from MessageLayout import layout_version, decode_touchline
+import SyntheticPackets
+
+
+def test_layout_version_clamps_newer_and_rejects_older():
+    latest = SyntheticPackets.LATEST_VERSION
+    assert layout_version(latest + 5) == latest
+    with pytest.raises(ex.XTSDataException, match="version 0"):
+        layout_version(0)
+
+
+def test_decode_rejects_version_zero():
+    body = bytearray(SyntheticPackets.body(1501, 1, 2885, 1, SyntheticPackets.LATEST_VERSION))
+    body[2:4] = (0).to_bytes(2, 'little')
+    with pytest.raises(ex.XTSDataException):
+        decode_touchline(bytes(body), 0)
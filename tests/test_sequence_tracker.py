@@ -0,0 +1,47 @@
+import time
+import SequenceTracker as st
+
+
+class RecordingXT:
+
+    def __init__(self):
+        self.calls = []
+
+    def get_quote(self, instruments, messageCode, publishFormat):
+        self.calls.append((time.monotonic(), len(instruments)))
+        return {'type': 'success'}
+
+
+def test_numbers_older_than_the_window_are_stale_not_duplicates():
+    tracker = st.SequenceTracker()
+    assert tracker.check(1, 2885, 1501, 100) == st.FIRST
+    assert tracker.check(1, 2885, 1501, 300) == st.GAP
+    assert tracker.check(1, 2885, 1501, 200) == st.STALE
+    assert tracker.check(1, 2885, 1501, 300) == st.DUPLICATE
+    counters = tracker.instrument(1, 2885, 1501)
+    assert (counters["stale"], counters["duplicates"], counters["missing"]) == (1, 1, 199)
+
+
+def test_a_restart_from_one_is_a_reset():
+    tracker = st.SequenceTracker()
+    tracker.check(1, 2885, 1501, 100)
+    tracker.check(1, 2885, 1501, 110)
+    assert tracker.check(1, 2885, 1501, 1) == st.RESET
+    assert tracker.instrument(1, 2885, 1501)["missing"] == 0
+    assert tracker.check(1, 2885, 1501, 1) == st.DUPLICATE
+    assert tracker.check(1, 2885, 1501, 2) == st.IN_ORDER
+
+
+def test_a_single_gap_is_refreshed_without_waiting_for_the_interval():
+    xt = RecordingXT()
+    tracker = st.SequenceTracker(xt, refreshInterval=0.3, refreshBatch=2)
+    start = time.monotonic()
+    tracker.check(1, 2885, 1501, 1)
+    tracker.check(1, 2885, 1501, 5)
+    for exchangeInstrumentID in range(1, 4):
+        tracker.check(1, exchangeInstrumentID, 1501, 1)
+        tracker.check(1, exchangeInstrumentID, 1501, 3)
+    time.sleep(0.8)
+    assert sum(size for _, size in xt.calls) == 4
+    assert xt.calls[0][0] - start < 0.1
+    assert xt.calls[1][0] - xt.calls[0][0] >= 0.3
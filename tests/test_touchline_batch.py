@@ -0,0 +1,29 @@
+from MessageLayout import TOUCHLINE_LAYOUTS
+from TouchlineBatch import TouchlineBatch, WIRE_DTYPES
+import SyntheticPackets
+
+
+def test_wire_dtypes_match_layouts():
+    assert set(WIRE_DTYPES) == set(TOUCHLINE_LAYOUTS)
+    for version, layout in TOUCHLINE_LAYOUTS.items():
+        assert WIRE_DTYPES[version].itemsize == layout.size
+
+
+def test_add_rejects_truncated_bodies():
+    batch = TouchlineBatch()
+    body = SyntheticPackets.body(1501, 1, 2885, 1, SyntheticPackets.LATEST_VERSION)
+    assert not batch.add(body[:3], 1)
+    assert not batch.add(body[:-1], 1)
+    assert batch.add(body, 1)
+    assert batch.rejected == 2
+    rows = batch.flush()
+    assert len(rows) == 1 and rows['ExchangeInstrumentID'][0] == 2885
+
+
+def test_add_rejects_unknown_old_versions():
+    batch = TouchlineBatch()
+    body = bytearray(SyntheticPackets.body(1501, 1, 2885, 1, SyntheticPackets.LATEST_VERSION))
+    body[2:4] = (0).to_bytes(2, 'little')
+    assert not batch.add(bytes(body), 1)
+    body[2:4] = (SyntheticPackets.LATEST_VERSION + 1).to_bytes(2, 'little')
+    assert batch.add(bytes(body), 1)